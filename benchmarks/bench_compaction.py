@@ -0,0 +1,106 @@
+"""
+筛选提示词压缩的基准：对录制的豆果详情页和一组按真实长菜谱风格生成的菜谱（长步骤、小贴士、表情、推广语、
+模糊用量），渲染完整的单菜谱筛选提示词，统计压缩前后的估算 token 数、压缩耗时，以及筛选链需要的
+关键信息（总步数、食材名）是否保留。
+
+运行: python -m benchmarks.bench_compaction [--budget 300] [--step-max-chars 60] [--long 20] [-v]
+"""
+import argparse
+import glob
+import os
+import random
+import statistics
+import time
+from typing import List
+
+from nodes.chains import FILTER_FORMAT_INSTRUCTIONS, create_filter_chain
+from state import ScrapedContent
+from tools.recipe_extractor import extract_recipe
+from utils.prompt_compaction import RecipePromptCompactor, estimate_text_tokens
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+_LONG_STEP_PARTS = [
+    "把{item}洗干净后沥干水分，切成大小均匀的块，这样受热更均匀，口感也更好",
+    "锅里倒入适量的油，油温五成热的时候下入{item}，小火慢慢煸炒出香味，注意不要炒糊了哦",
+    "加入生抽、老抽和一点点白糖调味，翻炒均匀后盖上锅盖焖煮十分钟左右，中间记得翻动一两次",
+    "小贴士：{item}一定要提前腌制半小时以上，这样更入味，喜欢吃辣的朋友可以多放一些辣椒",
+    "最后大火收汁，汤汁变得浓稠、均匀地裹在{item}上就可以关火了（如图）",
+]
+_BOILERPLATE = ["完成啦！！！😋😋", "喜欢的话记得点赞收藏关注我哦~更多菜谱请看主页", "开吃~~~"]
+_ITEMS = ["鸡翅", "五花肉", "土豆", "茄子", "豆腐", "排骨"]
+
+
+def load_fixture_recipes() -> List[ScrapedContent]:
+    recipes = []
+    for path in sorted(glob.glob(os.path.join(FIXTURE_DIR, "douguo_recipe_*.html"))):
+        with open(path, encoding="utf-8") as f:
+            recipe = extract_recipe(f.read())
+        recipes.append({"url": path, **recipe})
+    return recipes
+
+
+def make_long_recipe(index: int) -> ScrapedContent:
+    """生成一个真实长菜谱风格的菜谱：带序号的冗长步骤、小贴士、表情、推广语和模糊用量"""
+    rng = random.Random(index)
+    item = rng.choice(_ITEMS)
+    steps = []
+    for number in range(rng.randint(8, 16)):
+        text = "，".join(part.format(item=item) for part in rng.sample(_LONG_STEP_PARTS, rng.randint(1, 3)))
+        steps.append(f"第{number + 1}步：{text}。✨")
+    steps += rng.sample(_BOILERPLATE, 2)
+    ingredients = [{"name": item, "quantity": "500克（约两斤左右，可以根据家里人数增减）"},
+                   {"name": "生抽", "quantity": "2汤匙"}, {"name": "老抽", "quantity": "1茶匙"},
+                   {"name": "白糖", "quantity": "少许"}, {"name": "盐", "quantity": "适量"},
+                   {"name": "葱", "quantity": "2根"}, {"name": "姜", "quantity": "3片"},
+                   {"name": "干辣椒", "quantity": "按口味"}, {"name": "葱", "quantity": "适量"}]
+    return {"url": f"https://www.douguo.com/cookbook/{index}.html", "title": f"🔥超下饭的红烧{item}🔥",
+            "ingredients": ingredients, "steps": steps}
+
+
+def render_prompt(prompt, inputs: dict) -> str:
+    return prompt.format(user_ingredients="鸡蛋, 番茄, 土豆", other_requirements="简单快手",
+                         format_instructions=FILTER_FORMAT_INSTRUCTIONS, **inputs)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--budget", type=int, default=300, help="每个菜谱的 token 预算")
+    arg_parser.add_argument("--step-max-chars", type=int, default=60, help="单个步骤保留的最多字符数")
+    arg_parser.add_argument("--long", type=int, default=20, help="生成的长菜谱数量")
+    arg_parser.add_argument("-v", "--verbose", action="store_true", help="打印每个长菜谱压缩后的步骤")
+    args = arg_parser.parse_args()
+
+    prompt = create_filter_chain().first
+    compactor = RecipePromptCompactor(budget=args.budget, step_max_chars=args.step_max_chars)
+    groups = [("录制详情页", load_fixture_recipes()), ("长菜谱", [make_long_recipe(i) for i in range(args.long)])]
+
+    print(f"每个菜谱的预算 {args.budget} token, 单步最多 {args.step_max_chars} 字, token 为估算值")
+    print(f"{'样本':<8}{'数量':>6}{'提示词(前)':>12}{'提示词(后)':>12}{'菜谱部分(前)':>14}{'菜谱部分(后)':>14}"
+          f"{'节省':>8}{'压缩耗时':>12}")
+    for name, recipes in groups:
+        prompt_before, prompt_after, recipe_before, recipe_after, timings = [], [], [], [], []
+        for recipe in recipes:
+            raw = RecipePromptCompactor.raw_inputs(recipe)
+            start = time.perf_counter()
+            compacted = compactor._compact(recipe)[0]
+            timings.append(time.perf_counter() - start)
+            prompt_before.append(estimate_text_tokens(render_prompt(prompt, raw)))
+            prompt_after.append(estimate_text_tokens(render_prompt(prompt, compacted)))
+            recipe_before.append(sum(estimate_text_tokens(text) for text in raw.values()))
+            recipe_after.append(sum(estimate_text_tokens(text) for text in compacted.values()))
+            if args.verbose and name == "长菜谱":
+                print(f"\n[{recipe['title']}] {recipe_before[-1]} -> {recipe_after[-1]} token")
+                print(compacted["recipe_ingredients"])
+                print(compacted["recipe_steps"])
+        saved = 1 - sum(prompt_after) / sum(prompt_before)
+        print(f"{name:<8}{len(recipes):>6}{statistics.mean(prompt_before):>12.0f}{statistics.mean(prompt_after):>12.0f}"
+              f"{statistics.mean(recipe_before):>14.0f}{statistics.mean(recipe_after):>14.0f}{saved:>8.0%}"
+              f"{statistics.mean(timings) * 1e6:>10.0f}µs")
+        over_budget = sum(1 for tokens in recipe_after if tokens > args.budget)
+        if over_budget:
+            print(f"  !! {over_budget} 个菜谱压缩后仍超过预算（标题和食材本身已超出）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+"""
+离线端到端基准：在子进程中启动豆果替身站点（benchmarks/fake_douguo_server.py）和 LLM 替身
+（benchmarks/fake_llm_server.py），把应用的服务地址指向它们，然后用 benchmarks/fixtures/planner_queries.jsonl
+中的请求驱动聊天流程（nodes.graph.get_chat_app）和联网搜索流程（main.build_search_graph）。
+
+对每个流程和每个并发数报告: 延迟 p50/p95、首 token 延迟（聊天流程）、吞吐、峰值 RSS 和各节点耗时，
+结果写入 JSON 文件，可用 --compare 与之前的结果对比。
+各种缓存和持久化统计默认关闭并放在临时目录中，保证每次运行的条件相同；--cache 开启缓存。
+
+运行: python -m benchmarks.bench_e2e [--graphs chat search] [--concurrency 1 4 8] [--requests 36]
+      [--douguo-latency 0.2] [--llm-delay 0.5] [--output result.json] [--compare baseline.json]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import resource
+import socket
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"替身服务未能在 {timeout}s 内启动: 端口 {port}")
+
+
+def start_servers(args) -> List[multiprocessing.Process]:
+    """在独立进程中启动两个替身，避免与被测应用争抢 GIL 或计入它的内存"""
+    from benchmarks import fake_douguo_server, fake_llm_server
+
+    context = multiprocessing.get_context("spawn")
+    servers = [
+        context.Process(target=fake_douguo_server.serve, daemon=True,
+                        args=(args.douguo_port, args.douguo_latency, args.douguo_jitter, args.douguo_pages,
+                              args.douguo_broken_rate)),
+        context.Process(target=fake_llm_server.serve, daemon=True,
+                        args=(args.llm_port, args.llm_delay, args.token_delay, args.accept_rate,
+                              args.llm_error_rate, args.llm_capacity, args.llm_malformed_rate)),
+    ]
+    for server in servers:
+        server.start()
+    wait_for_port(args.douguo_port)
+    wait_for_port(args.llm_port)
+    return servers
+
+
+def configure_environment(args, state_dir: str):
+    """把服务地址指向替身，并把所有持久化状态放到临时目录；必须在导入应用模块之前调用"""
+    os.environ.update({
+        "RECIPE_DOUGUO_BASE_URL": f"http://127.0.0.1:{args.douguo_port}",
+        "RECIPE_LLM_BASE_URL": f"http://127.0.0.1:{args.llm_port}/v1",
+        "DASHSCOPE_HTTP_BASE_URL": f"http://127.0.0.1:{args.llm_port}/api/v1",
+        "DASHSCOPE_API_KEY": "offline-benchmark",
+        "DOUGUO_AUTH_STATE_PATH": "",
+        "RECIPE_STORE_PATH": os.path.join(state_dir, "recipe_store.sqlite3"),
+        "RECIPE_LLM_CACHE_DISK_PATH": os.path.join(state_dir, "llm_cache.sqlite3"),
+        "RECIPE_ACCEPTANCE_STATS_PATH": os.path.join(state_dir, "acceptance_stats.sqlite3"),
+        "RECIPE_SEARCH_CACHE_DISK_PATH": "",
+    })
+    if not args.cache:
+        for name in ("RECIPE_STORE_ENABLED", "RECIPE_SEARCH_CACHE_ENABLED", "RECIPE_LLM_CACHE_ENABLED"):
+            os.environ[name] = "0"
+        os.environ["RECIPE_CORPUS_MODE"] = "off"
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """线性插值的分位数，q 取值 0~100"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def _round(value: Optional[float], digits: int = 3) -> Optional[float]:
+    return round(value, digits) if value is not None else None
+
+
+def _fmt(value: Optional[float]) -> str:
+    return f"{value:.2f}" if value is not None else "-"
+
+
+def current_rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        # 非 Linux 平台退回到进程生命周期内的峰值（macOS 上单位是字节）
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if platform.system() == "Darwin" else peak / 2 ** 10
+
+
+async def _sample_rss(peak: Dict[str, float], interval: float = 0.05):
+    while True:
+        peak["rss_mb"] = max(peak["rss_mb"], current_rss_mb())
+        await asyncio.sleep(interval)
+
+
+async def run_chat_query(app, query: str) -> Dict[str, float]:
+    """驱动聊天流程，记录首个润色 token 和最终结果的耗时"""
+    start = time.perf_counter()
+    first_token = None
+    async for mode, event in app.astream({"user_raw_query": query}, stream_mode=["updates", "custom"]):
+        if mode == "custom" and "output_token" in event and first_token is None:
+            first_token = time.perf_counter() - start
+    return {"latency": time.perf_counter() - start, "ttft": first_token}
+
+
+async def run_search_query(app, query: str) -> Dict[str, float]:
+    start = time.perf_counter()
+    await app.ainvoke({"user_raw_query": query})
+    return {"latency": time.perf_counter() - start, "ttft": None}
+
+
+async def run_level(graph_name: str, app, queries: List[str], concurrency: int) -> Dict:
+    """以固定并发数跑完一组请求，返回该并发数下的统计"""
+    from utils.telemetry import get_telemetry
+
+    telemetry = get_telemetry()
+    telemetry.reset()
+    run_query = run_chat_query if graph_name == "chat" else run_search_query
+    semaphore = asyncio.Semaphore(concurrency)
+    samples, errors = [], []
+
+    async def one(query: str):
+        async with semaphore:
+            try:
+                samples.append(await run_query(app, query))
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+
+    peak = {"rss_mb": current_rss_mb()}
+    sampler = asyncio.create_task(_sample_rss(peak))
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(one(query) for query in queries))
+    finally:
+        sampler.cancel()
+    wall = time.perf_counter() - start
+
+    latencies = [sample["latency"] for sample in samples]
+    ttfts = [sample["ttft"] for sample in samples if sample["ttft"] is not None]
+    spans = {
+        key: {"count": int(value["count"]), "total_s": round(value["total_seconds"], 4),
+              "mean_ms": round(value["total_seconds"] / value["count"] * 1000, 2)}
+        for key, value in sorted(telemetry.span_summary().items()) if value["count"]
+    }
+    return {
+        "graph": graph_name,
+        "concurrency": concurrency,
+        "requests": len(queries),
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(samples) / wall, 3) if wall else None,
+        "latency_s": {
+            "p50": _round(percentile(latencies, 50)), "p95": _round(percentile(latencies, 95)),
+            "mean": _round(sum(latencies) / len(latencies) if latencies else None),
+            "max": _round(max(latencies, default=None)),
+        },
+        "ttft_s": {"p50": _round(percentile(ttfts, 50)), "p95": _round(percentile(ttfts, 95))},
+        "peak_rss_mb": round(peak["rss_mb"], 1),
+        "spans": spans,
+    }
+
+
+def build_graphs(names: List[str]) -> Dict:
+    graphs = {}
+    if "chat" in names:
+        from nodes.graph import get_chat_app
+        graphs["chat"] = get_chat_app()
+    if "search" in names:
+        from main import build_search_graph
+        graphs["search"] = build_search_graph()
+    return graphs
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def print_run(run: Dict):
+    latency, ttft = run["latency_s"], run["ttft_s"]
+    ttft_text = f"{ttft['p50']:.2f}" if ttft["p50"] is not None else "-"
+    print(f"{run['graph']:>6}{run['concurrency']:>6}{run['requests']:>6}{run['errors']:>6}"
+          f"{_fmt(latency['p50']):>9}{_fmt(latency['p95']):>9}{ttft_text:>9}"
+          f"{run['throughput_rps']:>10.2f}{run['peak_rss_mb']:>10.1f}")
+    nodes = {key: value for key, value in run["spans"].items() if key.startswith("node/")}
+    for key, value in nodes.items():
+        print(f"{'':>12}{key[5:]:<28}{value['count']:>6} 次  平均 {value['mean_ms']:>9.1f} ms")
+
+
+def compare(baseline_path: str, runs: List[Dict]):
+    """按 (流程, 并发数) 对比 p50/p95 延迟和吞吐的变化"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(run["graph"], run["concurrency"]): run for run in json.load(f)["runs"]}
+    print(f"\n与 {baseline_path} 对比（负数表示延迟降低，正数表示吞吐提高）:")
+    for run in runs:
+        old = baseline.get((run["graph"], run["concurrency"]))
+        if old is None:
+            continue
+        changes = []
+        for label, new_value, old_value in (("p50", run["latency_s"]["p50"], old["latency_s"]["p50"]),
+                                            ("p95", run["latency_s"]["p95"], old["latency_s"]["p95"]),
+                                            ("吞吐", run["throughput_rps"], old["throughput_rps"])):
+            if new_value is not None and old_value:
+                changes.append(f"{label} {old_value:.2f}→{new_value:.2f} ({(new_value - old_value) / old_value:+.0%})")
+        print(f"  {run['graph']:>6} 并发 {run['concurrency']:>3}: " + ", ".join(changes))
+
+
+async def run_all(args, queries: List[str]) -> List[Dict]:
+    graphs = build_graphs(args.graphs)
+    runs = []
+    print(f"{'流程':>5}{'并发':>4}{'请求':>4}{'错误':>4}{'p50(s)':>9}{'p95(s)':>9}{'首token':>7}"
+          f"{'吞吐(rps)':>9}{'RSS(MB)':>10}")
+    for graph_name, app in graphs.items():
+        if args.warmup:
+            await run_level(graph_name, app, queries[:1], 1)
+        for concurrency in args.concurrency:
+            run = await run_level(graph_name, app, queries, concurrency)
+            runs.append(run)
+            print_run(run)
+    return runs
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--graphs", nargs="+", choices=["chat", "search"], default=["chat", "search"])
+    arg_parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8], help="同时进行的请求数")
+    arg_parser.add_argument("--requests", type=int, default=0, help="每个并发数下的请求数，默认使用全部样例请求")
+    arg_parser.add_argument("--douguo-latency", type=float, default=0.2, help="替身站点每个请求的平均延迟（秒）")
+    arg_parser.add_argument("--douguo-jitter", type=float, default=0.5, help="替身站点延迟的相对抖动")
+    arg_parser.add_argument("--douguo-pages", type=int, default=3, help="每个关键词的搜索结果页数")
+    arg_parser.add_argument("--douguo-broken-rate", type=float, default=0.0, help="替身站点步骤区域改版的详情页比例")
+    arg_parser.add_argument("--llm-delay", type=float, default=0.5, help="LLM 替身每次调用的首 token 延迟（秒）")
+    arg_parser.add_argument("--token-delay", type=float, default=0.002, help="LLM 替身每个输出字符的延迟（秒）")
+    arg_parser.add_argument("--accept-rate", type=float, default=0.6, help="LLM 替身判定菜谱通过的比例")
+    arg_parser.add_argument("--llm-error-rate", type=float, default=0.0, help="LLM 替身直接返回 429 的请求比例")
+    arg_parser.add_argument("--llm-capacity", type=int, default=0, help="LLM 替身不变慢的最大并发数，0 表示不模拟过载")
+    arg_parser.add_argument("--llm-malformed-rate", type=float, default=0.0, help="LLM 替身返回不规范 JSON 的比例")
+    arg_parser.add_argument("--cache", action="store_true", help="开启菜谱存储、搜索缓存、LLM缓存和离线语料")
+    arg_parser.add_argument("--no-warmup", dest="warmup", action="store_false", help="不做预热请求")
+    arg_parser.add_argument("--douguo-port", type=int, default=0, help="替身站点端口，0 表示自动选择")
+    arg_parser.add_argument("--llm-port", type=int, default=0, help="LLM 替身端口，0 表示自动选择")
+    arg_parser.add_argument("--output", help="结果 JSON 路径，默认写到 benchmarks/results/ 下")
+    arg_parser.add_argument("--compare", help="与之前的结果 JSON 对比")
+    args = arg_parser.parse_args()
+    args.douguo_port = args.douguo_port or free_port()
+    args.llm_port = args.llm_port or free_port()
+
+    # 联网搜索流程没有爬取结果，生成节点的“没有可用食谱”告警属于预期，这里一并关闭
+    logging.disable(logging.WARNING)
+    with tempfile.TemporaryDirectory(prefix="recipe-bench-") as state_dir:
+        # 应用的 settings 在首次导入时读取环境变量，因此先配置环境，再导入任何应用模块
+        configure_environment(args, state_dir)
+        from benchmarks.bench_planner import load_queries
+
+        queries = [item["query"] for item in load_queries()]
+        if args.requests:
+            queries = (queries * (args.requests // len(queries) + 1))[:args.requests]
+        servers = start_servers(args)
+        try:
+            runs = asyncio.run(run_all(args, queries))
+        finally:
+            for server in servers:
+                server.terminate()
+
+    result = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "args": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        },
+        "runs": runs,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"e2e-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已写入 {output}")
+    if args.compare:
+        compare(args.compare, runs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+菜谱详情页解析的微基准：对比旧实现（BeautifulSoup 分别解析用料和步骤，共两次完整解析）
+与 tools.recipe_extractor.extract_recipe（lxml 单次解析）的单页耗时和峰值内存。
+峰值内存取解析一次页面带来的最大常驻内存增量（Linux 读 /proc 的 VmHWM，其他 Unix 用 ru_maxrss），
+包含 lxml 在 C 层分配的内存；每种实现在单独的子进程中测量，互不影响。
+
+运行: python -m benchmarks.bench_extract [--rounds 200]
+"""
+import argparse
+import glob
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+from tools.recipe_extractor import extract_recipe
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def baseline_extract(html_content: str) -> dict:
+    """改造前 DouguoRecipeScraper 的解析方式：标题、用料、步骤各自构建一棵 BeautifulSoup 树"""
+    soup = BeautifulSoup(html_content, 'lxml')
+    title_tag = soup.select_one('h1.title')
+    title = title_tag.get_text(strip=True) if title_tag else ""
+
+    soup = BeautifulSoup(html_content, 'lxml')
+    ingredients = []
+    table = soup.select_one('table.retamr')
+    if table:
+        for cell in table.select('td'):
+            name_span = cell.select_one('span.scname')
+            quantity_span = cell.select_one('span.scnum')
+            if name_span and quantity_span:
+                ingredients.append({'name': name_span.get_text(strip=True),
+                                    'quantity': quantity_span.get_text(strip=True)})
+
+    soup = BeautifulSoup(html_content, 'lxml')
+    steps = []
+    for container in soup.select('div.stepcont.clearfix'):
+        info_div = container.select_one('div.stepinfo')
+        if info_div:
+            step_number_tag = info_div.find('p')
+            if step_number_tag:
+                step_number_tag.decompose()
+            step_text = info_div.get_text(strip=True)
+            if step_text:
+                steps.append(step_text)
+    return {'title': title, 'ingredients': ingredients, 'steps': steps}
+
+
+_PROC_STATUS = "/proc/self/status"
+
+
+def _status_kb(field: str) -> float:
+    with open(_PROC_STATUS) as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return float(line.split()[1])
+    raise KeyError(field)
+
+
+def _max_rss_kb() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 以字节为单位，Linux 以 KB 为单位
+    return usage / 1024 if sys.platform == "darwin" else usage
+
+
+def _peak_rss_worker(func, html_content: str, queue):
+    if os.path.exists(_PROC_STATUS):
+        # Linux：先把峰值重置为当前常驻内存，避免解释器启动和导入时的峰值掩盖解析的开销
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        before = _status_kb("VmRSS")
+        func(html_content)
+        queue.put(_status_kb("VmHWM") - before)
+    else:
+        # 其他 Unix 的 ru_maxrss 不能重置，低于启动时峰值的部分测不到
+        before = _max_rss_kb()
+        func(html_content)
+        queue.put(_max_rss_kb() - before)
+
+
+def peak_rss_kb(func, html_content: str) -> float:
+    """在新的子进程中解析一次页面，返回解析带来的最大常驻内存增量（KB）"""
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_peak_rss_worker, args=(func, html_content, queue))
+    process.start()
+    peak = queue.get()
+    process.join()
+    return peak
+
+
+def measure(func, html_content: str, rounds: int):
+    """返回 (单页平均耗时毫秒, 单页峰值内存KB)"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(html_content)
+    elapsed_ms = (time.perf_counter() - start) * 1000 / rounds
+    return elapsed_ms, peak_rss_kb(func, html_content)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--rounds", type=int, default=200, help="每个页面重复解析的次数")
+    args = arg_parser.parse_args()
+
+    fixtures = sorted(glob.glob(os.path.join(FIXTURE_DIR, "douguo_recipe_*.html")))
+    print(f"{'页面':<36}{'大小KB':>8}{'旧耗时ms':>10}{'新耗时ms':>10}{'旧峰值KB':>10}{'新峰值KB':>10}")
+    for path in fixtures:
+        with open(path, "r", encoding="utf-8") as f:
+            html_content = f.read()
+        # 先确认两种实现的结果完全一致
+        assert baseline_extract(html_content) == extract_recipe(html_content), f"解析结果不一致: {path}"
+
+        old_ms, old_kb = measure(baseline_extract, html_content, args.rounds)
+        new_ms, new_kb = measure(extract_recipe, html_content, args.rounds)
+        print(f"{os.path.basename(path):<36}{len(html_content.encode()) / 1024:>8.1f}"
+              f"{old_ms:>10.2f}{new_ms:>10.2f}{old_kb:>10.0f}{new_kb:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
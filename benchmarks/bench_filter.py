@@ -0,0 +1,100 @@
+"""
+filter_recipes_node 的延迟基准：用固定延迟的本地假 LLM 替换筛选链中的模型，
+对比不同候选数量下串行（并发上限 1）与并发评估、逐个与批量评估的总耗时。
+
+运行: python -m benchmarks.bench_filter [--delay 0.5] [--counts 5 10 20 40]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import re
+import time
+from typing import Any, List, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+import nodes.graph as graph
+from nodes.chains import create_filter_chain, create_batch_filter_chain
+from utils import concurrency
+from utils.llm_gateway import ManagedChatModel
+
+
+class DelayedFakeChatModel(BaseChatModel):
+    """按提示词中的菜谱编号返回合法的筛选结果，每次调用固定延迟 delay 秒"""
+    delay: float = 0.5
+
+    @property
+    def _llm_type(self) -> str:
+        return "delayed-fake"
+
+    @staticmethod
+    def _respond(messages: List[BaseMessage]) -> str:
+        prompt = messages[-1].content
+        indices = [int(i) for i in re.findall(r"【菜谱 (\d+)】", prompt)]
+        if not indices:
+            return json.dumps({"decision": True, "reasoning": "食材匹配", "score": 7}, ensure_ascii=False)
+        return json.dumps({"decisions": [
+            {"index": i, "decision": True, "reasoning": "食材匹配", "score": 7} for i in indices
+        ]}, ensure_ascii=False)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.delay)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._respond(messages)))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.delay)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._respond(messages)))])
+
+
+def make_state(count: int) -> dict:
+    recipes = [{
+        'url': f"https://www.douguo.com/cookbook/{i}.html",
+        'title': f"测试菜谱{i}",
+        'ingredients': [{'name': '鸡蛋', 'quantity': '2个'}, {'name': '番茄', 'quantity': '1个'}],
+        'steps': ["番茄切块。", "鸡蛋打散炒熟。", "混合翻炒出锅。"],
+    } for i in range(count)]
+    return {'user_ingredients': ['鸡蛋', '番茄'], 'requirements': '简单', 'scraped_contents': recipes,
+            'recipe_count': 3, 'messages': []}
+
+
+async def run_once(count: int, limit: int, batch_size: int) -> float:
+    concurrency.get_llm_limiter().set_limit(limit)
+    graph.settings.FILTER_BATCH_SIZE = batch_size
+    start = time.perf_counter()
+    await graph.filter_recipes_node(make_state(count))
+    return time.perf_counter() - start
+
+
+async def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--delay", type=float, default=0.5, help="假 LLM 每次调用的延迟（秒）")
+    arg_parser.add_argument("--counts", type=int, nargs="+", default=[5, 10, 20, 40], help="候选菜谱数量")
+    arg_parser.add_argument("--concurrency", type=int, default=graph.settings.LLM_MAX_CONCURRENCY,
+                            help="并发模式下的LLM并发上限")
+    args = arg_parser.parse_args()
+
+    fake_llm = DelayedFakeChatModel(delay=args.delay)
+    # 替换筛选链中的模型，并关闭节点中的打印以免干扰计时输出
+    # 假 LLM 同样经过调用管理层排队；关闭自适应并发，各组对比的并发上限保持固定
+    fake_llm = ManagedChatModel(inner=fake_llm, chain_name="filter")
+    graph.settings.LLM_ADAPTIVE_CONCURRENCY = False
+    graph.filter_chain = create_filter_chain().first | fake_llm | create_filter_chain().last
+    graph.batch_filter_chain = create_batch_filter_chain().first | fake_llm | create_batch_filter_chain().last
+    logging.disable(logging.INFO)
+
+    modes = [("串行/逐个", 1, 1), (f"并发{args.concurrency}/逐个", args.concurrency, 1),
+             ("串行/批量5", 1, 5), (f"并发{args.concurrency}/批量5", args.concurrency, 5)]
+    print(f"假 LLM 延迟 {args.delay}s, 单位: 秒")
+    print(f"{'候选数':>6}" + "".join(f"{name:>16}" for name, _, _ in modes))
+    for count in args.counts:
+        timings = [await run_once(count, limit, batch_size) for _, limit, batch_size in modes]
+        print(f"{count:>6}" + "".join(f"{t:>16.2f}" for t in timings))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
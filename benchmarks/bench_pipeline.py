@@ -0,0 +1,106 @@
+"""
+爬取→筛选 的端到端延迟基准：用固定延迟的假详情页抓取和假 LLM，
+对比屏障模式（scraper 全部抓完再交给 filter）与流水线模式（边抓边评分，够数后提前结束）的总耗时。
+
+LLM 并发上限越小（例如多个会话共享进程级上限时），评分阶段越成为瓶颈，流水线重叠的收益越明显。
+
+运行: python -m benchmarks.bench_pipeline [--fetch-delay 0.8] [--llm-delay 1.0] [--counts 2 4] [--concurrency 1 4]
+"""
+import argparse
+import asyncio
+import logging
+import random
+import time
+from typing import Dict, List, Optional
+
+from langgraph.graph import StateGraph, END
+
+import nodes.graph as graph
+from benchmarks.bench_filter import DelayedFakeChatModel
+from nodes.chains import create_filter_chain, create_batch_filter_chain
+from state import RecipeGraphState
+from tools.douguo_scraper import DouguoRecipeScraper
+from utils import concurrency
+from utils.acceptance_stats import AcceptanceStats
+from utils.llm_gateway import ManagedChatModel
+
+
+class FakeDouguoScraper(DouguoRecipeScraper):
+    """搜索结果固定，详情页通过“HTTP 直连”以随机延迟返回（仍受按域名限速约束），不访问网络"""
+
+    def __init__(self, fetch_delay: float):
+        super().__init__(http_fetcher=object())
+        self.fetch_delay = fetch_delay
+
+    async def search_recipe_urls(self, search_keywords: List[str], total_recipes_needed: int,
+                                 pages_to_scrape: int) -> List[str]:
+        await asyncio.sleep(0.1)
+        return [f"https://www.douguo.com/cookbook/{i}.html" for i in range(total_recipes_needed)]
+
+    async def scrape_recipe_detail_http(self, url: str) -> Optional[Dict]:
+        await self.rate_limiter.wait(url)
+        await asyncio.sleep(self.fetch_delay * random.uniform(0.2, 1.0))
+        index = url.rsplit("/", 1)[-1].split(".")[0]
+        return {'url': url, 'title': f"番茄炒蛋{index}",
+                'ingredients': [{'name': '鸡蛋', 'quantity': '2个'}, {'name': '番茄', 'quantity': '1个'}],
+                'steps': ["番茄切块。", "鸡蛋打散炒熟。", "混合翻炒出锅。"]}
+
+
+def build_app(streaming: bool):
+    workflow = StateGraph(RecipeGraphState)
+    if streaming:
+        workflow.add_node("scraper", graph.stream_scrape_filter_node)
+        workflow.set_entry_point("scraper")
+        workflow.add_edge("scraper", END)
+    else:
+        workflow.add_node("scraper", graph.scrape_node)
+        workflow.add_node("filter", graph.filter_recipes_node)
+        workflow.set_entry_point("scraper")
+        workflow.add_edge("scraper", "filter")
+        workflow.add_edge("filter", END)
+    return workflow.compile()
+
+
+async def run_once(app, recipe_count: int) -> float:
+    inputs = {'search_keywords': ['番茄炒蛋'], 'user_ingredients': ['鸡蛋', '番茄'], 'requirements': '',
+              'recipe_count': recipe_count, 'messages': []}
+    start = time.perf_counter()
+    await app.ainvoke(inputs)
+    return time.perf_counter() - start
+
+
+async def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--fetch-delay", type=float, default=0.8, help="单个详情页的最大抓取延迟（秒）")
+    arg_parser.add_argument("--llm-delay", type=float, default=1.0, help="假 LLM 每次调用的延迟（秒）")
+    arg_parser.add_argument("--counts", type=int, nargs="+", default=[2, 4], help="需要的菜谱数量")
+    arg_parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4], help="LLM并发上限")
+    args = arg_parser.parse_args()
+
+    fake_llm = DelayedFakeChatModel(delay=args.llm_delay)
+    # 假 LLM 同样经过调用管理层排队；关闭自适应并发，各组对比的并发上限保持固定
+    fake_llm = ManagedChatModel(inner=fake_llm, chain_name="filter")
+    graph.settings.LLM_ADAPTIVE_CONCURRENCY = False
+    graph.filter_chain = create_filter_chain().first | fake_llm | create_filter_chain().last
+    graph.batch_filter_chain = create_batch_filter_chain().first | fake_llm | create_batch_filter_chain().last
+    graph._create_douguo_scraper = lambda: FakeDouguoScraper(args.fetch_delay)
+    graph.settings.CORPUS_MODE = "off"
+    # 每次运行都从没有历史的通过率统计开始，两种模式的首轮预算相同
+    graph.get_acceptance_stats = lambda: AcceptanceStats(":memory:")
+    logging.disable(logging.INFO)
+
+    barrier, streaming = build_app(streaming=False), build_app(streaming=True)
+    print(f"详情页延迟 ≤{args.fetch_delay}s, 按域名限速 {graph.settings.DETAIL_RATE_PER_HOST}/s, "
+          f"假 LLM 延迟 {args.llm_delay}s, 批大小 {graph.settings.FILTER_BATCH_SIZE}, 单位: 秒")
+    print(f"{'LLM并发':>6}{'需要数量':>6}{'候选数':>6}{'屏障模式':>10}{'流水线模式':>10}")
+    for limit in args.concurrency:
+        concurrency.get_llm_limiter().set_limit(limit)
+        for count in args.counts:
+            random.seed(count)
+            barrier_time = await run_once(barrier, count)
+            random.seed(count)
+            streaming_time = await run_once(streaming, count)
+            print(f"{limit:>9}{count:>10}{count * 5:>9}{barrier_time:>14.2f}{streaming_time:>14.2f}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
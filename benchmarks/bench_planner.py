@@ -0,0 +1,65 @@
+"""
+规则规划器的基准：在一组真实风格的用户请求上统计走规则快速通道的比例、
+规则结果与标注的一致率，以及规划耗时和按假定LLM延迟估算节省的时间。
+
+运行: python -m benchmarks.bench_planner [--min-confidence 0.85] [--llm-latency 1.5] [-v]
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+from utils.query_planner import rule_based_plan
+
+QUERIES_PATH = os.path.join(os.path.dirname(__file__), "fixtures", "planner_queries.jsonl")
+
+
+def load_queries(path: str = QUERIES_PATH) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def matches(plan, expected: dict) -> bool:
+    return (set(plan.search_keywords) == set(expected["search_keywords"])
+            and set(plan.user_ingredients) == set(expected["user_ingredients"])
+            and plan.recipe_count == expected["recipe_count"])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--min-confidence", type=float, default=0.85)
+    parser.add_argument("--llm-latency", type=float, default=1.5, help="假定的一次LLM解析耗时（秒）")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+
+    queries = load_queries()
+    rule_hits, correct, timings = 0, 0, []
+    for item in queries:
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            plan, confidence = rule_based_plan(item["query"])
+        timings.append((time.perf_counter() - start) / args.repeat)
+
+        use_rules = plan is not None and confidence >= args.min_confidence
+        ok = use_rules and matches(plan, item)
+        rule_hits += use_rules
+        correct += ok
+        if args.verbose:
+            path = "rules" if use_rules else "llm"
+            detail = plan.model_dump() if plan is not None else None
+            print(f"[{path:5}] conf={confidence:.2f} {'OK ' if ok else ('BAD' if use_rules else '   ')} "
+                  f"{item['query']} -> {detail}")
+
+    total = len(queries)
+    saved = rule_hits * args.llm_latency
+    print(f"查询数: {total}")
+    print(f"规则通道: {rule_hits}/{total} ({rule_hits / total:.0%}), 其中与标注一致 {correct}/{rule_hits}")
+    print(f"规划耗时: 平均 {statistics.mean(timings) * 1e6:.0f}µs, 最大 {max(timings) * 1e6:.0f}µs")
+    print(f"按每次LLM解析 {args.llm_latency:.1f}s 估算: 共节省 {saved:.1f}s, "
+          f"平均每个请求节省 {saved / total:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
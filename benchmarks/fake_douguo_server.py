@@ -0,0 +1,145 @@
+"""
+豆果美食的本地替身：用 benchmarks/fixtures 中录制的搜索结果页和详情页做模板，
+对任意关键词生成搜索结果（每页 20 条，带“下一页”链接），详情页按编号轮流返回录制的菜谱页面，
+并按配置模拟网络延迟。爬虫的 HTTP 快速通道可以直接抓取它，不访问 douguo.com。
+--broken-rate 比例的详情页（按编号固定）改用另一套步骤区域的标记，模拟站点改版后确定性解析拿不到步骤。
+
+运行: python -m benchmarks.fake_douguo_server [--port 8801] [--latency 0.2] [--jitter 0.5] [--pages 3] [--broken-rate 0]
+爬虫指向它: RECIPE_DOUGUO_BASE_URL=http://127.0.0.1:8801
+"""
+import argparse
+import glob
+import os
+import random
+import re
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+RESULTS_PER_PAGE = 20
+
+_SEARCH_PATH = re.compile(r"^/search/recipe/([^/]+)(?:/0/(\d+))?/?$")
+_RECIPE_PATH = re.compile(r"^/cookbook/(\d+)\.html$")
+_COOK_LIST = re.compile(r'(<ul class="cook-list">).*?(</ul>)', re.S)
+_PAGES = re.compile(r'<div class="pages">.*?</div>', re.S)
+_RECIPE_TITLE = re.compile(r'(<h1 class="title[^"]*">)(.*?)(</h1>)', re.S)
+_STEP_INFO = re.compile(r'class="stepinfo')
+
+
+def _read(path: str) -> str:
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+class FixtureSite:
+    """根据录制的页面模板生成搜索结果页和详情页"""
+
+    def __init__(self, fixture_dir: str = FIXTURE_DIR, max_pages: int = 3, broken_rate: float = 0.0):
+        """
+        :param fixture_dir: 录制页面所在目录
+        :param max_pages: 每个关键词的搜索结果页数，最后一页不带“下一页”链接
+        :param broken_rate: 步骤区域改用另一套标记的详情页比例
+        """
+        self.search_template = _read(os.path.join(fixture_dir, "douguo_search_sandwich.html"))
+        recipe_paths = sorted(glob.glob(os.path.join(fixture_dir, "douguo_recipe_*.html")))
+        self.recipe_pages = [_read(path) for path in recipe_paths]
+        self.max_pages = max_pages
+        self.broken_rate = broken_rate
+
+    def search_page(self, query: str, offset: int) -> str:
+        # 同一关键词总是得到同一批菜谱编号，不同关键词的编号互不重叠
+        base_id = (zlib.crc32(query.encode("utf-8")) % 100000) * 1000
+        items = []
+        for i in range(offset, offset + RESULTS_PER_PAGE):
+            recipe_id = base_id + i
+            items.append(
+                f'<li class="clearfix"><a class="cook-img" href="/cookbook/{recipe_id}.html"></a>'
+                f'<div class="cook-info"><a class="cookname text-lips" href="/cookbook/{recipe_id}.html" '
+                f'target="_blank">{query}{i + 1}</a></div></li>'
+            )
+        page_number = offset // RESULTS_PER_PAGE + 1
+        pages = f'<div class="pages"><span class="current">{page_number}</span>'
+        if page_number < self.max_pages:
+            next_url = f"/search/recipe/{quote(query)}/0/{offset + RESULTS_PER_PAGE}"
+            pages += f'<a class="anext" href="{next_url}">下一页</a>'
+        pages += "</div>"
+        html_content = _COOK_LIST.sub(lambda m: m.group(1) + "".join(items) + m.group(2), self.search_template, 1)
+        return _PAGES.sub(lambda m: pages, html_content, 1)
+
+    def recipe_page(self, recipe_id: int) -> str:
+        template = self.recipe_pages[recipe_id % len(self.recipe_pages)]
+        # 标题带上编号，避免同名菜谱在筛选时被当作重复
+        page = _RECIPE_TITLE.sub(lambda m: f"{m.group(1)}{m.group(2)}#{recipe_id}{m.group(3)}", template, 1)
+        if zlib.crc32(str(recipe_id).encode("ascii")) % 1000 < self.broken_rate * 1000:
+            page = _STEP_INFO.sub('class="step-text', page)
+        return page
+
+
+def make_handler(site: FixtureSite, latency: float, jitter: float):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            time.sleep(max(0.0, latency * random.uniform(1 - jitter, 1 + jitter)))
+            path = self.path.split("?", 1)[0]
+            search_match = _SEARCH_PATH.match(path)
+            recipe_match = _RECIPE_PATH.match(path)
+            if search_match:
+                body = site.search_page(unquote(search_match.group(1)), int(search_match.group(2) or 0))
+            elif recipe_match:
+                body = site.recipe_page(int(recipe_match.group(1)))
+            else:
+                self.send_error(404)
+                return
+            payload = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def handle(self):
+            try:
+                super().handle()
+            except (BrokenPipeError, ConnectionResetError):
+                # 客户端提前取消请求（例如流水线够数后取消剩余的抓取和评分）
+                pass
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(port: int, latency: float = 0.2, jitter: float = 0.5, max_pages: int = 3, broken_rate: float = 0.0,
+          host: str = "127.0.0.1"):
+    """
+    启动替身站点并一直运行。
+
+    :param latency: 每个请求的平均延迟（秒）
+    :param jitter: 延迟的相对抖动，0.5 表示在 latency 的 50%~150% 之间均匀分布
+    :param max_pages: 每个关键词的搜索结果页数
+    :param broken_rate: 步骤区域改用另一套标记的详情页比例
+    """
+    site = FixtureSite(max_pages=max_pages, broken_rate=broken_rate)
+    server = ThreadingHTTPServer((host, port), make_handler(site, latency, jitter))
+    server.daemon_threads = True
+    server.serve_forever()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--port", type=int, default=8801)
+    arg_parser.add_argument("--latency", type=float, default=0.2, help="每个请求的平均延迟（秒）")
+    arg_parser.add_argument("--jitter", type=float, default=0.5, help="延迟的相对抖动")
+    arg_parser.add_argument("--pages", type=int, default=3, help="每个关键词的搜索结果页数")
+    arg_parser.add_argument("--broken-rate", type=float, default=0.0, help="步骤区域改用另一套标记的详情页比例")
+    args = arg_parser.parse_args()
+    print(f"豆果替身站点: http://127.0.0.1:{args.port}")
+    serve(args.port, args.latency, args.jitter, args.pages, args.broken_rate)
+
+
+if __name__ == "__main__":
+    main()
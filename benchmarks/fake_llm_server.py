@@ -0,0 +1,271 @@
+"""
+LLM 的本地替身，提供两个接口：
+- OpenAI 兼容的 /v1/chat/completions（支持 stream），供 utils/llm_provider.py 使用
+- DashScope 的文本生成接口，供 main.py 流程中的 DeepSearch 联网搜索使用
+
+按提示词中的输出格式说明识别是哪条链，返回符合 UserInputPlan / FilterDecision / BatchFilterDecision
+结构的 JSON，兜底解析链从提示词中的 HTML 片段里取出用料和步骤；润色等其他链返回一段固定文本。每次调用先等待 --delay 秒（首 token 延迟），
+再按输出长度每个字符等待 --token-delay 秒，流式调用时逐段发出。token 数按字符数近似。
+
+模拟服务端限流和过载：--error-rate 比例的请求直接返回 429（带 Retry-After）；
+--capacity 大于 0 时，同时进行的请求超过该数后首 token 延迟按 并发数/capacity 成比例增加。
+
+模拟不规范的结构化输出：--malformed-rate 比例的 JSON 回复被改写。请求带 response_format=json_object（JSON 模式）
+时只出现语法合法但类型不符的写法（分数写成 "8分"、批量结果直接返回数组）；否则还会出现代码块包裹、前后带说明文字、
+单引号和被截断的输出。截断的输出无法在本地修复，收到修正请求时返回完整内容。
+
+运行: python -m benchmarks.fake_llm_server [--port 8802] [--delay 0.5] [--token-delay 0.002] [--accept-rate 0.6]
+      [--error-rate 0] [--capacity 0] [--malformed-rate 0]
+应用指向它: RECIPE_LLM_BASE_URL=http://127.0.0.1:8802/v1 DASHSCOPE_HTTP_BASE_URL=http://127.0.0.1:8802/api/v1
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+from utils.query_planner import rule_based_plan
+
+_USER_QUERY = re.compile(r'用户请求如下:\s*"(.*)"', re.S)
+_BATCH_RECIPE = re.compile(r"【菜谱 (\d+)】\s*- 标题: (.*)")
+_SINGLE_TITLE = re.compile(r"- 标题: (.*)")
+_PAGE_TITLE = re.compile(r"页面标题: (.*)")
+_HTML_INGREDIENT = re.compile(r"<td><span>([^<]+)</span><span>([^<]*)</span></td>")
+_HTML_STEP = re.compile(r"<p>步骤\s*\d+</p>([^<]+)<")
+
+_REPLY = ("根据你的需求，我为你挑选了下面几道菜谱。它们用到的食材你家里基本都有，做法也不复杂，"
+          "照着步骤做很快就能上桌。如果想换换口味，也可以告诉我你的其他偏好，我再帮你找找。")
+
+
+def _accepted(title: str, accept_rate: float) -> bool:
+    # 按标题决定是否通过，同一菜谱每次评估结果一致
+    return zlib.crc32(title.encode("utf-8")) % 1000 < accept_rate * 1000
+
+
+def _decision(title: str, accept_rate: float) -> Dict:
+    accepted = _accepted(title, accept_rate)
+    score = 6 + zlib.crc32(title.encode("utf-8")) % 5 if accepted else 3
+    return {"decision": accepted, "reasoning": "食材匹配度高，做法符合要求" if accepted else "主要食材不匹配", "score": score}
+
+
+def respond(prompt: str, accept_rate: float) -> str:
+    """按提示词识别链，生成回复内容"""
+    if '"decisions"' in prompt:
+        decisions = [{"index": int(index), "title": title.strip(), **_decision(title.strip(), accept_rate)}
+                     for index, title in _BATCH_RECIPE.findall(prompt)]
+        return json.dumps({"decisions": decisions}, ensure_ascii=False)
+    if '"search_keywords"' in prompt:
+        match = _USER_QUERY.search(prompt)
+        plan, _ = rule_based_plan(match.group(1) if match else prompt)
+        if plan is None:
+            return json.dumps({"search_keywords": ["家常菜"], "user_ingredients": [], "recipe_count": 1,
+                               "other_requirements": ""}, ensure_ascii=False)
+        return plan.model_dump_json()
+    if '"decision"' in prompt:
+        match = _SINGLE_TITLE.search(prompt)
+        return json.dumps(_decision(match.group(1).strip() if match else prompt, accept_rate), ensure_ascii=False)
+    if '"ingredients"' in prompt:
+        title = _PAGE_TITLE.search(prompt)
+        return json.dumps({"title": title.group(1).strip() if title else "菜谱", "url": "",
+                           "ingredients": [{"name": name.strip(), "quantity": quantity.strip()}
+                                           for name, quantity in _HTML_INGREDIENT.findall(prompt)],
+                           "steps": [step.strip() for step in _HTML_STEP.findall(prompt)]}, ensure_ascii=False)
+    return _REPLY
+
+
+def _malform(content: str, json_mode: bool, truncated: Dict[str, str]) -> str:
+    """按一种常见的不规范写法改写 JSON 回复"""
+    data = json.loads(content)
+    if json_mode:
+        for item in data.get("decisions", [data]):
+            if "score" in item:
+                item["score"] = f"{item['score']}分"
+        if "decisions" in data and random.random() < 0.5:
+            data = data["decisions"]
+        return json.dumps(data, ensure_ascii=False)
+    style = random.choice(["fence", "prose", "quotes", "truncated"])
+    if style == "fence":
+        return f"```json\n{content}\n```"
+    if style == "prose":
+        return f"好的，以下是评估结果：\n{content}\n以上结果仅供参考。"
+    if style == "quotes":
+        return repr(data)
+    broken = content[:len(content) * 2 // 3]
+    truncated[broken] = content
+    return broken
+
+
+def _chunks(text: str, size: int = 4) -> List[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def make_handler(delay: float, token_delay: float, accept_rate: float, error_rate: float = 0.0, capacity: int = 0,
+                 malformed_rate: float = 0.0):
+    inflight = [0]
+    inflight_lock = threading.Lock()
+    # 被截断的输出 -> 完整内容，用于回答修正请求
+    truncated: Dict[str, str] = {}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _read_json(self) -> Dict:
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def _send_json(self, payload: Dict, status: int = 200, headers: Dict[str, str] = None):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _write_chunk(self, data: str):
+            payload = data.encode("utf-8")
+            self.wfile.write(f"{len(payload):x}\r\n".encode("ascii") + payload + b"\r\n")
+            self.wfile.flush()
+
+        def do_POST(self):
+            request = self._read_json()
+            if random.random() < error_rate:
+                self._send_json({"error": {"message": "Requests rate limit exceeded", "type": "rate_limit_error",
+                                           "code": "rate_limit_exceeded"}}, status=429, headers={"Retry-After": "0.2"})
+                return
+            with inflight_lock:
+                inflight[0] += 1
+            try:
+                if self.path.rstrip("/").endswith("/chat/completions"):
+                    self._chat_completions(request)
+                elif self.path.rstrip("/").endswith("/text-generation/generation"):
+                    self._dashscope_generation(request)
+                else:
+                    self.send_error(404)
+            finally:
+                with inflight_lock:
+                    inflight[0] -= 1
+
+        def _first_token_delay(self) -> float:
+            # 超过容量后按并发数成比例变慢，模拟过载的服务端
+            return delay * max(1.0, inflight[0] / capacity) if capacity > 0 else delay
+
+        def _chat_completions(self, request: Dict):
+            prompt = "\n".join(str(message.get("content", "")) for message in request.get("messages", []))
+            original = next((full for broken, full in list(truncated.items()) if broken in prompt), None)
+            if "原输出:" in prompt and original is not None:
+                content = original
+            else:
+                content = respond(prompt, accept_rate)
+                if content is not _REPLY and random.random() < malformed_rate:
+                    json_mode = (request.get("response_format") or {}).get("type") == "json_object"
+                    content = _malform(content, json_mode, truncated)
+            usage = {"prompt_tokens": len(prompt), "completion_tokens": len(content),
+                     "total_tokens": len(prompt) + len(content)}
+            completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+            model = request.get("model", "fake")
+            time.sleep(self._first_token_delay())
+
+            if not request.get("stream"):
+                time.sleep(token_delay * len(content))
+                self._send_json({
+                    "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                                 "finish_reason": "stop"}],
+                    "usage": usage,
+                })
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def event(**fields):
+                chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                         "model": model, **fields}
+                self._write_chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n")
+
+            def choice(delta: Dict, finish_reason=None) -> List[Dict]:
+                return [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+
+            event(choices=choice({"role": "assistant", "content": ""}))
+            for piece in _chunks(content):
+                time.sleep(token_delay * len(piece))
+                event(choices=choice({"content": piece}))
+            event(choices=choice({}, "stop"))
+            if (request.get("stream_options") or {}).get("include_usage"):
+                event(choices=[], usage=usage)
+            self._write_chunk("data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+
+        def _dashscope_generation(self, request: Dict):
+            messages = (request.get("input") or {}).get("messages", [])
+            query = str(messages[-1].get("content", "")) if messages else ""
+            time.sleep(self._first_token_delay() + token_delay * len(_REPLY))
+            self._send_json({
+                "request_id": uuid.uuid4().hex,
+                "output": {
+                    "choices": [{"finish_reason": "stop", "message": {"role": "assistant", "content": _REPLY}}],
+                    "search_info": {"search_results": [
+                        {"index": 1, "title": f"{query}的做法", "url": "https://www.douguo.com/", "site_name": "豆果美食"},
+                    ]},
+                },
+                "usage": {"input_tokens": len(query), "output_tokens": len(_REPLY),
+                          "total_tokens": len(query) + len(_REPLY)},
+            })
+
+        def handle(self):
+            try:
+                super().handle()
+            except (BrokenPipeError, ConnectionResetError):
+                # 客户端提前取消请求（例如流水线够数后取消剩余的抓取和评分）
+                pass
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(port: int, delay: float = 0.5, token_delay: float = 0.002, accept_rate: float = 0.6,
+          error_rate: float = 0.0, capacity: int = 0, malformed_rate: float = 0.0, host: str = "127.0.0.1"):
+    """
+    启动 LLM 替身并一直运行。
+
+    :param delay: 每次调用的首 token 延迟（秒）
+    :param token_delay: 每个输出字符的延迟（秒）
+    :param accept_rate: 筛选链判定菜谱通过的比例
+    :param error_rate: 直接返回 429 的请求比例
+    :param capacity: 不变慢的最大并发数，0 表示不模拟过载
+    :param malformed_rate: 改写为不规范写法的 JSON 回复比例
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(delay, token_delay, accept_rate, error_rate, capacity,
+                                                            malformed_rate))
+    server.daemon_threads = True
+    server.serve_forever()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--port", type=int, default=8802)
+    arg_parser.add_argument("--delay", type=float, default=0.5, help="每次调用的首 token 延迟（秒）")
+    arg_parser.add_argument("--token-delay", type=float, default=0.002, help="每个输出字符的延迟（秒）")
+    arg_parser.add_argument("--accept-rate", type=float, default=0.6, help="筛选链判定菜谱通过的比例")
+    arg_parser.add_argument("--error-rate", type=float, default=0.0, help="直接返回 429 的请求比例")
+    arg_parser.add_argument("--capacity", type=int, default=0, help="不变慢的最大并发数，0 表示不模拟过载")
+    arg_parser.add_argument("--malformed-rate", type=float, default=0.0, help="改写为不规范写法的 JSON 回复比例")
+    args = arg_parser.parse_args()
+    print(f"LLM 替身: http://127.0.0.1:{args.port}/v1")
+    serve(args.port, args.delay, args.token_delay, args.accept_rate, args.error_rate, args.capacity,
+          args.malformed_rate)
+
+
+if __name__ == "__main__":
+    main()
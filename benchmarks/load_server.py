@@ -0,0 +1,173 @@
+"""
+API 服务（server.py）的负载生成器：--users 个并发用户持续发送菜谱请求并读取 SSE 流，直到发完 --requests 个，
+统计结果分布（ok / 429 / 503 / 超时 / 错误）、首字节、首 token 和完整响应的延迟分位数以及吞吐。
+
+--local 时在本机子进程中启动豆果替身、LLM 替身和 API 服务，整套环境不访问外网；
+否则向 --url 指定的服务施压。
+
+运行: python -m benchmarks.load_server --local [--users 32] [--requests 200] [--max-active 16] [--max-queued 64]
+      python -m benchmarks.load_server --url http://127.0.0.1:8000 [--users 32] [--requests 200]
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.bench_e2e import _round, configure_environment, free_port, percentile, start_servers, wait_for_port
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def send_request(client: httpx.AsyncClient, url: str, query: str) -> Dict:
+    """发送一次流式请求并读完 SSE 流，返回结果和各阶段耗时"""
+    start = time.perf_counter()
+    sample = {"outcome": None, "ttfb": None, "first_token": None, "latency": None}
+    try:
+        async with client.stream("POST", f"{url}/v1/recipes", json={"query": query}) as response:
+            sample["ttfb"] = time.perf_counter() - start
+            if response.status_code != 200:
+                await response.aread()
+                sample["outcome"] = f"http_{response.status_code}"
+                return sample
+            event = None
+            async for line in response.aiter_lines():
+                if line.startswith("event: "):
+                    event = line[len("event: "):]
+                elif line.startswith("data: "):
+                    if event == "token" and sample["first_token"] is None:
+                        sample["first_token"] = time.perf_counter() - start
+                    elif event == "done":
+                        sample["outcome"] = "ok"
+                    elif event == "error":
+                        sample["outcome"] = f"error_{json.loads(line[len('data: '):]).get('reason')}"
+            sample["outcome"] = sample["outcome"] or "incomplete"
+    except httpx.HTTPError as e:
+        sample["outcome"] = f"client_{type(e).__name__}"
+    finally:
+        sample["latency"] = time.perf_counter() - start
+    return sample
+
+
+async def run_load(url: str, queries: List[str], users: int, total: int, timeout: float) -> Dict:
+    samples = []
+    next_index = 0
+
+    async def user(client: httpx.AsyncClient):
+        nonlocal next_index
+        while next_index < total:
+            query = queries[next_index % len(queries)]
+            next_index += 1
+            samples.append(await send_request(client, url, query))
+
+    limits = httpx.Limits(max_connections=users + 2, max_keepalive_connections=users + 2)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(user(client) for _ in range(users)))
+        wall = time.perf_counter() - start
+        metrics = (await client.get(f"{url}/metrics")).text
+
+    ok = [sample for sample in samples if sample["outcome"] == "ok"]
+    summary = {
+        "users": users,
+        "requests": len(samples),
+        "wall_s": round(wall, 3),
+        "outcomes": dict(Counter(sample["outcome"] for sample in samples)),
+        "ok_throughput_rps": round(len(ok) / wall, 3),
+    }
+    for name in ("ttfb", "first_token", "latency"):
+        values = [sample[name] for sample in ok if sample[name] is not None]
+        summary[name] = {"p50": _round(percentile(values, 50)), "p95": _round(percentile(values, 95)),
+                         "max": _round(max(values, default=None))}
+    summary["server_metrics"] = [line for line in metrics.splitlines()
+                                 if line.startswith(("recipe_server_", "recipe_llm_retries", "recipe_llm_concurrency",
+                                                     "recipe_structured_output", "recipe_extraction"))
+                                 and "_bucket" not in line]
+    return summary
+
+
+def start_local_stack(args, state_dir: str) -> List:
+    """启动两个替身和 API 服务，返回需要在结束时关闭的进程"""
+    configure_environment(args, state_dir)
+    os.environ.update({
+        "RECIPE_SERVER_MAX_ACTIVE_RUNS": str(args.max_active),
+        "RECIPE_SERVER_MAX_QUEUED": str(args.max_queued),
+        "RECIPE_SERVER_QUEUE_TIMEOUT_SECONDS": str(args.queue_timeout),
+        "RECIPE_LOG_LEVEL": "ERROR",
+    })
+    processes = start_servers(args)
+    port = free_port()
+    processes.append(subprocess.Popen([sys.executable, "server.py", "--port", str(port)], cwd=REPO_ROOT,
+                                      env={**os.environ, "PYTHONPATH": REPO_ROOT}))
+    # 服务启动时要编译图，给足时间
+    wait_for_port(port, timeout=60)
+    args.url = f"http://127.0.0.1:{port}"
+    return processes
+
+
+def print_summary(summary: Dict):
+    print(f"并发用户 {summary['users']}, 请求 {summary['requests']}, 用时 {summary['wall_s']:.1f}s, "
+          f"成功吞吐 {summary['ok_throughput_rps']:.2f} rps")
+    print("结果分布: " + ", ".join(f"{outcome}={count}" for outcome, count in sorted(summary["outcomes"].items())))
+    for name, label in (("ttfb", "首字节"), ("first_token", "首 token"), ("latency", "完整响应")):
+        stats = summary[name]
+        if stats["p50"] is not None:
+            print(f"  {label:<6} p50 {stats['p50']:.2f}s  p95 {stats['p95']:.2f}s  max {stats['max']:.2f}s")
+    print("服务端指标:")
+    for line in summary["server_metrics"]:
+        print(f"  {line}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--url", default="http://127.0.0.1:8000", help="API 服务地址（--local 时忽略）")
+    arg_parser.add_argument("--local", action="store_true", help="在本机启动替身和 API 服务")
+    arg_parser.add_argument("--users", type=int, default=32, help="并发用户数")
+    arg_parser.add_argument("--requests", type=int, default=200, help="总请求数")
+    arg_parser.add_argument("--timeout", type=float, default=300.0, help="客户端单个请求的超时（秒）")
+    arg_parser.add_argument("--output", help="把统计结果写入 JSON 文件")
+    local = arg_parser.add_argument_group("--local 时的服务与替身参数")
+    local.add_argument("--max-active", type=int, default=16, help="服务同时运行的图任务上限")
+    local.add_argument("--max-queued", type=int, default=64, help="服务准入队列长度")
+    local.add_argument("--queue-timeout", type=float, default=30.0, help="服务排队超时（秒）")
+    local.add_argument("--douguo-latency", type=float, default=0.2)
+    local.add_argument("--douguo-jitter", type=float, default=0.5)
+    local.add_argument("--douguo-pages", type=int, default=3)
+    local.add_argument("--douguo-broken-rate", type=float, default=0.0, help="替身站点步骤区域改版的详情页比例")
+    local.add_argument("--llm-delay", type=float, default=0.5)
+    local.add_argument("--token-delay", type=float, default=0.002)
+    local.add_argument("--accept-rate", type=float, default=0.6)
+    local.add_argument("--llm-error-rate", type=float, default=0.0, help="LLM 替身直接返回 429 的请求比例")
+    local.add_argument("--llm-capacity", type=int, default=0, help="LLM 替身不变慢的最大并发数")
+    local.add_argument("--llm-malformed-rate", type=float, default=0.0, help="LLM 替身返回不规范 JSON 的比例")
+    local.add_argument("--cache", action="store_true", help="开启菜谱存储、搜索缓存、LLM缓存和离线语料")
+    args = arg_parser.parse_args()
+
+    with open(os.path.join(os.path.dirname(__file__), "fixtures", "planner_queries.jsonl"), encoding="utf-8") as f:
+        queries = [json.loads(line)["query"] for line in f if line.strip()]
+
+    processes = []
+    with tempfile.TemporaryDirectory(prefix="recipe-load-") as state_dir:
+        try:
+            if args.local:
+                args.douguo_port, args.llm_port = free_port(), free_port()
+                processes = start_local_stack(args, state_dir)
+            summary = asyncio.run(run_load(args.url, queries, args.users, args.requests, args.timeout))
+        finally:
+            for process in processes:
+                process.terminate()
+    print_summary(summary)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
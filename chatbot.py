@@ -1,52 +1,19 @@
 import streamlit as st
-import asyncio
 from dotenv import load_dotenv
 
 load_dotenv()
-from nodes.graph import get_chat_app
-
-
-async def run_recipe_graph_stream(query: str):
-    """
-    逐事件产出 (text, is_final)
-    - is_final=False：过程提示（来自各中间节点的 messages）
-    - is_final=True ：最终结果（来自 output_node 的 final_output）
-    """
-    inputs = {"user_raw_query": query}
-    app = get_chat_app()
-
-    async for event in app.astream(inputs, stream_mode="updates"):
-        for _, values in event.items():
-            # ✅ 最终：output_node 会包含 final_output
-            if "final_output" in values and values["final_output"]:
-                yield values["final_output"], True
-                continue
-
-            # ✅ 过程：只拿“最新一条”助手提示，避免重复堆叠
-            if "messages" in values and values["messages"]:
-                assistants = [m["content"] for m in values["messages"] if m.get("role") == "assistant"]
-                if assistants:
-                    yield assistants[-1], False  # 只发出最新一条过程提示
+from nodes.runtime import get_graph_runtime, run_recipe_graph_stream
+from utils.telemetry import setup_logging
 
 
 def chat_interface_stream(user_message):
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-
-    async def run_stream():
-        async for text, is_final in run_recipe_graph_stream(user_message):
-            yield text, is_final
-
-    agen = run_stream()
-    while True:
-        try:
-            result = loop.run_until_complete(agen.__anext__())
-            yield result
-        except StopAsyncIteration:
-            break
+    # 所有会话共用常驻运行时：图只编译一次，事件循环和连接池跨消息复用
+    runtime = get_graph_runtime()
+    yield from runtime.iterate(run_recipe_graph_stream(user_message, runtime.app))
 
 
 def main():
+    setup_logging()
     st.set_page_config(page_title="智能菜谱助手", page_icon="🍲")
 
     # ---- 会话态初始化 ----
@@ -84,12 +51,17 @@ def main():
 
         # 逐步流式展示助手文本（覆盖）
         final_text = ""
+        streamed_text = ""
         with st.spinner("正在生成中…"):
-            for text, is_final in chat_interface_stream(user_message):
-                if is_final:
+            for kind, text in chat_interface_stream(user_message):
+                if kind == "final":
                     # 最终结果：保存，清空占位
                     final_text = text or ""
                     placeholder.empty()
+                elif kind == "token":
+                    # 最终回复逐 token 追加显示，不写入历史
+                    streamed_text += text
+                    placeholder.markdown(f"**助手：**\n\n{streamed_text}▌")
                 else:
                     # 过程提示：仅覆盖显示，不写入历史
                     placeholder.markdown(f"**助手（进度）**：\n\n{text or ''}")
@@ -10,9 +10,11 @@ from nodes.graph import scrape_node, generate_final_recipe_node, parse_recipes_n
 import asyncio
 from nodes.graph import filter_recipes_node
 from nodes.search_node import deepsearch_node
+from utils.telemetry import setup_logging
 
 
-async def main():
+def build_search_graph():
+    """联网搜索版本的流程：解析输入 -> DeepSearch -> 筛选 -> 生成 -> 保存为Markdown"""
     workflow = StateGraph(RecipeGraphState)
     # 添加节点
     workflow.add_node("input_parser", parse_input_node)
@@ -30,7 +32,11 @@ async def main():
     workflow.add_edge("filter", "generator")
     workflow.add_edge("generator", "save_md")
 
-    recipe_graph = workflow.compile()
+    return workflow.compile()
+
+
+async def main():
+    recipe_graph = build_search_graph()
     # 只需要传入最原始的自然语言请求
     inputs = {
         "user_raw_query": "我希望获取1个三明治早餐食谱，主要食材包括面包，生菜 番茄，做法要简单点"
@@ -39,4 +45,5 @@ async def main():
     print(result)
 
 if __name__ == "__main__":
+    setup_logging()
     asyncio.run(main())
\ No newline at end of file
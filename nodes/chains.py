@@ -1,14 +1,25 @@
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 
-from state import FilterDecision
-from utils.llm_provider import llm
+from state import FilterDecision, BatchFilterDecision, ParsedRecipe
+from utils.llm_provider import get_json_llm
+from utils.structured_output import RepairingOutputParser
+
+# 格式说明在进程内只生成一次，供各处调用时直接传入
+FILTER_FORMAT_INSTRUCTIONS = PydanticOutputParser(pydantic_object=FilterDecision).get_format_instructions()
+BATCH_FILTER_FORMAT_INSTRUCTIONS = PydanticOutputParser(pydantic_object=BatchFilterDecision).get_format_instructions()
+EXTRACTION_FORMAT_INSTRUCTIONS = PydanticOutputParser(pydantic_object=ParsedRecipe).get_format_instructions()
+
+_REVIEW_CRITERIA = """【你的评审标准】
+        1.  **食材匹配度**: 菜谱是否主要使用了用户拥有的食材？允许缺少1-2样常见辅料（如葱姜蒜、油盐），或需要额外购买1-2样核心食材。
+        2.  **需求符合度**: 菜谱是否符合用户的其他要求？（例如，如果用户要求'健身餐'，请评估它的热量和做法是否健康；如果要求'快手菜'，请评估步骤是否耗时过长）。
+        3.  **综合评分**: 基于以上两点，给出一个1-10的综合推荐分。"""
 
 
 def create_filter_chain():
     """创建一个接收用户需求和单个菜谱，并输出筛选决定的链"""
 
-    parser = PydanticOutputParser(pydantic_object=FilterDecision)
+    parser = RepairingOutputParser(pydantic_object=FilterDecision, chain_name="filter")
 
     prompt = ChatPromptTemplate.from_template(
         """你是一位严谨的菜谱筛选官。你的任务是判断一个给定的菜谱是否满足用户的需求。
@@ -22,10 +33,7 @@ def create_filter_chain():
         - 所需食材清单: {recipe_ingredients}
         - 烹饪步骤: {recipe_steps}
 
-        【你的评审标准】
-        1.  **食材匹配度**: 菜谱是否主要使用了用户拥有的食材？允许缺少1-2样常见辅料（如葱姜蒜、油盐），或需要额外购买1-2样核心食材。
-        2.  **需求符合度**: 菜谱是否符合用户的其他要求？（例如，如果用户要求'健身餐'，请评估它的热量和做法是否健康；如果要求'快手菜'，请评估步骤是否耗时过长）。
-        3.  **综合评分**: 基于以上两点，给出一个1-10的综合推荐分。
+        """ + _REVIEW_CRITERIA + """
 
         请根据以上标准，给出你的决定、原因和评分。
 
@@ -33,8 +41,71 @@ def create_filter_chain():
         """
     )
 
-    return prompt | llm | parser
+    return prompt | get_json_llm("filter") | parser
+
+
+def create_batch_filter_chain():
+    """创建一个一次评估多个菜谱的链，输出按编号对应的筛选决定列表"""
+
+    parser = RepairingOutputParser(pydantic_object=BatchFilterDecision, chain_name="filter_batch")
+
+    prompt = ChatPromptTemplate.from_template(
+        """你是一位严谨的菜谱筛选官。你的任务是逐个判断下面的每个菜谱是否满足用户的需求。
+        各菜谱之间相互独立，请分别评估，不要互相比较。
+
+        【用户的需求】
+        - 他们拥有的主要食材: {user_ingredients}
+        - 其他要求和偏好: {other_requirements}
+
+        【待评估的菜谱】
+        {recipes}
+
+        """ + _REVIEW_CRITERIA + """
+
+        请对每个菜谱给出你的决定、原因和评分，用菜谱编号作为 index 并照抄它的标题作为 title，每个编号恰好出现一次。
+
+        {format_instructions}
+        """
+    )
+
+    return prompt | get_json_llm("filter_batch") | parser
+
+
+def create_extraction_chain():
+    """创建一个从菜谱区域的 HTML 片段中提取标题、用料和步骤的链，用于确定性解析失败时兜底"""
+
+    parser = RepairingOutputParser(pydantic_object=ParsedRecipe, chain_name="parse_recipes")
+
+    prompt = ChatPromptTemplate.from_template(
+        """你是一个精通网页解析的AI助手。你的任务是从给定的HTML片段中提取菜谱信息。
+
+        根据以下HTML内容，提取菜谱的标题、所有用料（包括名称和用量）以及详细的烹饪步骤。
+        只提取片段中实际出现的内容，不要编造；步骤按顺序逐条列出，不要包含“步骤1”之类的序号。
+
+        页面标题: {page_title}
+        来源URL: {origin_url}
+
+        {format_instructions}
+
+        HTML内容如下:
+        ```html
+        {html_content}
+        ```
+        """
+    )
+
+    return prompt | get_json_llm("parse_recipes") | parser
+
+
+def render_recipe_for_batch(index: int, recipe_title: str, recipe_ingredients: str, recipe_steps: str) -> str:
+    """把单个菜谱渲染为批量筛选提示词中的一段；index 是展示给模型的编号，从 1 开始"""
+    return (f"【菜谱 {index}】\n"
+            f"        - 标题: {recipe_title}\n"
+            f"        - 所需食材清单: {recipe_ingredients}\n"
+            f"        - 烹饪步骤: {recipe_steps}")
 
 
 # 实例化筛选链
-filter_chain = create_filter_chain()
\ No newline at end of file
+filter_chain = create_filter_chain()
+batch_filter_chain = create_batch_filter_chain()
+extraction_chain = create_extraction_chain()
@@ -0,0 +1,52 @@
+import logging
+
+from state import RecipeGraphState
+from utils import settings
+from utils.recipe_corpus import get_recipe_corpus
+from utils.telemetry import traced
+
+logger = logging.getLogger(__name__)
+
+
+@traced("node")
+def corpus_search_node(state: RecipeGraphState):
+    """从本地离线语料中按关键词和已有食材检索候选菜谱，足够时可以跳过爬取"""
+    logger.info("--- 节点: 离线语料检索 ---")
+    state.setdefault("messages", []).append({"role": "assistant", "content": "📚 正在从本地菜谱库中查找..."})
+
+    max_recipes = state.get('recipe_count', 1)
+    search_keywords = state.get('search_keywords', [])
+    if isinstance(search_keywords, str):
+        search_keywords = search_keywords.split()
+
+    corpus = get_recipe_corpus()
+    candidates = corpus.search(search_keywords, state.get('user_ingredients', []), limit=max_recipes * 5)
+    logger.info(f"  > 语料库共 {len(corpus)} 个菜谱, 命中 {len(candidates)} 个候选")
+
+    state['corpus_candidates'] = candidates
+    state['scraped_contents'] = candidates
+    state['corpus_shortcut'] = len(candidates) >= max_recipes * settings.CORPUS_MIN_CANDIDATES_FACTOR
+    return state
+
+
+def route_after_corpus(state: RecipeGraphState) -> str:
+    """语料候选足够时直接进入后续流程，否则继续爬取"""
+    return "enough" if state.get('corpus_shortcut') else "crawl"
+
+
+def route_after_corpus_filter(state: RecipeGraphState) -> str:
+    """跳过爬取的语料路径筛选后仍不够数时回退到爬取，避免语料候选都被淘汰时直接回复找不到菜谱"""
+    if state.get('corpus_shortcut') and len(state.get('filtered_recipes') or []) < state.get('recipe_count', 1):
+        return "crawl"
+    return "done"
+
+
+@traced("node")
+def corpus_fallback_node(state: RecipeGraphState):
+    """语料路径的筛选结果不足，改为爬取：已被淘汰的语料候选不再送去评分，爬取后的筛选不再回退"""
+    logger.info("--- 节点: 语料候选筛选后不足, 回退到爬取 ---")
+    accepted_urls = {recipe['url'] for recipe in state.get('filtered_recipes') or []}
+    state['corpus_candidates'] = [recipe for recipe in state.get('corpus_candidates') or []
+                                  if recipe['url'] in accepted_urls]
+    state['corpus_shortcut'] = False
+    return state
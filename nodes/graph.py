@@ -1,28 +1,73 @@
 # graph.py
+import asyncio
+import functools
+import hashlib
+import logging
 import os
-from typing import TypedDict, List
+import re
+import unicodedata
+from typing import TypedDict, List, Dict, Optional, Tuple
 from langchain_core.prompts import ChatPromptTemplate
+from langgraph.config import get_stream_writer
 from langgraph.graph import StateGraph, END
 
-from nodes.chains import filter_chain
-from state import RecipeGraphState, RecipeAppState, ParsedRecipe, UserInputPlan, FilterDecision
+from nodes.corpus_node import corpus_search_node, corpus_fallback_node, route_after_corpus, route_after_corpus_filter
+from nodes.chains import filter_chain, batch_filter_chain, extraction_chain, render_recipe_for_batch, \
+    FILTER_FORMAT_INSTRUCTIONS, BATCH_FILTER_FORMAT_INSTRUCTIONS, EXTRACTION_FORMAT_INSTRUCTIONS
+from state import RecipeGraphState, RecipeAppState, ParsedRecipe, UserInputPlan, FilterDecision, ScrapedContent
 from tools.tools import scrape_xiachufang_recipe
 from tools.douguo_scraper import DouguoRecipeScraper
-from utils.llm_provider import llm
-from langchain_core.output_parsers import JsonOutputParser, PydanticOutputParser
+from tools.douguo_http import get_douguo_http_fetcher
+from tools.recipe_extractor import extraction_issues
+from utils import settings
+from utils.recipe_corpus import get_recipe_corpus
+from utils.recipe_store import get_recipe_store
+from utils.search_cache import get_search_cache, normalize_keywords
+from utils.structured_output import RepairingOutputParser
+from utils.acceptance_stats import budget_for, get_acceptance_stats
+from utils.coalescer import get_request_coalescer, progress_writer
+from utils.concurrency import get_llm_limiter
+from utils.prefilter import prefilter_recipes
+from utils.prompt_compaction import RecipePromptCompactor, get_prompt_compactor
+from utils.query_planner import plan_query, PLAN_SOURCE_LLM, PLAN_SOURCE_RULES
+from utils.llm_provider import get_llm, get_json_llm
+from utils.telemetry import get_telemetry, traced
 from datetime import datetime
 from utils.recipe_format import RecipeFormatter
 
+logger = logging.getLogger(__name__)
+
 
 # --- 新增的初始节点函数 ---
+@traced("node")
 def parse_input_node(state: RecipeGraphState):
     """
-    使用LLM解析用户的原始输入，提取关键信息并形成规划。
+    解析用户的原始输入，提取关键信息并形成规划。
+    先用规则规划器解析，置信度足够时直接采用，只有含糊的输入才调用LLM。
     """
-    print("--- 节点: 解析用户输入 ---")
+    logger.info("--- 节点: 解析用户输入 ---")
     state.setdefault("messages", []).append({"role": "assistant", "content": "🤔 正在解析你的需求..."})
 
-    parser = PydanticOutputParser(pydantic_object=UserInputPlan)
+    plan, confidence = plan_query(state['user_raw_query']) if settings.QUERY_PLANNER_ENABLED else (None, 0.0)
+    if plan is not None:
+        state['plan_source'] = PLAN_SOURCE_RULES
+    else:
+        plan = _parse_input_with_llm(state['user_raw_query'])
+        state['plan_source'] = PLAN_SOURCE_LLM
+
+    # 将解析出的规划更新到State中
+    state['search_keywords'] = plan.search_keywords
+    state['user_ingredients'] = plan.user_ingredients
+    state['recipe_count'] = plan.recipe_count
+    state['requirements'] = plan.other_requirements
+
+    logger.info(f"  > 解析完成({state['plan_source']}, 规则置信度={confidence:.2f}): "
+          f"关键词={plan.search_keywords}, 食材={plan.user_ingredients}, 数量={plan.recipe_count}")
+    return state
+
+
+def _parse_input_with_llm(user_query: str) -> UserInputPlan:
+    parser = RepairingOutputParser(pydantic_object=UserInputPlan, chain_name="parse_input")
 
     prompt = ChatPromptTemplate.from_template(
         """你是一个任务规划AI。请解析用户的请求，并提取出关键信息。
@@ -34,194 +79,600 @@ def parse_input_node(state: RecipeGraphState):
         """
     )
 
-    chain = prompt | llm | parser
+    chain = prompt | get_json_llm("parse_input") | parser
 
-    plan = chain.invoke({
-        "user_query": state['user_raw_query'],
+    return chain.invoke({
+        "user_query": user_query,
         "format_instructions": parser.get_format_instructions()
     })
 
-    # 将解析出的规划更新到State中
-    state['search_keywords'] = plan.search_keywords
-    state['user_ingredients'] = plan.user_ingredients
-    state['recipe_count'] = plan.recipe_count
-    state['requirements'] = plan.other_requirements
 
-    print(f"  > 解析完成: 关键词={plan.search_keywords}, 食材={plan.user_ingredients}, 数量={plan.recipe_count}")
-    return state
+# 3. 定义图的节点
+def _create_douguo_scraper() -> DouguoRecipeScraper:
+    """按配置创建豆果美食爬虫"""
+    # 优先使用 HTTP 直连快速通道，遇到验证码/登录墙/空结果时才退回浏览器
+    http_fetcher = get_douguo_http_fetcher() if settings.DOUGUO_HTTP_FAST_PATH else None
+    # 需要浏览器时，爬虫会从进程级浏览器池借用上下文，避免每次请求冷启动
+    # 菜谱存储中已有且未过期的详情页直接复用
+    recipe_store = get_recipe_store() if settings.RECIPE_STORE_ENABLED else None
+    # 相同关键词近期搜索过时，直接复用缓存的搜索结果列表
+    search_cache = get_search_cache() if settings.SEARCH_CACHE_ENABLED else None
+    return DouguoRecipeScraper(http_fetcher=http_fetcher, recipe_store=recipe_store, search_cache=search_cache)
+
+
+def _keywords_list(state: RecipeGraphState) -> List[str]:
+    # 将搜索关键字转换为列表格式
+    search_keywords = state.get('search_keywords', '')
+    if isinstance(search_keywords, str):
+        return search_keywords.split()
+    return search_keywords
 
 
-# 3. 定义图的节点
+def _plan_key(state: RecipeGraphState) -> Tuple:
+    """规范化的用户规划：关键词和食材与顺序、大小写、全半角无关，其他要求忽略空白差异"""
+    requirements = " ".join(unicodedata.normalize("NFKC", state.get('requirements') or "").lower().split())
+    return (normalize_keywords(_keywords_list(state)), normalize_keywords(state.get('user_ingredients') or []),
+            state.get('recipe_count', 1), requirements)
+
+
+def _inputs_key(state: RecipeGraphState, inputs: Tuple[str, ...]) -> str:
+    """节点输入的菜谱列表的摘要：按顺序拼接各字段中菜谱的 URL 后取哈希"""
+    digest = hashlib.sha1()
+    for key in inputs:
+        for recipe in state.get(key) or []:
+            digest.update(recipe['url'].encode("utf-8"))
+            digest.update(b"\n")
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def coalesced(*outputs: str, inputs: Tuple[str, ...] = ()):
+    """
+    装饰器：规划相同的并发请求共享一次节点执行，热门菜品的请求集中到来时只爬取和评分一次。
+    共享执行在第一个请求的状态副本上运行，结束后把 outputs 中的字段和节点新增的消息写回每个请求自己的状态；
+    执行期间发出的进度事件转发给所有等待的请求。
+
+    :param outputs: 节点写入状态、需要分给每个请求的字段
+    :param inputs: 节点除规划外还读取的菜谱列表字段；只有这些菜谱（按 URL）也相同的请求才合并，
+                   以免各自抓取了不同候选的请求拿到别人的解析或筛选结果
+    """
+
+    def decorator(node):
+        @functools.wraps(node)
+        async def wrapper(state: RecipeGraphState):
+            if not settings.COALESCE_ENABLED:
+                return await node(state)
+            shared_state = dict(state, messages=[])
+            key = _plan_key(state) + ((_inputs_key(state, inputs),) if inputs else ())
+            result = await get_request_coalescer().run(node.__name__, key,
+                                                       lambda: node(shared_state), progress_writer())
+            state.setdefault("messages", []).extend(dict(message) for message in result.get("messages", []))
+            for key in outputs:
+                if key in result:
+                    state[key] = list(result[key])
+            return state
+
+        return wrapper
+
+    return decorator
+
+
+def _ingest_into_corpus(douguo_scraper: DouguoRecipeScraper, scraped_content: List[ScrapedContent]):
+    # 新爬取的菜谱增量加入离线语料索引（爬虫已写入菜谱存储时不重复写入）
+    if settings.CORPUS_MODE != "off":
+        get_recipe_corpus().ingest(scraped_content, persist=douguo_scraper.recipe_store is None)
+
+
+@coalesced('scraped_contents', inputs=('corpus_candidates',))
+@traced("node")
 async def scrape_node(state: RecipeGraphState):
-    print("--- 节点: 爬取内容 ---")
+    logger.info("--- 节点: 爬取内容 ---")
     state.setdefault("messages", []).append({"role": "assistant", "content": "🔍 正在搜索并爬取食谱，请稍候..."})
     # 使用 search_keywords 作为爬取关键字
-    search_keywords = state.get('search_keywords', '')
-    print(f"爬取关键字: {search_keywords}")
+    keywords_list = _keywords_list(state)
+    logger.info(f"爬取关键字: {keywords_list}")
     max_recipes = state.get('recipe_count', 1)
-    scrape_recipes = max_recipes * 5  # 爬取数量是需要数量的2倍，方便后续筛选
+    # 爬取数量按该关键词的历史通过率估算，没有历史时为需要数量的 FETCH_DEFAULT_FACTOR 倍，方便后续筛选
+    scrape_recipes = get_acceptance_stats().fetch_budget(keywords_list, max_recipes)
 
     # 使用豆果美食爬虫
-    douguo_scraper = DouguoRecipeScraper()
-    # 将搜索关键字转换为列表格式
-    if isinstance(search_keywords, str):
-        keywords_list = search_keywords.split()
-    else:
-        keywords_list = search_keywords
+    douguo_scraper = _create_douguo_scraper()
+
+    # 离线语料已经提供了部分候选时，只需爬取剩余的数量
+    corpus_candidates = state.get('corpus_candidates') or []
+    scrape_recipes = max(scrape_recipes - len(corpus_candidates), max_recipes)
 
     scraped_content = await douguo_scraper.scrape_douguo(keywords_list, scrape_recipes)
-    state['scraped_contents'] = scraped_content
+    _ingest_into_corpus(douguo_scraper, scraped_content)
+
+    known_urls = {recipe['url'] for recipe in corpus_candidates}
+    state['scraped_contents'] = corpus_candidates + [
+        recipe for recipe in scraped_content if recipe['url'] not in known_urls
+    ]
     return state
 
 
-def parse_recipes_node(state: RecipeGraphState):
-    """解析爬取的食谱内容"""
-    print("--- 节点: 解析食谱 ---")
-    state.setdefault("messages", []).append({"role": "assistant", "content": "📝 正在解析爬取的食谱内容..."})
-    scraped_contents = state['scraped_contents']
-    print(f"解析 {len(scraped_contents)} 个爬取的食谱内容...")
-    print(scraped_contents)
-    parsed_recipes = []
+# 各类可疑结果由 LLM 提取结果中的哪个字段替换
+_FALLBACK_FIELDS = {"no_title": "title", "no_ingredients": "ingredients", "blank_ingredient": "ingredients",
+                    "no_steps": "steps", "few_steps": "steps", "placeholder_steps": "steps"}
 
-    parser = JsonOutputParser(pydantic_object=ParsedRecipe)
-    prompt = ChatPromptTemplate.from_template(
-        """你是一个精通网页解析的AI助手。你的任务是从给定的HTML片段中提取菜谱信息。
 
-        根据以下HTML内容，提取菜谱的标题、所有用料（包括名称和用量）以及详细的烹饪步骤。
+async def _extract_with_llm(recipe: ScrapedContent) -> Tuple[ScrapedContent, str]:
+    """
+    用LLM从菜谱附带的HTML片段中重新提取，只替换确定性解析缺失或可疑的字段。
 
-        页面标题: {page_title}
-        来源URL: {origin_url}
+    :return: (去掉HTML片段的菜谱, "fallback_repaired" 或 "fallback_failed")；
+             LLM调用失败或补全后仍有问题时为 fallback_failed，保留已有内容
+    """
+    completed = {key: value for key, value in recipe.items() if key != 'html_excerpt'}
+    issues = extraction_issues(completed)
+    try:
+        parsed: ParsedRecipe = await extraction_chain.ainvoke({
+            "page_title": recipe['title'],
+            "origin_url": recipe['url'],
+            "html_content": recipe['html_excerpt'],
+            "format_instructions": EXTRACTION_FORMAT_INSTRUCTIONS,
+        })
+    except Exception as e:
+        logger.warning(f"  !! LLM兜底解析失败: {recipe['url']}, 错误: {e}")
+        return completed, "fallback_failed"
+    extracted = {
+        "title": parsed.title.strip(),
+        "ingredients": [ingredient.model_dump() for ingredient in parsed.ingredients if ingredient.name.strip()],
+        "steps": [step.strip() for step in parsed.steps if step.strip()],
+    }
+    for field in {_FALLBACK_FIELDS[issue] for issue in issues}:
+        if extracted[field]:
+            completed[field] = extracted[field]
+    remaining = extraction_issues(completed)
+    logger.info(f"  > LLM兜底解析{'后仍有问题 ' + ','.join(remaining) if remaining else '成功'}: {recipe['url']} "
+                f"(原问题: {','.join(issues)})")
+    return completed, "fallback_failed" if remaining else "fallback_repaired"
+
+
+async def complete_recipe(recipe: ScrapedContent, semaphore: asyncio.Semaphore) -> ScrapedContent:
+    """
+    确定性解析正常的菜谱原样返回，不产生LLM调用；结果可疑（带 html_excerpt）的菜谱在 semaphore 限制下交给LLM兜底。
+    每个菜谱按解析方式计入 recipe_extraction_total。
+    """
+    if 'html_excerpt' not in recipe:
+        outcome = "deterministic"
+    else:
+        async with semaphore:
+            recipe, outcome = await _extract_with_llm(recipe)
+    get_telemetry().inc("recipe_extraction_total", 1, (("outcome", outcome),))
+    return recipe
 
-        {format_instructions}
 
-        HTML内容如下:
-        ```html
-        {html_content}
-        ```
-        """
-    )
+async def complete_recipes(recipes: List[ScrapedContent]) -> List[ScrapedContent]:
+    """并发补全一组菜谱，同时进行的LLM兜底解析不超过 settings.FALLBACK_EXTRACTION_CONCURRENCY，顺序不变"""
+    semaphore = asyncio.Semaphore(max(1, settings.FALLBACK_EXTRACTION_CONCURRENCY))
+    return list(await asyncio.gather(*(complete_recipe(recipe, semaphore) for recipe in recipes)))
 
-    # 将Prompt、LLM和输出解析器连接起来
-    chain = prompt | llm | parser
 
-    for content in scraped_contents:
-        try:
-            # 调用我们创建好的解析链
-            parsed_recipe = chain.invoke({
-                "page_title": content['title'],
-                "origin_url": content['url'],
-                "format_instructions": parser.get_format_instructions()
-            })
-            # 确保origin_url被设置
-            parsed_recipe['origin_url'] = content['url']
-            parsed_recipes.append(parsed_recipe)
-            print(f"  > 解析成功: {content['url']}")
-            print(f"  > <UNK>: {content['title']}")
-            print(f"  > <UNK>: {content['content']}")
-        except Exception as e:
-            print(f"  !! 解析失败: {content['url']}, 错误: {e}")
-            # 即使某个页面解析失败，也继续处理下一个
+@coalesced('scraped_contents', inputs=('scraped_contents',))
+@traced("node")
+async def parse_recipes_node(state: RecipeGraphState):
+    """
+    解析兜底：爬虫的确定性解析已经给出标题、用料和步骤，只有结果可疑（带 html_excerpt）的菜谱
+    才用LLM从截取的菜谱区域HTML中并发重新提取；解析正常的菜谱原样通过，不产生LLM调用。
+    """
+    logger.info("--- 节点: 解析食谱 ---")
+    scraped_contents = state.get('scraped_contents') or []
+    fallback_count = sum(1 for recipe in scraped_contents if 'html_excerpt' in recipe)
+    if fallback_count:
+        state.setdefault("messages", []).append(
+            {"role": "assistant", "content": f"📝 有 {fallback_count} 个食谱的页面解析不完整，正在补全..."})
+    state['scraped_contents'] = await complete_recipes(scraped_contents)
+    if scraped_contents:
+        logger.info(f"> 解析: {len(scraped_contents)} 个菜谱, 其中 {fallback_count} 个 "
+                    f"({fallback_count / len(scraped_contents):.0%}) 需要LLM兜底")
+    return state
+
+
+def _recipe_filter_inputs(recipe: ScrapedContent) -> Dict[str, str]:
+    """把菜谱转换为筛选链需要的文本字段；开启压缩时按每个菜谱的 token 预算清理和截断"""
+    if settings.PROMPT_COMPACTION_ENABLED:
+        return get_prompt_compactor().compact(recipe)
+    return RecipePromptCompactor.raw_inputs(recipe)
+
+
+async def evaluate_recipe(recipe: ScrapedContent, common_inputs: Dict[str, str]) -> Optional[FilterDecision]:
+    """用单菜谱筛选链评估一个菜谱，失败时返回 None"""
+    try:
+        # 并发名额、限流和重试由 LLM 调用管理层（utils/llm_gateway.py）统一处理
+        logger.debug(f"> 正在评估菜谱 '{recipe['title']}'...")
+        return await filter_chain.ainvoke({
+            **common_inputs,
+            **_recipe_filter_inputs(recipe),
+            "format_instructions": FILTER_FORMAT_INSTRUCTIONS,
+        })
+    except Exception as e:
+        logger.warning(f"  !! LLM评估失败: {recipe['title']}, 错误: {e}")
+        return None
+
+
+def _same_title(echoed: str, title: str) -> bool:
+    """模型回显的标题是否就是该菜谱的标题，忽略空白和全半角差异，允许模型略去部分字样"""
+    echoed, title = (re.sub(r"\s+", "", unicodedata.normalize("NFKC", text)) for text in (echoed, title))
+    return bool(echoed) and (echoed in title or title in echoed)
+
+
+async def evaluate_recipe_batch(recipes: List[ScrapedContent],
+                                common_inputs: Dict[str, str]) -> Dict[int, FilterDecision]:
+    """
+    在一次LLM调用中评估一批菜谱。
+
+    :return: {批内下标: FilterDecision}；输出无法解析、编号越界或重复、回显的标题与编号对不上时，
+             对应菜谱不会出现在结果中（随后逐个重试）
+    """
+    # 提示词中的编号从 1 开始，模型通常也这样编号
+    rendered = [
+        render_recipe_for_batch(i + 1, **_recipe_filter_inputs(recipe)) for i, recipe in enumerate(recipes)
+    ]
+    try:
+        logger.debug(f"> 正在批量评估 {len(recipes)} 个菜谱...")
+        result = await batch_filter_chain.ainvoke({
+            **common_inputs,
+            "recipes": "\n\n        ".join(rendered),
+            "format_instructions": BATCH_FILTER_FORMAT_INSTRUCTIONS,
+        })
+    except Exception as e:
+        logger.warning(f"  !! 批量评估失败, 将逐个重试: {e}")
+        return {}
+
+    decisions = {}
+    for item in result.decisions:
+        index = item.index - 1
+        if not 0 <= index < len(recipes) or index in decisions:
+            continue
+        if item.title and not _same_title(item.title, recipes[index]['title']):
+            logger.warning(f"  !! 批量评估的编号 {item.index} 与标题 '{item.title}' 对不上, 将逐个重试")
             continue
+        decisions[index] = FilterDecision(decision=item.decision, reasoning=item.reasoning, score=item.score)
+    return decisions
 
-    state['parsed_recipes'] = parsed_recipes
-    return state
+
+
+async def evaluate_recipes(recipes: List[ScrapedContent], common_inputs: Dict[str, str],
+                           batch_size: int) -> Dict[int, FilterDecision]:
+    """
+    并发评估所有候选菜谱，同时进行的LLM调用数受进程级并发上限约束。
+    batch_size > 1 时按批评估，批量结果中缺失的菜谱再逐个重试。
+
+    :return: {菜谱在 recipes 中的下标: FilterDecision}，评估失败的菜谱不在结果中
+    """
+    if batch_size <= 1:
+        results = await asyncio.gather(*(evaluate_recipe(recipe, common_inputs) for recipe in recipes))
+        return {index: decision for index, decision in enumerate(results) if decision is not None}
+
+    async def evaluate_batch(start: int) -> Dict[int, FilterDecision]:
+        batch = recipes[start:start + batch_size]
+        batch_decisions = await evaluate_recipe_batch(batch, common_inputs)
+        # 批量输出中缺失或格式错误的菜谱单独重试
+        missing = [offset for offset in range(len(batch)) if offset not in batch_decisions]
+        retried = await asyncio.gather(*(evaluate_recipe(batch[offset], common_inputs) for offset in missing))
+        batch_decisions.update({offset: decision for offset, decision in zip(missing, retried) if decision is not None})
+        return {start + offset: decision for offset, decision in batch_decisions.items()}
+
+    decisions = {}
+    for batch_decisions in await asyncio.gather(*(evaluate_batch(start)
+                                                  for start in range(0, len(recipes), batch_size))):
+        decisions.update(batch_decisions)
+    return decisions
+
+
+MIN_FILTER_SCORE = 6  # 只保留评分在6分及以上的菜谱
 
 
 # 5. !!! 新增的核心智能节点：筛选食谱 !!!
-def filter_recipes_node(state: RecipeGraphState):
-    """(智能版) 使用LLM判断每个菜谱与用户需求的匹配度，并进行筛选"""
-    print("--- 节点: 正在用LLM智能筛选食谱 ---")
+@coalesced('prefilter_rejections', 'filtered_recipes', inputs=('scraped_contents',))
+@traced("node")
+async def filter_recipes_node(state: RecipeGraphState):
+    """(智能版) 使用LLM并发判断每个菜谱与用户需求的匹配度，并进行筛选"""
+    logger.info("--- 节点: 正在用LLM智能筛选食谱 ---")
     state.setdefault("messages", []).append({"role": "assistant", "content": "🤖 正在筛选符合你需求的食谱..."})
     user_ingredients = state['user_ingredients']
     other_requirements = state['requirements']
-    scraped_contents = state['scraped_contents']
+    # 联网搜索流程（main.py）不产生爬取内容，此时没有候选
+    scraped_contents = state.get('scraped_contents') or []
     expected_count = state.get('recipe_count', 1)  # 获取期望的食谱数量
 
-    min_score = 6  # 只保留评分在7分及以上的菜谱
     recipe_scores = []  # 存储食谱和评分
 
-    for recipe in scraped_contents:
-        # 将菜谱的食材列表转换为简单字符串，方便输入
-        recipe_ingredients_str = ", ".join([f"{ing['name']}({ing['quantity']})" for ing in recipe['ingredients']])
+    # 先用确定性规则淘汰明显不合格的菜谱，只把通过的交给LLM评分
+    if settings.PREFILTER_ENABLED:
+        survivors, rejections = prefilter_recipes(scraped_contents, user_ingredients, other_requirements)
+        for rejection in rejections:
+            logger.debug(f"- ⛔ 规则淘汰 '{rejection['title']}': {rejection['reason']} ({rejection['detail']})")
+        logger.info(f"> 规则预筛选: {len(scraped_contents)} 个候选, 淘汰 {len(rejections)} 个")
+        candidates = [recipe for _, recipe in survivors]
+    else:
+        rejections = []
+        candidates = scraped_contents
+    state['prefilter_rejections'] = rejections
+
+    common_inputs = {
+        "user_ingredients": ", ".join(user_ingredients),
+        "other_requirements": other_requirements,
+    }
+    decisions = await evaluate_recipes(candidates, common_inputs, settings.FILTER_BATCH_SIZE)
+
+    for index, recipe in enumerate(candidates):
+        decision_result = decisions.get(index)
+        if decision_result is None:
+            continue
 
-        print(f"> 正在评估菜谱 '{recipe['title']}'...")
+        accepted = _judge_recipe(recipe, decision_result)
+        if accepted is not None:
+            recipe_scores.append(accepted)
 
-        try:
-            # 对每个菜谱调用LLM进行评审
-            decision_result = filter_chain.invoke({
-                "user_ingredients": ", ".join(user_ingredients),
-                "other_requirements": other_requirements,
-                "recipe_title": recipe['title'],
-                "recipe_ingredients": recipe_ingredients_str,
-                "recipe_steps": "\n".join(recipe['steps']),
-                "format_instructions": PydanticOutputParser(pydantic_object=FilterDecision).get_format_instructions()
-            })
-
-            print(
-                f"- LLM决策: {decision_result.decision}, 评分: {decision_result.score}, 原因: {decision_result.reasoning}"
-            )
-
-            # 根据LLM的决定和评分进行筛选
-            if decision_result.decision and decision_result.score >= min_score:
-                print("- ✅ 符合要求, 保留该食谱。")
-                # 附加LLM的分析结果，供下一步或用户查看
-                recipe_scores.append({
-                    'recipe': recipe,
-                    'score': decision_result.score,
-                    'decision': decision_result.decision,
-                    'reasoning': decision_result.reasoning
-                })
-            else:
-                print("- ❌ 不符合要求, 舍弃该食谱。")
-
-        except Exception as e:
-            print(f"  !! LLM评估失败: {recipe['title']}, 错误: {e}")
-            continue
+    get_acceptance_stats().record(_keywords_list(state), len(decisions) + len(rejections), len(recipe_scores))
+    state['filtered_recipes'] = _select_top_recipes(recipe_scores, expected_count)
+    return state
 
+
+def _judge_recipe(recipe: ScrapedContent, decision_result: FilterDecision) -> Optional[Dict]:
+    """根据LLM的决定和评分判断是否保留菜谱，保留时返回附带评分的记录"""
+    logger.debug(f"> 菜谱 '{recipe['title']}'")
+    logger.debug(
+        f"- LLM决策: {decision_result.decision}, 评分: {decision_result.score}, 原因: {decision_result.reasoning}"
+    )
+
+    if decision_result.decision and decision_result.score >= MIN_FILTER_SCORE:
+        logger.debug("- ✅ 符合要求, 保留该食谱。")
+        # 附加LLM的分析结果，供下一步或用户查看
+        return {
+            'recipe': recipe,
+            'score': decision_result.score,
+            'decision': decision_result.decision,
+            'reasoning': decision_result.reasoning
+        }
+    logger.debug("- ❌ 不符合要求, 舍弃该食谱。")
+    return None
+
+
+def _select_top_recipes(recipe_scores: List[Dict], expected_count: int) -> List[ScrapedContent]:
+    """按评分从高到低取前N个食谱"""
     # 按评分从高到低排序
-    recipe_scores.sort(key=lambda x: x['score'], reverse=True)
+    recipe_scores = sorted(recipe_scores, key=lambda x: x['score'], reverse=True)
 
     # 取前N个最高评分的食谱
     selected_recipes = recipe_scores[:expected_count]
 
-    print(f"\n--- 筛选结果 ---")
-    print(f"候选食谱总数: {len(recipe_scores)}")
-    print(f"最终选中: {len(selected_recipes)} 份")
+    logger.info("--- 筛选结果 ---")
+    logger.info(f"候选食谱总数: {len(recipe_scores)}")
+    logger.info(f"最终选中: {len(selected_recipes)} 份")
 
     for i, item in enumerate(selected_recipes):
-        print(f"{i + 1}. {item['recipe']['title']} - 评分: {item['score']}")
+        logger.debug(f"{i + 1}. {item['recipe']['title']} - 评分: {item['score']}")
 
     # 只保存食谱数据到state
-    state['filtered_recipes'] = [item['recipe'] for item in selected_recipes]
+    return [item['recipe'] for item in selected_recipes]
+
+
+@coalesced('scraped_contents', 'prefilter_rejections', 'filtered_recipes', inputs=('corpus_candidates',))
+@traced("node")
+async def stream_scrape_filter_node(state: RecipeGraphState):
+    """
+    流水线模式下的爬取+筛选节点：爬虫每抓到一个菜谱就立刻做规则预筛选并送去LLM评分，
+    凑够一批（或等待超时）即发起评分，抓取和评分两个网络密集的阶段重叠进行。
+    每个被选中的菜谱会通过 custom 流模式即时发出进度（{"progress": 文本}），与其他请求合并执行时发给每个请求。
+    首轮抓取数量按该关键词的历史通过率估算；通过的菜谱够数后立即停止抓取和评分，
+    不够时按本次的通过率追加抓取。
+    """
+    logger.info("--- 节点: 流水线爬取并筛选 ---")
+    state.setdefault("messages", []).append({"role": "assistant", "content": "🔍 正在搜索、爬取并同步筛选食谱..."})
+    writer = progress_writer()
+    keywords_list = _keywords_list(state)
+    logger.info(f"爬取关键字: {keywords_list}")
+    user_ingredients = state['user_ingredients']
+    other_requirements = state['requirements']
+    expected_count = state.get('recipe_count', 1)
+    corpus_candidates = state.get('corpus_candidates') or []
+
+    acceptance_stats = get_acceptance_stats()
+    scrape_recipes = max(acceptance_stats.fetch_budget(keywords_list, expected_count) - len(corpus_candidates),
+                         expected_count)
+    logger.info(f"> 首轮抓取预算: {scrape_recipes} 个 (历史通过率: {acceptance_stats.acceptance_rate(keywords_list)})")
+
+    douguo_scraper = _create_douguo_scraper()
+    common_inputs = {
+        "user_ingredients": ", ".join(user_ingredients),
+        "other_requirements": other_requirements,
+    }
+    batch_size = max(1, settings.FILTER_BATCH_SIZE)
+    limiter = get_llm_limiter()
+    fallback_semaphore = asyncio.Semaphore(max(1, settings.FALLBACK_EXTRACTION_CONCURRENCY))
+    loop = asyncio.get_running_loop()
+
+    scraped: List[ScrapedContent] = []  # 本次新爬取的菜谱
+    candidates: List[ScrapedContent] = []  # 进入流水线的全部候选
+    rejections: List[Dict[str, str]] = []
+    recipe_scores: List[Dict] = []
+    judged = 0  # 得到LLM评分结果的候选数
+    stop_point: Optional[Tuple[int, int]] = None  # 提前结束时的 (已评估候选数, 通过数)
+    seen_titles = set()
+    seen_urls = {recipe['url'] for recipe in corpus_candidates}
+
+    def enough() -> bool:
+        return settings.EARLY_STOP_ENABLED and len(recipe_scores) >= expected_count
+
+    async def run_round(initial: List[ScrapedContent], budget: int, pages: int) -> int:
+        """
+        跑一轮 抓取→预筛选→评分 的流水线，直到来源耗尽或通过的菜谱够数。
+
+        :return: 本轮新进入流水线的候选数
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        done, stop = object(), object()
+        scoring_tasks = []
+        batch: List[ScrapedContent] = []
+        batch_deadline = None
+        round_candidates = 0
+
+        async def enqueue(recipe: ScrapedContent):
+            await queue.put(await complete_recipe(recipe, fallback_semaphore))
+
+        async def produce():
+            # 离线语料中的候选先进入流水线，再接上实时爬取的结果
+            fallbacks = []
+            try:
+                for recipe in initial:
+                    await enqueue(recipe)
+                async for recipe in douguo_scraper.iter_douguo(keywords_list, budget, pages,
+                                                               exclude_urls=set(seen_urls)):
+                    if recipe['url'] not in seen_urls:
+                        seen_urls.add(recipe['url'])
+                        scraped.append(recipe)
+                        if 'html_excerpt' in recipe:
+                            # 解析可疑的菜谱在后台用LLM兜底，不阻塞后面的菜谱进入流水线
+                            fallbacks.append(asyncio.create_task(enqueue(recipe)))
+                        else:
+                            await enqueue(recipe)
+                await asyncio.gather(*fallbacks)
+            finally:
+                for task in fallbacks:
+                    task.cancel()
+                await queue.put(done)
+
+        async def score(scoring_batch: List[ScrapedContent]):
+            nonlocal judged, stop_point
+            decisions = await evaluate_recipes(scoring_batch, common_inputs, batch_size)
+            for index, recipe in enumerate(scoring_batch):
+                decision_result = decisions.get(index)
+                if decision_result is None:
+                    continue
+                judged += 1
+                accepted = _judge_recipe(recipe, decision_result)
+                if accepted is not None:
+                    recipe_scores.append(accepted)
+                    writer({"progress": f"✅ 找到合适的食谱: {recipe['title']}（{decision_result.score} 分）"})
+                    if stop_point is None and enough():
+                        # 通过率只统计到够数的这一刻：同批中排在后面的菜谱和之后才完成的批次不计入
+                        stop_point = (judged + len(rejections), len(recipe_scores))
+            if enough():
+                await queue.put(stop)
+
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                try:
+                    # 已有未满的一批时，最多等到 batch_deadline 就先把它送去评分
+                    timeout = max(0.0, batch_deadline - loop.time()) if batch else None
+                    item = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    item = None
+                    if limiter.active >= limiter.limit:
+                        # LLM并发已满，提前送出半批只会多占一次调用，继续凑批
+                        batch_deadline = loop.time() + settings.PIPELINE_BATCH_WAIT_SECONDS
+                        continue
+                if item is stop:
+                    logger.info(f"> 已有 {len(recipe_scores)} 个菜谱通过筛选, 提前结束抓取和评分")
+                    break
+                if item is done:
+                    if batch:
+                        scoring_tasks.append(asyncio.create_task(score(batch)))
+                    # 等待剩余的评分；期间如果已经够数，也不必等其余批次
+                    while scoring_tasks and not enough():
+                        finished, _ = await asyncio.wait(scoring_tasks, return_when=asyncio.FIRST_COMPLETED)
+                        scoring_tasks = [task for task in scoring_tasks if task not in finished]
+                        for task in finished:
+                            task.result()
+                    break
+                if item is not None:
+                    candidates.append(item)
+                    round_candidates += 1
+                    if settings.PREFILTER_ENABLED:
+                        survivors, item_rejections = prefilter_recipes([item], user_ingredients, other_requirements,
+                                                                       seen_titles=seen_titles)
+                        for rejection in item_rejections:
+                            logger.debug(f"- ⛔ 规则淘汰 '{rejection['title']}': {rejection['reason']} ({rejection['detail']})")
+                        rejections.extend(item_rejections)
+                        if not survivors:
+                            continue
+                    if not batch:
+                        batch_deadline = loop.time() + settings.PIPELINE_BATCH_WAIT_SECONDS
+                    batch.append(item)
+                    if len(batch) < batch_size:
+                        continue
+                if batch:
+                    scoring_tasks.append(asyncio.create_task(score(batch)))
+                    batch = []
+        finally:
+            # 提前结束时取消还在进行的抓取和评分
+            for task in [producer, *scoring_tasks]:
+                task.cancel()
+            await asyncio.gather(producer, *scoring_tasks, return_exceptions=True)
+        return round_candidates
+
+    pages = 3
+    new_candidates = await run_round(corpus_candidates, scrape_recipes, pages)
+    for expansion in range(settings.FETCH_EXPANSION_ROUNDS):
+        missing = expected_count - len(recipe_scores)
+        if missing <= 0 or new_candidates == 0:
+            break
+        # 通过率偏低：按本次观察到的通过率追加抓取，并多翻几页以找到新的候选
+        evaluated = judged + len(rejections)
+        rate = len(recipe_scores) / evaluated if evaluated else settings.ACCEPTANCE_MIN_RATE
+        extra = budget_for(missing, rate)
+        pages += 2
+        logger.info(f"> 通过筛选的菜谱不足 ({len(recipe_scores)}/{expected_count}), 第 {expansion + 1} 轮追加抓取 {extra} 个")
+        writer({"progress": f"🔁 合适的食谱还不够，正在追加搜索（第 {expansion + 1} 轮）..."})
+        new_candidates = await run_round([], len(seen_urls) + extra, pages)
+
+    evaluated, accepted = stop_point or (judged + len(rejections), len(recipe_scores))
+    acceptance_stats.record(keywords_list, evaluated, accepted)
+    logger.info(f"> 流水线: {len(candidates)} 个候选, 规则淘汰 {len(rejections)} 个, 保留 {len(recipe_scores)} 个")
+    _ingest_into_corpus(douguo_scraper, scraped)
+
+    state['scraped_contents'] = candidates
+    state['prefilter_rejections'] = rejections
+    state['filtered_recipes'] = _select_top_recipes(recipe_scores, expected_count)
     return state
 
 
+@traced("node")
 def generate_final_recipe_node(state: RecipeGraphState):
     """
     (新功能) 将解析后的结构化食谱数据，直接格式化为面向用户的Markdown文本。
     """
-    print("--- 节点: 正在整理并格式化最终结果 ---")
+    logger.info("--- 节点: 正在整理并格式化最终结果 ---")
     state.setdefault("messages", []).append({"role": "assistant", "content": "🤖正在生成最终结果..."})
 
     # 1. 检查是否有可用的解析后食谱
     if not state['filtered_recipes']:
-        print(" !! 没有可用的解析后食谱，无法生成。")
+        logger.warning(" !! 没有可用的解析后食谱，无法生成。")
         return state
 
     formatter = RecipeFormatter()
     state['final_recipe'] = formatter.format_recipes_to_markdown(state['filtered_recipes'])
-    print("--- 节点: 最终结果已格式化完成！ ---")
+    logger.info("--- 节点: 最终结果已格式化完成！ ---")
 
     return state
 
 
-def output_node(state: RecipeGraphState):
+NO_RECIPE_REPLY = "抱歉，没有找到符合你要求的菜谱。可以换个关键词，或者放宽一些要求再试试。"
+
+
+@traced("node")
+async def output_node(state: RecipeGraphState):
     """
-    使用LLM对最终的输出进行润色和自然语言组织
+    使用LLM对最终的输出进行润色和自然语言组织。
+    润色结果逐 token 通过 custom 流模式发出（{"output_token": 文本片段}），
+    前端用 stream_mode=["updates", "custom"] 即可边生成边显示。
     """
-    print("--- 节点: Output Node（润色结果） ---")
+    logger.info("--- 节点: Output Node（润色结果） ---")
     state.setdefault("messages", []).append({"role": "assistant", "content": "✨ 正在润色推荐结果..."})
 
+    writer = get_stream_writer()
+    if not state.get("final_recipe"):
+        # 没有菜谱通过筛选时直接回复，不调用LLM
+        state["final_output"] = NO_RECIPE_REPLY
+        writer({"output_token": NO_RECIPE_REPLY})
+        state["messages"].append({"role": "assistant", "content": NO_RECIPE_REPLY})
+        return state
+
     prompt = ChatPromptTemplate.from_template(
         """请你把下面的食谱推荐结果整理成更自然的对话回复。
         保持友好、简洁，让用户觉得是和一个厨艺助手在聊天。
@@ -231,18 +682,23 @@ def output_node(state: RecipeGraphState):
         """
     )
 
-    chain = prompt | llm
-    refined_output = chain.invoke({"final_recipe": state["final_recipe"]})
-    state["final_output"] = refined_output.content
-    print("--- 节点: 润色完成！ ---")
+    chain = prompt | get_llm("output")
+    chunks = []
+    async for chunk in chain.astream({"final_recipe": state["final_recipe"]}):
+        if chunk.content:
+            chunks.append(chunk.content)
+            writer({"output_token": chunk.content})
+    state["final_output"] = "".join(chunks)
+    logger.info("--- 节点: 润色完成！ ---")
     # 将润色后的内容也添加到消息列表中
-    print(refined_output.content)
+    logger.debug("%s", state["final_output"])
     state.setdefault("messages", []).append({"role": "assistant", "content": state["final_output"]})
     return state
 
 
+@traced("node")
 def generate_query_node(state: RecipeAppState):
-    print("节点: generate_query")
+    logger.info("节点: generate_query")
     # ... 根据食材和需求生成搜索关键词 ...
     state[
         'search_query'] = f"{' '.join(state['ingredients'])} {state['requirements']} recipe site:xiachufang.com OR site:tasty.co"
@@ -250,12 +706,13 @@ def generate_query_node(state: RecipeAppState):
     return state
 
 
+@traced("node")
 def save_to_markdown_node(state: RecipeGraphState):
     """将所有食谱保存到一个Markdown文件"""
-    print("--- 节点: 保存为Markdown文件 ---")
+    logger.info("--- 节点: 保存为Markdown文件 ---")
 
     if not state.get('final_recipe'):
-        print(" !! 没有可用的最终食谱内容，无法保存。")
+        logger.warning(" !! 没有可用的最终食谱内容，无法保存。")
         state['output_file_path'] = ""
         return state
 
@@ -295,10 +752,10 @@ def save_to_markdown_node(state: RecipeGraphState):
             f.write(state['final_recipe'])
 
         state['output_file_path'] = file_path
-        print(f"--- {recipe_count}份食谱已保存到: {file_path} ---")
+        logger.info(f"--- {recipe_count}份食谱已保存到: {file_path} ---")
 
     except Exception as e:
-        print(f" !! 保存文件失败: {e}")
+        logger.warning(f" !! 保存文件失败: {e}")
         state['output_file_path'] = ""
 
     return state
@@ -310,9 +767,18 @@ def get_chat_app():
 
     # 2. 添加所有需要的节点
     workflow.add_node("input_parser", parse_input_node)
-    workflow.add_node("scraper", scrape_node)
-    workflow.add_node("parser", parse_recipes_node)  # <--- 关键：添加解析节点
-    workflow.add_node("filter", filter_recipes_node)
+    if settings.CORPUS_MODE in ("before", "only"):
+        workflow.add_node("corpus", corpus_search_node)
+    if settings.CORPUS_MODE == "before":
+        workflow.add_node("corpus_fallback", corpus_fallback_node)
+    if settings.CORPUS_MODE != "only":
+        # 流水线模式下爬取与筛选合并为一个节点，边抓边评分
+        workflow.add_node("scraper", stream_scrape_filter_node if settings.PIPELINE_STREAMING else scrape_node)
+    # 流水线节点自己完成解析兜底和筛选；只有不经流水线的路径（屏障模式、离线语料已够数）才需要单独的解析和筛选节点
+    use_parser = not settings.PIPELINE_STREAMING or settings.CORPUS_MODE in ("before", "only")
+    if use_parser:
+        workflow.add_node("parser", parse_recipes_node)  # 解析兜底：只对确定性解析可疑的菜谱调用LLM
+        workflow.add_node("filter", filter_recipes_node)
     workflow.add_node("generator", generate_final_recipe_node)
     workflow.add_node("output", output_node)
     #workflow.add_node("save_md", save_to_markdown_node)
@@ -321,10 +787,30 @@ def get_chat_app():
     workflow.set_entry_point("input_parser")
 
     # 4. 定义正确的数据流转边
-    workflow.add_edge("input_parser", "scraper")
-    workflow.add_edge("scraper", "parser")  # <--- 关键：先爬取，再解析
-    workflow.add_edge("parser", "filter")  # <--- 关键：用解析后的数据去筛选
-    workflow.add_edge("filter", "generator")
+    if settings.CORPUS_MODE == "only":
+        # 只用离线语料代替爬虫
+        workflow.add_edge("input_parser", "corpus")
+        workflow.add_edge("corpus", "parser")
+    elif settings.CORPUS_MODE == "before":
+        # 先查离线语料，候选不足时再爬取
+        workflow.add_edge("input_parser", "corpus")
+        workflow.add_conditional_edges("corpus", route_after_corpus, {"enough": "parser", "crawl": "scraper"})
+    else:
+        workflow.add_edge("input_parser", "scraper")
+    if settings.CORPUS_MODE != "only":
+        if settings.PIPELINE_STREAMING:
+            workflow.add_edge("scraper", "generator")
+        else:
+            workflow.add_edge("scraper", "parser")  # <--- 关键：先爬取，再解析
+    if use_parser:
+        workflow.add_edge("parser", "filter")  # <--- 关键：用解析后的数据去筛选
+        if settings.CORPUS_MODE == "before":
+            # 跳过爬取的语料路径筛选后不够数时回退到爬取
+            workflow.add_conditional_edges("filter", route_after_corpus_filter,
+                                           {"crawl": "corpus_fallback", "done": "generator"})
+            workflow.add_edge("corpus_fallback", "scraper")
+        else:
+            workflow.add_edge("filter", "generator")
     workflow.add_edge("generator", "output")
     #workflow.add_edge("generator", "save_md")
     # 如果 save_md 是最后一步，可以让它指向 END
@@ -0,0 +1,149 @@
+import asyncio
+import atexit
+import logging
+import queue
+import threading
+from typing import AsyncIterator, Iterator, Optional, TypeVar
+
+from nodes.graph import get_chat_app
+from tools.browser_pool import close_browser_pool, get_browser_pool
+from tools.douguo_http import get_douguo_http_fetcher
+from utils import settings
+from utils.telemetry import get_telemetry
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_DONE = object()
+
+
+async def warm_up_resources():
+    """在当前事件循环上预热 HTTP 抓取器和浏览器池；失败时只打印提示，真正用到时各资源会自行重试"""
+    try:
+        if settings.DOUGUO_HTTP_FAST_PATH:
+            get_douguo_http_fetcher()
+        await get_browser_pool()
+    except Exception as e:
+        logger.warning(f"  !! 运行时预热失败（将在首次使用时重试）: {e}")
+
+
+async def run_recipe_graph_stream(query: str, app=None):
+    """
+    逐事件产出 (kind, text)
+    - kind="progress"：过程提示（来自各中间节点的 messages）
+    - kind="token"   ：最终回复的增量片段（来自 output_node 的流式输出）
+    - kind="final"   ：最终结果（来自 output_node 的 final_output）
+
+    :param app: 已编译的图，为 None 时临时编译一个
+    """
+    inputs = {"user_raw_query": query}
+    app = app or get_chat_app()
+
+    async for mode, event in app.astream(inputs, stream_mode=["updates", "custom"]):
+        # ✅ 润色中：output_node 逐 token 写出的片段；流水线筛选中：即时进度
+        if mode == "custom":
+            if isinstance(event, dict) and event.get("output_token"):
+                yield "token", event["output_token"]
+            elif isinstance(event, dict) and event.get("progress"):
+                # 流水线模式下每选中一个菜谱就发出一条进度
+                yield "progress", event["progress"]
+            continue
+
+        for _, values in event.items():
+            # ✅ 最终：output_node 会包含 final_output
+            if "final_output" in values and values["final_output"]:
+                yield "final", values["final_output"]
+                continue
+
+            # ✅ 过程：只拿“最新一条”助手提示，避免重复堆叠
+            if "messages" in values and values["messages"]:
+                assistants = [m["content"] for m in values["messages"] if m.get("role") == "assistant"]
+                if assistants:
+                    yield "progress", assistants[-1]  # 只发出最新一条过程提示
+
+
+class GraphRuntime:
+    """
+    常驻的图运行时：进程内只编译一次图，并在一个后台线程里运行唯一的事件循环。
+    各个会话（Streamlit 的每次重跑、每个浏览器标签页）把任务提交到这个事件循环，
+    通过线程安全的队列逐条读取流式事件，LLM 的 HTTP 连接、浏览器池和 HTTP 抓取器都在这个循环上保持预热。
+    """
+
+    def __init__(self):
+        self.app = get_chat_app()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name="graph-runtime", daemon=True)
+        self._thread.start()
+        # 预热不阻塞启动，失败时只打印提示，真正用到时各资源会自行重试
+        asyncio.run_coroutine_threadsafe(warm_up_resources(), self._loop)
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def iterate(self, agen: AsyncIterator[T]) -> Iterator[T]:
+        """
+        在常驻事件循环上驱动异步生成器，并在调用线程中同步地逐条产出它的元素。
+
+        :param agen: 要运行的异步生成器
+        :return: 同步迭代器；调用方提前停止迭代时，后台任务会被取消
+        """
+        events: "queue.Queue" = queue.Queue()
+
+        async def pump():
+            try:
+                async for item in agen:
+                    events.put((item, None))
+            except Exception as e:
+                events.put((_DONE, e))
+            else:
+                events.put((_DONE, None))
+            finally:
+                if settings.METRICS_PATH:
+                    _write_metrics()
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self._loop)
+        try:
+            while True:
+                item, error = events.get()
+                if item is _DONE:
+                    if error is not None:
+                        raise error
+                    return
+                yield item
+        finally:
+            if not future.done():
+                future.cancel()
+
+    def close(self):
+        """关闭浏览器池等共享资源并停止事件循环"""
+        if not self._loop.is_running():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(close_browser_pool(), self._loop).result(timeout=10)
+        except Exception as e:
+            logger.warning(f"  !! 关闭浏览器池失败: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+
+def _write_metrics():
+    try:
+        get_telemetry().write_prometheus(settings.METRICS_PATH)
+    except OSError as e:
+        logger.warning(f"  !! 写入指标文件失败: {e}")
+
+
+_runtime: Optional[GraphRuntime] = None
+_runtime_lock = threading.Lock()
+
+
+def get_graph_runtime() -> GraphRuntime:
+    """获取进程级共享的图运行时，首次调用时编译图并启动后台事件循环"""
+    global _runtime
+    with _runtime_lock:
+        if _runtime is None:
+            _runtime = GraphRuntime()
+            atexit.register(_runtime.close)
+        return _runtime
@@ -1,7 +1,14 @@
+import logging
+
 from tools.dashscope_web_search import DashScopeWebSearchTool
+from utils.telemetry import traced
+
+logger = logging.getLogger(__name__)
+
 
+@traced("node")
 async def deepsearch_node(state):
-    print("--- 节点: DeepSearch 联网搜索 ---")
+    logger.info("--- 节点: DeepSearch 联网搜索 ---")
     search_tool = DashScopeWebSearchTool(strategy="turbo", forced=True)
     query = " ".join(state.get("search_keywords", []))
 
@@ -17,8 +24,8 @@ async def deepsearch_node(state):
     state["search_results"] = result["results"]
     state["search_answer"] = result["answer"]
 
-    print(result["results"])
-    print(result["answer"])
+    logger.debug("%s", result["results"])
+    logger.debug("%s", result["answer"])
 
     # 提示用户搜索正在进行
     state.setdefault("messages", []).append(
@@ -0,0 +1,220 @@
+# server.py
+"""
+菜谱图的异步 HTTP 服务：进程内只编译一次图，在同一个事件循环上并发处理多个用户的请求，
+浏览器池、HTTP 抓取器和 LLM 并发名额由所有请求共享。
+
+接口:
+- POST /v1/recipes    {"query": "...", "stream": true}
+    stream 为 true（默认）时以 SSE 逐条推送 progress / token / final 事件，最后是 done 或 error；
+    为 false 时等待运行结束后返回 JSON。准入队列已满返回 429，排队超时返回 503。
+- GET  /healthz       运行状态和准入队列占用
+- GET  /metrics       Prometheus 文本格式的指标
+
+运行: python server.py [--host 127.0.0.1] [--port 8000]
+"""
+import argparse
+import asyncio
+import json
+import logging
+from contextlib import aclosing
+from typing import Optional
+
+from aiohttp import web
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from nodes.graph import get_chat_app
+from nodes.runtime import run_recipe_graph_stream, warm_up_resources
+from tools.browser_pool import close_browser_pool
+from utils import settings
+from utils.concurrency import AdmissionController, AdmissionRejected
+from utils.telemetry import get_telemetry, setup_logging
+
+logger = logging.getLogger(__name__)
+
+RETRY_AFTER_SECONDS = 5  # 被拒绝时建议客户端重试的间隔
+
+GRAPH_KEY = web.AppKey("recipe_graph", object)
+ADMISSION_KEY = web.AppKey("admission", AdmissionController)
+WARM_UP_KEY = web.AppKey("warm_up_task", asyncio.Task)
+
+
+class RunTimeout(Exception):
+    """单个请求的图运行超过 SERVER_RUN_TIMEOUT_SECONDS"""
+
+
+def _count_request(status: str):
+    get_telemetry().inc("recipe_server_requests_total", 1, (("status", status),))
+
+
+async def _events_with_deadline(query: str, app, timeout: float):
+    """在截止时间内逐条产出图的流式事件，超时抛出 RunTimeout，提前退出时关闭图的运行"""
+    events = run_recipe_graph_stream(query, app)
+    deadline = asyncio.get_running_loop().time() + timeout
+    try:
+        while True:
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                raise RunTimeout()
+            try:
+                yield await asyncio.wait_for(events.__anext__(), remaining)
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                raise RunTimeout() from None
+    finally:
+        await events.aclose()
+
+
+def _sse(event: str, data: dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+async def _parse_request(request: web.Request) -> dict:
+    try:
+        body = await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise web.HTTPBadRequest(text="请求体必须是 JSON")
+    query = body.get("query") if isinstance(body, dict) else None
+    if not isinstance(query, str) or not query.strip():
+        raise web.HTTPBadRequest(text="缺少 query")
+    if len(query) > settings.SERVER_MAX_QUERY_CHARS:
+        raise web.HTTPBadRequest(text=f"query 不能超过 {settings.SERVER_MAX_QUERY_CHARS} 个字符")
+    return {"query": query.strip(), "stream": body.get("stream", True) is not False}
+
+
+async def handle_recipes(request: web.Request) -> web.StreamResponse:
+    try:
+        body = await _parse_request(request)
+    except web.HTTPBadRequest:
+        _count_request("bad_request")
+        raise
+
+    admission = request.app[ADMISSION_KEY]
+    telemetry = get_telemetry()
+    try:
+        waited = await admission.acquire()
+    except AdmissionRejected as e:
+        _count_request(e.reason)
+        status = web.HTTPTooManyRequests if e.reason == "queue_full" else web.HTTPServiceUnavailable
+        raise status(text=f"服务繁忙（{e.reason}），请稍后重试", headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+    telemetry.observe("recipe_server_queue_wait_seconds", waited)
+
+    try:
+        with telemetry.span("request", "recipes", stream=body["stream"]) as span:
+            if body["stream"]:
+                response, status = await _stream_run(request, body["query"])
+            else:
+                response, status = await _collect_run(request.app[GRAPH_KEY], body["query"])
+            span.set(status=status)
+        _count_request(status)
+        return response
+    finally:
+        admission.release()
+
+
+async def _stream_run(request: web.Request, query: str):
+    """以 SSE 推送一次运行的事件，返回 (响应, 结果状态)"""
+    response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache",
+                                           "X-Accel-Buffering": "no"})
+    await response.prepare(request)
+    events = _events_with_deadline(query, request.app[GRAPH_KEY], settings.SERVER_RUN_TIMEOUT_SECONDS)
+    try:
+        async with aclosing(events):
+            async for kind, text in events:
+                await response.write(_sse(kind, {"text": text}))
+        await response.write(_sse("done", {}))
+        status = "ok"
+    except ConnectionResetError:
+        # 客户端已断开，退出 aclosing 时已关闭图的运行
+        logger.info("  > 客户端已断开，取消本次运行")
+        return response, "disconnected"
+    except RunTimeout:
+        await response.write(_sse("error", {"reason": "timeout"}))
+        status = "timeout"
+    except Exception as e:
+        logger.warning(f"  !! 运行失败: {e}")
+        await response.write(_sse("error", {"reason": "internal_error"}))
+        status = "error"
+    await response.write_eof()
+    return response, status
+
+
+async def _collect_run(app, query: str):
+    """等待一次运行结束并以 JSON 返回，返回 (响应, 结果状态)"""
+    progress, final_output = [], None
+    events = _events_with_deadline(query, app, settings.SERVER_RUN_TIMEOUT_SECONDS)
+    try:
+        async with aclosing(events):
+            async for kind, text in events:
+                if kind == "progress":
+                    progress.append(text)
+                elif kind == "final":
+                    final_output = text
+    except RunTimeout:
+        return web.json_response({"error": "timeout"}, status=504), "timeout"
+    except Exception as e:
+        logger.warning(f"  !! 运行失败: {e}")
+        return web.json_response({"error": "internal_error"}, status=500), "error"
+    return web.json_response({"final_output": final_output, "progress": progress}), "ok"
+
+
+async def handle_health(request: web.Request) -> web.Response:
+    admission = request.app[ADMISSION_KEY]
+    return web.json_response({"status": "ok", "active": admission.active, "queued": admission.queued,
+                              "max_active": admission.limit, "max_queued": admission.max_queued})
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    admission = request.app[ADMISSION_KEY]
+    telemetry = get_telemetry()
+    telemetry.set_gauge("recipe_server_active_runs", admission.active)
+    telemetry.set_gauge("recipe_server_queued_requests", admission.queued)
+    return web.Response(text=telemetry.render_prometheus(), content_type="text/plain",
+                        headers={"X-Content-Type-Options": "nosniff"})
+
+
+async def _on_startup(app: web.Application):
+    # 预热放到后台，不阻塞服务启动
+    app[WARM_UP_KEY] = asyncio.create_task(warm_up_resources())
+
+
+async def _on_cleanup(app: web.Application):
+    app[WARM_UP_KEY].cancel()
+    try:
+        await close_browser_pool()
+    except Exception as e:
+        logger.warning(f"  !! 关闭浏览器池失败: {e}")
+
+
+def create_app(admission: Optional[AdmissionController] = None) -> web.Application:
+    """
+    创建 aiohttp 应用：编译一次图并挂上准入队列。
+
+    :param admission: 准入队列，为 None 时按 settings.SERVER_* 创建
+    """
+    app = web.Application()
+    app[GRAPH_KEY] = get_chat_app()
+    app[ADMISSION_KEY] = admission or AdmissionController(settings.SERVER_MAX_ACTIVE_RUNS,
+                                                          settings.SERVER_MAX_QUEUED,
+                                                          settings.SERVER_QUEUE_TIMEOUT_SECONDS)
+    app.router.add_post("/v1/recipes", handle_recipes)
+    app.router.add_get("/healthz", handle_health)
+    app.router.add_get("/metrics", handle_metrics)
+    app.on_startup.append(_on_startup)
+    app.on_cleanup.append(_on_cleanup)
+    return app
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--host", default=settings.SERVER_HOST)
+    arg_parser.add_argument("--port", type=int, default=settings.SERVER_PORT)
+    args = arg_parser.parse_args()
+    setup_logging()
+    web.run_app(create_app(), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 # types/state.py
 from typing import TypedDict, List, Optional, Dict
 from pydantic import BaseModel, Field
+from typing_extensions import NotRequired
 
 
 class Ingredient(BaseModel):
@@ -15,11 +16,23 @@ class FilterDecision(BaseModel):
     score: int = Field(description="根据匹配度给出的1-10分的评分")
 
 
+class IndexedFilterDecision(FilterDecision):
+    """批量筛选时单个菜谱的决定，index 对应提示词中菜谱的编号"""
+    index: int = Field(description="菜谱在本批次中的编号，与提示词中【菜谱 N】的 N 一致（从 1 开始）")
+    title: str = Field(description="该编号菜谱的标题，照抄提示词中的标题", default="")
+
+
+class BatchFilterDecision(BaseModel):
+    """用于描述LLM对一批菜谱的筛选决定"""
+    decisions: List[IndexedFilterDecision] = Field(description="每个菜谱的筛选决定，每个编号恰好出现一次")
+
+
 class ScrapedContent(TypedDict):
     url: str  # 爬取的食谱页面URL
     title: str  # 爬取的食谱标题
     ingredients: List[Ingredient]  # 食材列表
     steps: List[str]
+    html_excerpt: NotRequired[str]  # 确定性解析结果可疑时附带的菜谱区域 HTML，解析节点兜底后移除
 
 
 class ParsedRecipe(BaseModel):
@@ -46,13 +59,17 @@ class RecipeGraphState(TypedDict):
     user_ingredients: List[str]  # 从用户输入中提取出的明确食材 (如: "生菜", "鸡蛋")
     recipe_count: int  # 用户希望获取的食谱数量 (如: 2)
     requirements: str  # 用户的其他要求 (如: "低脂肪", "适合儿童")
+    plan_source: str  # 规划来源: "rules"（规则直接得出）或 "llm"
 
     # --- 爬虫阶段 ---
     target_url: str
     scraped_contents: List[ScrapedContent]  # 爬取的内容列表
+    corpus_candidates: List[ScrapedContent]  # 从离线语料中检索到的候选菜谱
+    corpus_shortcut: bool  # 语料候选足够、跳过了爬取；筛选后仍不够数时回退到爬取
 
     # --- 解析阶段 ---
     filtered_recipes: List[ParsedRecipe]
+    prefilter_rejections: List[Dict[str, str]]  # 规则预筛选淘汰的菜谱及原因代码
 
     # --- 生成阶段 ---
     final_recipe: str  # Markdown格式的菜谱，包括所有的
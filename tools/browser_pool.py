@@ -0,0 +1,233 @@
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+from playwright.async_api import async_playwright, Browser, BrowserContext, Page, Playwright
+from playwright.async_api import Error as PlaywrightError
+
+from utils import settings
+
+logger = logging.getLogger(__name__)
+
+
+class PooledContext:
+    """池中的一个浏览器上下文槽位，记录已服务的页面数和健康状态"""
+
+    def __init__(self, pool: "BrowserPool", slot_id: int):
+        self.pool = pool
+        self.slot_id = slot_id
+        self.context: Optional[BrowserContext] = None
+        self.pages_served = 0
+        self.crashed = False
+
+    async def new_page(self) -> Page:
+        """在当前上下文中打开一个新标签页，并计入回收计数"""
+        page = await self.context.new_page()
+        self.pages_served += 1
+        # 页面崩溃时标记槽位，归还时整体回收
+        page.on("crash", lambda _: self._mark_crashed())
+        return page
+
+    def _mark_crashed(self):
+        self.crashed = True
+
+    @property
+    def needs_recycle(self) -> bool:
+        return self.crashed or self.pages_served >= self.pool.max_pages_per_context
+
+
+class BrowserPool:
+    """
+    进程级的 Chromium 浏览器/上下文池。
+    启动一次浏览器，预先创建 size 个已加载登录状态的上下文，
+    调用方借用上下文完成爬取后归还；上下文打开页面过多或崩溃时自动回收重建。
+    """
+
+    def __init__(self,
+                 size: int = settings.BROWSER_POOL_SIZE,
+                 headless: bool = settings.BROWSER_HEADLESS,
+                 storage_state: Optional[str] = settings.DOUGUO_AUTH_STATE_PATH,
+                 max_pages_per_context: int = settings.BROWSER_MAX_PAGES_PER_CONTEXT):
+        """
+        :param size: 池中上下文的数量，即同时可借出的上下文上限
+        :param headless: 是否以无头模式启动浏览器
+        :param storage_state: 登录状态文件路径，文件不存在时创建匿名上下文
+        :param max_pages_per_context: 单个上下文打开多少个页面后回收重建
+        """
+        self.size = size
+        self.headless = headless
+        self.storage_state = storage_state
+        self.max_pages_per_context = max_pages_per_context
+
+        self._playwright: Optional[Playwright] = None
+        self._browser: Optional[Browser] = None
+        self._slots: List[PooledContext] = []
+        self._idle: Optional[asyncio.Queue] = None
+        self._start_lock = asyncio.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.started = False
+
+    async def start(self):
+        """启动浏览器并预热所有上下文（重复调用是安全的）"""
+        async with self._start_lock:
+            if self.started:
+                return
+            self._loop = asyncio.get_running_loop()
+            self._playwright = await async_playwright().start()
+            await self._launch_browser()
+            self._idle = asyncio.Queue()
+            for slot_id in range(self.size):
+                slot = PooledContext(self, slot_id)
+                await self._open_context(slot)
+                self._slots.append(slot)
+                self._idle.put_nowait(slot)
+            self.started = True
+            logger.info(f"--- 浏览器池已启动: {self.size} 个上下文, headless={self.headless} ---")
+
+    async def _launch_browser(self):
+        self._browser = await self._playwright.chromium.launch(headless=self.headless)
+
+    async def _open_context(self, slot: PooledContext):
+        if self.storage_state and os.path.exists(self.storage_state):
+            slot.context = await self._browser.new_context(storage_state=self.storage_state)
+        else:
+            slot.context = await self._browser.new_context()
+        slot.pages_served = 0
+        slot.crashed = False
+
+    async def _recycle(self, slot: PooledContext):
+        """关闭旧上下文并重建；浏览器本身断开时先重启浏览器"""
+        try:
+            if slot.context is not None:
+                await slot.context.close()
+        except PlaywrightError:
+            pass
+        if not self._browser.is_connected():
+            await self._restart_browser()
+        await self._open_context(slot)
+
+    async def _restart_browser(self):
+        logger.warning("  !! 浏览器连接已断开，正在重启浏览器...")
+        try:
+            await self._browser.close()
+        except PlaywrightError:
+            pass
+        await self._launch_browser()
+        # 旧浏览器上的上下文已全部失效，空闲槽位在下次借出时会通过健康检查重建
+        for slot in self._slots:
+            slot.crashed = True
+
+    async def _is_healthy(self, slot: PooledContext) -> bool:
+        """健康检查：浏览器仍然连接，且上下文能正常响应"""
+        if slot.crashed or slot.context is None or not self._browser.is_connected():
+            return False
+        try:
+            await asyncio.wait_for(slot.context.cookies(), timeout=5)
+            return True
+        except (PlaywrightError, asyncio.TimeoutError):
+            return False
+
+    @asynccontextmanager
+    async def context(self):
+        """
+        借用一个上下文槽位：
+            async with pool.context() as ctx:
+                page = await ctx.new_page()
+        """
+        await self.start()
+        slot = await self._idle.get()
+        try:
+            if not await self._is_healthy(slot):
+                await self._recycle(slot)
+            yield slot
+        except PlaywrightError:
+            # 爬取过程中出现浏览器错误时，检查该上下文是否仍然可用
+            if not await self._is_healthy(slot):
+                slot.crashed = True
+            raise
+        finally:
+            await self._release(slot)
+
+    @asynccontextmanager
+    async def page(self):
+        """借用一个上下文并在其中打开单个页面，用完自动关闭页面并归还上下文"""
+        async with self.context() as ctx:
+            page = await ctx.new_page()
+            try:
+                yield page
+            finally:
+                try:
+                    await page.close()
+                except PlaywrightError:
+                    pass
+
+    async def _release(self, slot: PooledContext):
+        # 关闭调用方遗留的页面，避免上下文内标签页无限增长
+        if slot.context is not None and not slot.crashed:
+            for leftover in list(slot.context.pages):
+                try:
+                    await leftover.close()
+                except PlaywrightError:
+                    slot.crashed = True
+        if slot.needs_recycle:
+            try:
+                await self._recycle(slot)
+            except PlaywrightError as e:
+                logger.warning(f"  !! 回收浏览器上下文失败: {e}")
+                slot.crashed = True
+        self._idle.put_nowait(slot)
+
+    async def close(self):
+        """关闭池中所有上下文、浏览器以及 Playwright 实例"""
+        if not self.started:
+            return
+        for slot in self._slots:
+            try:
+                await slot.context.close()
+            except PlaywrightError:
+                pass
+        try:
+            await self._browser.close()
+        finally:
+            await self._playwright.stop()
+            self._slots = []
+            self.started = False
+
+
+_pool: Optional[BrowserPool] = None
+
+
+async def get_browser_pool() -> BrowserPool:
+    """
+    获取进程级共享的浏览器池。
+    Playwright 对象绑定在创建它的事件循环上，因此换了事件循环时会重新建池。
+    """
+    global _pool
+    loop = asyncio.get_running_loop()
+    if _pool is None or (_pool.started and _pool._loop is not loop):
+        if _pool is not None:
+            _retire_pool(_pool)
+        _pool = BrowserPool()
+    await _pool.start()
+    return _pool
+
+
+def _retire_pool(pool: BrowserPool):
+    """换了事件循环时处理旧的浏览器池：Playwright 对象只能在创建它的事件循环上关闭"""
+    old_loop = pool._loop
+    if old_loop is not None and old_loop.is_running() and not old_loop.is_closed():
+        logger.warning("--- 事件循环已更换, 在原事件循环上关闭旧的浏览器池 ---")
+        asyncio.run_coroutine_threadsafe(pool.close(), old_loop)
+    else:
+        logger.error("  !! 事件循环已更换且原事件循环已停止, 旧的浏览器池无法关闭, Chromium 进程可能残留；"
+                     "请在事件循环结束前调用 close_browser_pool()")
+
+
+async def close_browser_pool():
+    """关闭共享浏览器池（通常在进程退出前调用）"""
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
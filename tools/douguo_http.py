@@ -0,0 +1,155 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Optional
+from urllib.parse import quote
+
+import httpx
+
+from tools.recipe_extractor import extract_next_page_url
+from utils import settings
+from utils.telemetry import traced
+
+logger = logging.getLogger(__name__)
+
+_HEADERS = {
+    "User-Agent": ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                   "(KHTML, like Gecko) Chrome/139.0.0.0 Safari/537.36"),
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "zh-CN,zh;q=0.9",
+}
+
+# 页面标题中出现这些内容时说明被验证码或登录页拦截，需要退回浏览器
+_CAPTCHA_MARKERS = ("captcha", "验证码", "滑动验证", "安全验证", "访问过于频繁")
+_LOGIN_MARKERS = ("登录", "login")
+
+
+class DouguoFastPathError(Exception):
+    """HTTP 直连无法得到可用结果（验证码、登录墙、空结果或请求失败），需要退回 Playwright"""
+
+
+class DouguoHttpFetcher:
+    """
+    豆果美食的纯 HTTP 抓取器。
+    搜索结果页和菜谱详情页都是服务端渲染的静态 HTML，直接请求即可解析，
+    无需启动浏览器。复用 douguo_auth_state.json 中的 Cookie，并通过连接池保持长连接。
+    """
+
+    def __init__(self,
+                 base_url: str = settings.DOUGUO_BASE_URL,
+                 storage_state: Optional[str] = settings.DOUGUO_AUTH_STATE_PATH,
+                 max_connections: int = settings.HTTP_MAX_CONNECTIONS,
+                 timeout: float = settings.HTTP_TIMEOUT_SECONDS):
+        """
+        :param base_url: 豆果美食站点地址
+        :param storage_state: Playwright 保存的登录状态文件，从中读取 Cookie
+        :param max_connections: 连接池的最大连接数
+        :param timeout: 单次请求超时时间（秒）
+        """
+        self.base_url = base_url
+        self.client = httpx.AsyncClient(
+            headers=_HEADERS,
+            cookies=self.load_cookies(storage_state),
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections),
+            timeout=timeout,
+            follow_redirects=True,
+        )
+        self._loop = asyncio.get_running_loop()
+
+    @staticmethod
+    def load_cookies(storage_state: Optional[str]) -> httpx.Cookies:
+        """从 Playwright 的 storage_state 文件中读取豆果域名下的 Cookie"""
+        cookies = httpx.Cookies()
+        if not storage_state or not os.path.exists(storage_state):
+            return cookies
+        with open(storage_state, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        for cookie in state.get("cookies", []):
+            if cookie.get("domain", "").lstrip(".").endswith("douguo.com"):
+                cookies.set(cookie["name"], cookie["value"],
+                            domain=cookie["domain"], path=cookie.get("path", "/"))
+        return cookies
+
+    def search_url(self, search_query: str) -> str:
+        return f"{self.base_url}/search/recipe/{quote(search_query)}"
+
+    def next_page_url(self, html_content: str, current_url: str) -> Optional[str]:
+        """从搜索结果页中找到“下一页”链接，没有时返回 None"""
+        return extract_next_page_url(html_content, current_url)
+
+    @traced("http", "douguo_fetch")
+    async def fetch(self, url: str) -> str:
+        """
+        请求一个页面并返回HTML文本。
+
+        :raises DouguoFastPathError: 请求失败、被重定向到登录页或遇到验证码
+        """
+        try:
+            response = await self.client.get(url)
+        except httpx.HTTPError as e:
+            raise DouguoFastPathError(f"请求失败: {e}") from e
+
+        if response.status_code != 200:
+            raise DouguoFastPathError(f"HTTP {response.status_code}")
+        if "login" in response.url.path or "passport" in response.url.host:
+            raise DouguoFastPathError("被重定向到登录页")
+
+        html_content = response.text
+        # 正常页面的公共头部也会带有登录弹窗等文字，因此只检查页面标题；
+        # 没被识别出来的拦截页会在解析出空结果时再退回浏览器
+        page_title = self._page_title(html_content).lower()
+        if any(marker in page_title for marker in _CAPTCHA_MARKERS):
+            raise DouguoFastPathError("遇到验证码")
+        if any(marker in page_title for marker in _LOGIN_MARKERS):
+            raise DouguoFastPathError("遇到登录墙")
+        return html_content
+
+    @staticmethod
+    def _page_title(html_content: str) -> str:
+        start = html_content.find("<title>")
+        if start < 0:
+            return ""
+        end = html_content.find("</title>", start)
+        return html_content[start + len("<title>"):end if end > 0 else None]
+
+    async def close(self):
+        await self.client.aclose()
+
+
+_fetcher: Optional[DouguoHttpFetcher] = None
+
+
+def get_douguo_http_fetcher() -> DouguoHttpFetcher:
+    """获取进程级共享的 HTTP 抓取器；连接池绑定事件循环，换了事件循环时会重新创建"""
+    global _fetcher
+    loop = asyncio.get_running_loop()
+    if _fetcher is None or _fetcher._loop is not loop:
+        if _fetcher is not None:
+            _retire_fetcher(_fetcher, loop)
+        _fetcher = DouguoHttpFetcher()
+    return _fetcher
+
+
+# 正在后台关闭的旧客户端，保留引用以免任务被回收
+_closing = set()
+
+
+def _retire_fetcher(fetcher: DouguoHttpFetcher, loop: asyncio.AbstractEventLoop):
+    """换了事件循环时关闭旧的客户端：原事件循环仍在运行时在原循环上关闭，否则在当前循环上关闭"""
+    old_loop = fetcher._loop
+    logger.info("--- 事件循环已更换, 关闭旧的 HTTP 客户端 ---")
+    if old_loop.is_running() and not old_loop.is_closed():
+        asyncio.run_coroutine_threadsafe(fetcher.close(), old_loop)
+        return
+
+    async def close_quietly():
+        try:
+            await fetcher.close()
+        except Exception as e:
+            logger.warning(f"  !! 关闭旧的 HTTP 客户端失败: {e}")
+
+    task = loop.create_task(close_quietly())
+    _closing.add(task)
+    task.add_done_callback(_closing.discard)
@@ -1,18 +1,64 @@
+import asyncio
+import logging
 import random
+from contextlib import AsyncExitStack
 from math import ceil
 
-from bs4 import BeautifulSoup
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict, Optional, Set
 
-from playwright.async_api import async_playwright
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+from tools.browser_pool import BrowserPool, PooledContext, get_browser_pool
+from tools import recipe_extractor
+from tools.douguo_http import DouguoFastPathError, DouguoHttpFetcher
+from tools.rate_limiter import HostRateLimiter, get_host_rate_limiter
+from tools.resource_policy import BlockStats, get_resource_policy
+from utils import settings
+from utils.recipe_store import RecipeStore
+from utils.search_cache import SearchResultCache
+from utils.telemetry import get_telemetry, traced
+
+logger = logging.getLogger(__name__)
 
 
 class DouguoRecipeScraper:
-    def __init__(self):
-        self.base_url = "https://www.douguo.com"
+    def __init__(self,
+                 pool: Optional[BrowserPool] = None,
+                 detail_concurrency: int = settings.DETAIL_CONCURRENCY,
+                 rate_limiter: Optional[HostRateLimiter] = None,
+                 http_fetcher: Optional[DouguoHttpFetcher] = None,
+                 recipe_store: Optional[RecipeStore] = None,
+                 search_cache: Optional[SearchResultCache] = None):
+        self.base_url = settings.DOUGUO_BASE_URL
         self.recipes_data = []
-        # 定义状态文件的路径
-        self.AUTH_STATE_PATH = "douguo_auth_state.json"
+        # 定义状态文件的路径（由浏览器池在创建上下文时加载）
+        self.AUTH_STATE_PATH = settings.DOUGUO_AUTH_STATE_PATH
+        # 借用的浏览器池；未指定时使用进程级共享池
+        self.pool = pool
+        # 详情页并发数与按域名限速；限速器未指定时使用进程级共享的，所有请求合计不超过配额
+        self.detail_concurrency = max(1, detail_concurrency)
+        self.rate_limiter = rate_limiter if rate_limiter is not None else get_host_rate_limiter()
+        # 关键元素的等待截止时间，以及图片/字体/广告等请求的拦截策略
+        self.ready_timeout = settings.PAGE_READY_TIMEOUT_MS
+        self.resource_policy = get_resource_policy("douguo")
+        self.last_block_stats = BlockStats()
+        self.last_candidate_urls: List[str] = []
+        # HTTP 直连抓取器；为 None 时只使用浏览器
+        self.http_fetcher = http_fetcher
+        # 已解析菜谱的本地存储；为 None 时每次都重新抓取详情页
+        self.recipe_store = recipe_store
+        # 搜索结果页缓存；为 None 时每次都重新搜索
+        self.search_cache = search_cache
+
+    @staticmethod
+    def extract_title(html_content: str) -> str:
+        """
+        从给定的菜谱HTML内容中提取菜谱标题。
+
+        :param html_content: 菜谱详情页的HTML字符串。
+        :return: 标题文本，找不到时返回空字符串。
+        """
+        return recipe_extractor.extract_title(html_content)
 
     @staticmethod
     def extract_ingredients(html_content: str) -> List[Dict[str, str]]:
@@ -23,42 +69,7 @@ class DouguoRecipeScraper:
         :return: 一个字典列表，每个字典包含'name'和'quantity'。
                  例如: [{'name': '非即食全麦贝果', 'quantity': '2个'}, ...]
         """
-        # 初始化BeautifulSoup
-        soup = BeautifulSoup(html_content, 'lxml')
-
-        # 初始化一个空列表来存放结果
-        ingredients_list = []
-
-        # 1. 首先定位到包含所有食材的大容器，也就是那个<table>
-        #    它的 class 是 "retamr"
-        ingredients_table = soup.select_one('table.retamr')
-
-        # 2. 健壮性检查：如果没找到这个表格，就返回空列表
-        if not ingredients_table:
-            return ingredients_list
-
-        # 3. 在表格内，找到所有的单元格<td>。因为每个食材都在一个<td>里。
-        table_cells = ingredients_table.select('td')
-
-        # 4. 遍历每一个单元格
-        for cell in table_cells:
-            # 5. 在每个单元格中，分别寻找食材名和用量的<span>标签
-            name_span = cell.select_one('span.scname')
-            quantity_span = cell.select_one('span.scnum')
-
-            # 6. 关键步骤：只有当一个单元格同时包含食材名和用量时，我们才认为它是一个有效的食材条目
-            if name_span and quantity_span:
-                # 使用 .get_text(strip=True) 来获取纯文本，
-                # strip=True可以去掉前后的多余空格。
-                # 这个方法很棒，因为它能自动处理<span>里是否嵌套<a>标签的情况。
-                name = name_span.get_text(strip=True)
-                quantity = quantity_span.get_text(strip=True)
-                print(f"<UNK>: {name}, {quantity}")
-
-                # 7. 将提取到的信息存为一个字典，并添加到结果列表中
-                ingredients_list.append({'name': name, 'quantity': quantity})
-
-        return ingredients_list
+        return recipe_extractor.extract_ingredients(html_content)
 
     @staticmethod
     def extract_steps(html_content: str) -> List[str]:
@@ -68,36 +79,18 @@ class DouguoRecipeScraper:
         :param html_content: 包含烹饪步骤的HTML字符串。
         :return: 一个字符串列表，每个字符串是一个烹饪步骤。
         """
-        # 初始化BeautifulSoup
-        soup = BeautifulSoup(html_content, 'lxml')
-
-        # 初始化一个空列表来存放结果
-        steps_list = []
-
-        # 1. 定位到包含所有步骤的大容器 <div class="step">
-        # 2. 在容器中找到所有独立的步骤容器 <div class="stepcont clearfix">
-        step_containers = soup.select('div.stepcont.clearfix')
-
-        # 3. 遍历每一个步骤容器
-        for container in step_containers:
-            # 4. 在每个容器中，找到包含文本信息的 <div class="stepinfo">
-            info_div = container.select_one('div.stepinfo')
+        return recipe_extractor.extract_steps(html_content)
 
-            if info_div:
-                # 5. 关键技巧：在提取文本之前，先找到并移除“步骤X”所在的<p>标签
-                step_number_tag = info_div.find('p')
-                if step_number_tag:
-                    step_number_tag.decompose()  # decompose()会彻底移除标签及其内容
-
-                # 6. 现在info_div里只剩下纯粹的步骤描述文本了，我们再来提取它
-                step_text = info_div.get_text(strip=True)
-                print(f"提取到的步骤文本: {step_text}")
-
-                # 7. 确保提取到的文本不为空，然后添加到结果列表中
-                if step_text:
-                    steps_list.append(step_text)
+    @staticmethod
+    def extract_recipe(html_content: str) -> Dict:
+        """
+        只解析一次页面，同时提取标题、用料和步骤。抓取详情页时应优先使用它，
+        而不是分别调用上面三个方法各解析一遍。
 
-        return steps_list
+        :param html_content: 菜谱详情页的HTML字符串。
+        :return: 包含 'title'、'ingredients'、'steps' 的字典。
+        """
+        return recipe_extractor.extract_recipe(html_content)
 
     def extract_recipe_urls(self, html_content: str, count: int) -> List[str]:
         """
@@ -107,34 +100,19 @@ class DouguoRecipeScraper:
         :param count: 希望提取的URL数量。
         :return: 包含绝对URL的列表。
         """
-        # 初始化BeautifulSoup，使用lxml解析器
-        soup = BeautifulSoup(html_content, 'lxml')
-
-        # 初始化一个空列表来存放找到的URL，以便后续去重和计数
-        found_urls = []
-
-        # 1. 定位到包含所有食谱的列表容器 <ul class="cook-list">
-        # 2. 在容器中找到所有的食谱条目 <li>
-        #    通过观察，每个食谱条目都是一个 <li class="clearfix">
-        recipe_list_items = soup.select('ul.cook-list li.clearfix')
-
-        # 3. 遍历每一个食谱条目
-        for item in recipe_list_items:
-            # 4. 在每个条目中，找到代表菜谱名称和链接的<a>标签
-            #    最精确的定位是 class="cookname" 的<a>标签
-            link_tag = item.select_one('a.cookname')
-
-            # 5. 确保找到了链接标签并且它有'href'属性
-            if link_tag and link_tag.get('href'):
-                relative_url = link_tag.get('href')
+        # 定位 ul.cook-list 下每个 li.clearfix 中的 a.cookname，拼成绝对URL并去重
+        found_urls = recipe_extractor.extract_search_links(html_content, self.base_url)
+        return self.sample_recipe_urls(found_urls, count)
 
-                # 6. 拼接成完整的绝对URL
-                absolute_url = self.base_url + relative_url
-
-                # 7. 去重后添加到列表中
-                if absolute_url not in found_urls:
-                    found_urls.append(absolute_url)
+    @staticmethod
+    def sample_recipe_urls(found_urls: List[str], count: int) -> List[str]:
+        """
+        从一页搜索结果的完整URL列表中随机抽取指定数量的URL。
 
+        :param found_urls: 该页全部食谱URL（可以来自搜索结果缓存）
+        :param count: 希望抽取的URL数量。
+        """
+        found_urls = list(found_urls)
         # 首先，检查找到的URL数量是否足够
         if len(found_urls) <= count:
             # 如果找到的URL总数小于或等于需要的数量，就打乱顺序后全部返回
@@ -144,89 +122,264 @@ class DouguoRecipeScraper:
             # 如果URL数量充足，就从中随机抽取指定数量的URL
             return random.sample(found_urls, count)
 
-    async def scrape_douguo(
-        self,
-        search_keywords: List[str],
-        total_recipes_needed: int = 9, # 改为总共需要多少食谱
-        pages_to_scrape: int = 3       # 希望爬取的总页数
-    ):
+    async def scrape_recipe_detail(self, ctx: PooledContext, url: str) -> Optional[Dict]:
+        """
+        在新标签页中抓取单个食谱详情页。
+
+        :param ctx: 借用的浏览器上下文
+        :param url: 食谱详情页URL
+        :return: 食谱内容字典；页面加载或解析失败时返回 None
+        """
+        page = None
+        try:
+            page = await ctx.new_page()
+            await self.resource_policy.apply(page, self.last_block_stats)
+            await self.rate_limiter.wait(url)
+            with get_telemetry().span("navigation", "recipe_detail", url=url):
+                await page.goto(url, wait_until="domcontentloaded")
+            logger.info(f"正在爬取食谱: {url}")
+            # 等待标题出现，再给用料表/步骤一个截止时间；缺少其中之一时按已有内容解析
+            title = await page.locator('h1.title').inner_text(timeout=self.ready_timeout)
+            try:
+                await page.wait_for_selector("table.retamr, div.stepcont", timeout=self.ready_timeout)
+            except PlaywrightTimeoutError:
+                logger.info(f"  > 未等到用料表或步骤区域: {url}")
+            logger.info(f"食谱标题: {title}")
+
+            # 标题、用料和步骤一次解析完成
+            recipe = self.extract_recipe(await page.content())
+            logger.info(f"  > 用料 {len(recipe['ingredients'])} 项, 步骤 {len(recipe['steps'])} 步")
+
+            return {'url': url, **recipe, 'title': title}
+        except Exception as e:
+            # 单个页面失败不影响整批结果
+            logger.warning(f"  !! 爬取食谱失败: {url}, 错误: {e}")
+            return None
+        finally:
+            if page is not None and not page.is_closed():
+                await page.close()
+
+    async def scrape_recipe_detail_http(self, url: str) -> Optional[Dict]:
+        """
+        通过 HTTP 直连抓取单个食谱详情页，复用与浏览器路径相同的静态解析函数。
+
+        :param url: 食谱详情页URL
+        :return: 食谱内容字典；遇到验证码、登录墙或空结果时返回 None，由浏览器路径重试
+        """
+        try:
+            await self.rate_limiter.wait(url)
+            html_content = await self.http_fetcher.fetch(url)
+            recipe = self.extract_recipe(html_content)
+            if not recipe['title'] or not (recipe['ingredients'] or recipe['steps']):
+                raise DouguoFastPathError("详情页内容为空")
+            return {'url': url, **recipe}
+        except DouguoFastPathError as e:
+            logger.info(f"  > HTTP 抓取详情页失败, 将使用浏览器重试: {url}, 原因: {e}")
+            return None
+
+    async def fetch_search_page_http(self, search_query: str, page_url: Optional[str]):
+        """
+        通过 HTTP 直连请求一页搜索结果。
+
+        :param page_url: 要请求的结果页URL，为 None 时请求第一页
+        :return: (该页全部食谱URL, 下一页URL或None)
+        :raises DouguoFastPathError: 遇到验证码、登录墙或结果为空
         """
-        根据食材关键词，使用 Playwright 异步爬取豆果美食网站，返回前 search_limit 个食谱详情内容。
+        url = page_url or self.http_fetcher.search_url(search_query)
+        await self.rate_limiter.wait(url)
+        html_content = await self.http_fetcher.fetch(url)
+        found_urls = recipe_extractor.extract_search_links(html_content, self.base_url)
+        if not found_urls:
+            raise DouguoFastPathError("搜索结果为空")
+        return found_urls, self.http_fetcher.next_page_url(html_content, url)
+
+    @traced("navigation", "search_page")
+    async def fetch_search_page_browser(self, ctx: PooledContext, search_query: str, page_url: Optional[str]):
+        """
+        在浏览器中打开一页搜索结果。第一页通过首页搜索框提交，后续页直接打开“下一页”链接。
+
+        :param page_url: 要打开的结果页URL，为 None 时从首页发起搜索
+        :return: (该页全部食谱URL, 下一页URL或None)
+        """
+        page = await ctx.new_page()
+        try:
+            await self.resource_policy.apply(page, self.last_block_stats)
+            if page_url is None:
+                await page.goto(self.base_url, wait_until="domcontentloaded")
+
+                # 等待搜索框可用后输入关键词（fill 本身会等待元素可编辑）
+                search_input = "#global_search_inpt"
+                await page.wait_for_selector(search_input, timeout=self.ready_timeout)
+                await page.fill(search_input, search_query)
+                logger.info(f"已输入搜索关键词: {search_query}")
+
+                # 点击搜索按钮，并等待跳转到结果页
+                search_button = "input[type='submit'].lib"
+                async with page.expect_navigation(wait_until="domcontentloaded", timeout=self.ready_timeout):
+                    await page.click(search_button)
+                logger.info("搜索已提交，等待结果加载...")
+            else:
+                logger.info(f"  > 打开下一页: {page_url}")
+                await page.goto(page_url, wait_until="domcontentloaded")
+
+            # 智能等待：等待搜索结果列表容器出现，而不是固定等待
+            results_container_selector = "ul.cook-list"
+            await page.locator(results_container_selector).wait_for(timeout=self.ready_timeout)
+
+            # 获取搜索结果页面的HTML内容
+            html_content = await page.content()
+            found_urls = recipe_extractor.extract_search_links(html_content, self.base_url)
+            return found_urls, recipe_extractor.extract_next_page_url(html_content, page.url)
+        finally:
+            await page.close()
+
+    async def search_recipe_urls(self, search_keywords: List[str], total_recipes_needed: int,
+                                 pages_to_scrape: int) -> List[str]:
+        """
+        逐页获取搜索结果并从每页随机抽取食谱URL。
+        每页的完整链接列表优先从搜索结果缓存读取；未命中时先走 HTTP 直连，
+        直连不可用时退回浏览器（之后的页面也都用浏览器）。
         """
         search_query = " ".join(search_keywords)
-        print(f"--- 工具: 收到关键词 '{search_keywords}', 拼接为 '{search_query}' 进行搜索 ---")
         # 计算每页大概需要随机抽取多少个
         recipes_per_page = ceil(total_recipes_needed / pages_to_scrape)
 
         aggregated_urls = []  # 用于存放从各个页面随机抽取出来的URL
+        use_http = self.http_fetcher is not None
+        next_url = None
 
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=False)
-            # !!! 核心改动: 从文件加载身份状态来创建浏览器上下文 !!!
-            context = await browser.new_context(storage_state=self.AUTH_STATE_PATH)
-            page = await context.new_page()
-            await page.goto(self.base_url)
-            await page.wait_for_timeout(3000)  # 强制等待3秒
-
-            # 查找搜索框并输入关键词
-            search_input = "#global_search_inpt"
-            await page.fill(search_input, search_query)
-            print(f"已输入搜索关键词: {search_query}")
-            await page.wait_for_timeout(3000)  # 强制等待3秒
-
-            # 点击搜索按钮
-            search_button = "input[type='submit'].lib"
-            await page.click(search_button)
-            # await page.wait_for_load_state('networkidle')
-            print("搜索已提交，等待结果加载...")
-            await page.wait_for_timeout(5000)
-
+        async with AsyncExitStack() as stack:
+            ctx = None
             for i in range(pages_to_scrape):
-                # 智能等待：等待搜索结果列表容器出现，而不是固定等待
-                results_container_selector = "ul.cook-list"
-                await page.locator(results_container_selector).wait_for(timeout=30000)
-
-                # 获取搜索结果页面的HTML内容
-                html_content = await page.content()
-                # 通过 extract_recipe_urls 获取所有食谱URL
-                recipe_urls = self.extract_recipe_urls(html_content, recipes_per_page)
-                aggregated_urls.extend(recipe_urls)
+                cached = self.search_cache.get(search_keywords, i) if self.search_cache is not None else None
+                if cached is not None:
+                    logger.info(f"  > 搜索结果缓存命中: 第 {i + 1} 页")
+                    found_urls, page_next_url = cached["urls"], cached["next_url"]
+                else:
+                    found_urls = None
+                    if use_http:
+                        try:
+                            found_urls, page_next_url = await self.fetch_search_page_http(search_query, next_url)
+                        except DouguoFastPathError as e:
+                            logger.info(f"  > HTTP 快速通道不可用, 退回浏览器搜索: {e}")
+                            use_http = False
+                    if found_urls is None:
+                        if ctx is None:
+                            pool = self.pool or await get_browser_pool()
+                            # 从浏览器池借用一个已加载身份状态的上下文，用完归还而不是关闭浏览器
+                            ctx = await stack.enter_async_context(pool.context())
+                        found_urls, page_next_url = await self.fetch_search_page_browser(ctx, search_query, next_url)
+                    if self.search_cache is not None:
+                        self.search_cache.put(search_keywords, i, found_urls, page_next_url)
+
+                aggregated_urls.extend(self.sample_recipe_urls(found_urls, recipes_per_page))
 
                 # 检查是否已达到目标数量
                 if len(aggregated_urls) >= total_recipes_needed:
-                    print("已收集到足够数量的食谱URL，停止翻页。")
+                    logger.info("已收集到足够数量的食谱URL，停止翻页。")
                     break
-
-                # 寻找并点击“下一页”按钮
-                next_page_link = page.locator('a.anext:has-text("下一页")')
-                if await next_page_link.count() > 0:
-                    print("  > 找到“下一页”按钮，准备点击...")
-                    await next_page_link.click()
-                    await page.wait_for_timeout(2000)
-                else:
-                    print("  > 未找到“下一页”按钮，已是最后一页。")
+                if not page_next_url:
+                    logger.info("  > 未找到“下一页”，已是最后一页。")
                     break
+                next_url = page_next_url
 
-            recipes_content = []
+        return list(dict.fromkeys(aggregated_urls))
+
+    async def iter_douguo(
+        self,
+        search_keywords: List[str],
+        total_recipes_needed: int = 9,
+        pages_to_scrape: int = 3,
+        exclude_urls: Optional[Set[str]] = None
+    ) -> AsyncIterator[Dict]:
+        """
+        scrape_douguo 的流式版本：每个食谱一抓取完成就立即产出，顺序为完成顺序。
+        菜谱存储命中的先产出；其余详情页先走 HTTP 直连，单个页面直连失败时立刻改用浏览器重试，
+        浏览器上下文在第一次需要时才借用。调用方提前停止迭代（aclose）时，未完成的抓取会被取消。
+
+        :param exclude_urls: 已经处理过的URL（例如追加抓取时上一轮的候选），不再抓取
+        """
+        search_query = " ".join(search_keywords)
+        logger.info(f"--- 工具: 收到关键词 '{search_keywords}', 拼接为 '{search_query}' 进行搜索 ---")
+
+        self.last_block_stats = BlockStats()
+        aggregated_urls = await self.search_recipe_urls(search_keywords, total_recipes_needed, pages_to_scrape)
+        if exclude_urls:
+            aggregated_urls = [url for url in aggregated_urls if url not in exclude_urls]
+        self.last_candidate_urls = aggregated_urls
+        logger.info(f"  > 共获取到 {len(aggregated_urls)} 个候选食谱URL")
+
+        # 已在菜谱存储中且未过期的详情页无需再次抓取
+        pending_urls = aggregated_urls
+        if self.recipe_store is not None:
+            fresh, stale = self.recipe_store.lookup_many(aggregated_urls)
+            logger.debug(f"  > 菜谱存储命中 {len(fresh)} 个, 过期待重新验证 {len(stale)} 个")
             for url in aggregated_urls:
-                await page.goto(url)
-                print(f"正在爬取食谱: {url}")
-                await page.wait_for_timeout(2000)
-                # 获取标题和内容
-                title = await page.locator('h1.title').inner_text()
-                print(f"食谱标题: {title}")
-
-                html_content = await page.content()
-                ingredients = self.extract_ingredients(html_content)
-                print(f"<UNK>: {len(ingredients)}")
-
-                steps = self.extract_steps(html_content)
-
-                recipes_content.append({
-                    'url': url,
-                    'title': title,
-                    'ingredients': ingredients,
-                    'steps': steps
-                })
-            await browser.close()
+                if url in fresh:
+                    yield fresh[url]
+            pending_urls = [url for url in aggregated_urls if url not in fresh]
+        if not pending_urls:
+            return
+
+        http_semaphore = asyncio.Semaphore(settings.HTTP_MAX_CONNECTIONS)
+        browser_semaphore = asyncio.Semaphore(self.detail_concurrency)
+        ctx_lock = asyncio.Lock()
+        used_browser = False
+
+        async with AsyncExitStack() as stack:
+            ctx = None
+
+            async def borrow_context() -> PooledContext:
+                nonlocal ctx, used_browser
+                async with ctx_lock:
+                    if ctx is None:
+                        pool = self.pool or await get_browser_pool()
+                        ctx = await stack.enter_async_context(pool.context())
+                        used_browser = True
+                    return ctx
+
+            async def fetch_one(url: str) -> Optional[Dict]:
+                if self.http_fetcher is not None:
+                    async with http_semaphore:
+                        recipe = await self.scrape_recipe_detail_http(url)
+                    if recipe is not None:
+                        return recipe
+                browser_ctx = await borrow_context()
+                async with browser_semaphore:
+                    return await self.scrape_recipe_detail(browser_ctx, url)
+
+            tasks = [asyncio.create_task(fetch_one(url)) for url in pending_urls]
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    recipe = await next_done
+                    if recipe is None:
+                        continue
+                    # 解析可疑的菜谱不写入存储，下次重新抓取，以免存储中留下残缺的内容
+                    if self.recipe_store is not None and 'html_excerpt' not in recipe:
+                        self.recipe_store.put(recipe)
+                    yield recipe
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                if used_browser:
+                    logger.info(f"--- 请求拦截统计: {self.last_block_stats.summary()} ---")
+
+    async def scrape_douguo(
+        self,
+        search_keywords: List[str],
+        total_recipes_needed: int = 9, # 改为总共需要多少食谱
+        pages_to_scrape: int = 3       # 希望爬取的总页数
+    ):
+        """
+        根据食材关键词爬取豆果美食网站，返回 total_recipes_needed 个左右的食谱详情内容。
+        优先走 HTTP 直连，遇到验证码、登录墙或空结果时退回 Playwright 浏览器；
+        菜谱存储中未过期的详情页直接复用，不再抓取。
+        """
+        recipes_by_url = {}
+        async for recipe in self.iter_douguo(search_keywords, total_recipes_needed, pages_to_scrape):
+            recipes_by_url[recipe['url']] = recipe
+
+        # 结果顺序与候选URL顺序保持一致
+        recipes_content = [recipes_by_url[url] for url in self.last_candidate_urls if url in recipes_by_url]
         return recipes_content
@@ -0,0 +1,54 @@
+import asyncio
+import time
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+from utils import settings
+
+
+class HostRateLimiter:
+    """
+    按域名限速：同一域名的两次请求之间至少间隔 1 / rate_per_host 秒。
+    不同域名之间互不影响。
+    """
+
+    def __init__(self, rate_per_host: float):
+        """
+        :param rate_per_host: 每个域名每秒允许发起的请求数，<= 0 表示不限速
+        """
+        self.min_interval = 1.0 / rate_per_host if rate_per_host > 0 else 0.0
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._next_allowed: Dict[str, float] = {}
+
+    async def wait(self, url: str):
+        """在向 url 发起请求前调用，必要时等待到该域名的下一个可用时间点"""
+        if self.min_interval <= 0:
+            return
+        host = urlparse(url).netloc
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            now = time.monotonic()
+            next_allowed = self._next_allowed.get(host, now)
+            if next_allowed > now:
+                await asyncio.sleep(next_allowed - now)
+                now = next_allowed
+            self._next_allowed[host] = now + self.min_interval
+
+
+_limiter: Optional[HostRateLimiter] = None
+_limiter_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_host_rate_limiter() -> HostRateLimiter:
+    """
+    获取进程级共享的按域名限速器，所有请求共用 settings.DETAIL_RATE_PER_HOST 的配额。
+    asyncio.Lock 绑定事件循环，换了事件循环时会重新创建，并沿用各域名的下一个可用时间点。
+    """
+    global _limiter, _limiter_loop
+    loop = asyncio.get_running_loop()
+    if _limiter is None or _limiter_loop is not loop:
+        limiter = HostRateLimiter(settings.DETAIL_RATE_PER_HOST)
+        if _limiter is not None:
+            limiter._next_allowed.update(_limiter._next_allowed)
+        _limiter, _limiter_loop = limiter, loop
+    return _limiter
@@ -0,0 +1,238 @@
+import re
+from typing import Dict, List, Optional
+from urllib.parse import urljoin
+
+import lxml.etree
+import lxml.html
+
+from utils import settings
+from utils.telemetry import traced
+
+
+def _has_class(*class_names: str) -> str:
+    """生成按 class 精确匹配的 XPath 条件，等价于 CSS 选择器中的 .a.b"""
+    return " and ".join(
+        f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')" for name in class_names
+    )
+
+
+# 预先拼好的 XPath，对应原先 BeautifulSoup 中使用的 CSS 选择器
+_TITLE_XPATH = f"//h1[{_has_class('title')}]"
+_INGREDIENT_CELL_XPATH = f"(//table[{_has_class('retamr')}])[1]//td"
+_INGREDIENT_NAME_XPATH = f".//span[{_has_class('scname')}]"
+_INGREDIENT_QUANTITY_XPATH = f".//span[{_has_class('scnum')}]"
+_STEP_INFO_XPATH = f"//div[{_has_class('stepcont', 'clearfix')}]"
+_STEP_TEXT_XPATH = f".//div[{_has_class('stepinfo')}]"
+_SEARCH_LINK_XPATH = f"//ul[{_has_class('cook-list')}]//li[{_has_class('clearfix')}]//a[{_has_class('cookname')}]"
+_NEXT_PAGE_XPATH = f"//a[{_has_class('anext')}]"
+
+# 兜底解析时按小标题定位菜谱区域：从“用料”到“做法步骤”，在“评论”“相关菜谱”等区域之前结束
+_HEADING_XPATH = "//h1|//h2|//h3|//h4"
+_INGREDIENTS_HEADING = re.compile(r"^(用料|食材|材料|原料)")
+_STEPS_HEADING = re.compile(r"^(做法|步骤|制作步骤|烹饪步骤)")
+_END_HEADING = re.compile(r"^(评论|相关|推荐|猜你喜欢|热门)")
+_NOISE_TAGS = ("script", "style", "noscript", "iframe", "svg", "img", "video", "link", "meta", "form", "button",
+               "input", "header", "footer", "nav")
+_INLINE_TAGS = ("a", "b", "strong", "em", "i", "font", "small", "u")
+# 只剩步骤序号的步骤，说明步骤文字的位置没有匹配上
+_PLACEHOLDER_STEP = re.compile(r"^(步骤|第)?\s*[0-9一二三四五六七八九十]+\s*步?[:：.．、]?$")
+
+
+def _text(element) -> str:
+    """拼接元素下所有文本节点并去掉空白，与 BeautifulSoup 的 get_text(strip=True) 结果一致"""
+    return "".join(part.strip() for part in element.xpath(".//text()"))
+
+
+def _parse(html_content: str):
+    if not html_content or not html_content.strip():
+        return lxml.html.fromstring("<html></html>")
+    try:
+        return lxml.html.fromstring(html_content)
+    except ValueError:
+        # 带有 XML 编码声明的字符串无法直接解析，转为字节后交给 lxml 识别编码
+        return lxml.html.fromstring(html_content.encode("utf-8"))
+
+
+def _extract_title(root) -> str:
+    title_tags = root.xpath(_TITLE_XPATH)
+    return _text(title_tags[0]) if title_tags else ""
+
+
+def _extract_ingredients(root) -> List[Dict[str, str]]:
+    ingredients_list = []
+    for cell in root.xpath(_INGREDIENT_CELL_XPATH):
+        name_spans = cell.xpath(_INGREDIENT_NAME_XPATH)
+        quantity_spans = cell.xpath(_INGREDIENT_QUANTITY_XPATH)
+        # 只有同时包含食材名和用量的单元格才是有效的食材条目
+        if name_spans and quantity_spans:
+            ingredients_list.append({'name': _text(name_spans[0]), 'quantity': _text(quantity_spans[0])})
+    return ingredients_list
+
+
+def _extract_steps(root) -> List[str]:
+    steps_list = []
+    for container in root.xpath(_STEP_INFO_XPATH):
+        info_divs = container.xpath(_STEP_TEXT_XPATH)
+        if not info_divs:
+            continue
+        info_div = info_divs[0]
+        # “步骤X”在第一个<p>里，提取文本前移除它（drop_tree 会保留其后的文本）
+        step_number_tag = info_div.find(".//p")
+        if step_number_tag is not None:
+            step_number_tag.drop_tree()
+        step_text = _text(info_div)
+        if step_text:
+            steps_list.append(step_text)
+    return steps_list
+
+
+@traced("parse", "recipe_detail")
+def extract_recipe(html_content: str) -> Dict:
+    """
+    一次解析菜谱详情页，同时提取标题、用料和步骤。
+
+    :param html_content: 菜谱详情页的HTML字符串。
+    :return: {'title': str, 'ingredients': [{'name', 'quantity'}], 'steps': [str]}，
+             结果可疑时（见 extraction_issues）另有 'html_excerpt': 截取的菜谱区域 HTML
+    """
+    root = _parse(html_content)
+    recipe = {
+        'title': _extract_title(root),
+        'ingredients': _extract_ingredients(root),
+        'steps': _extract_steps(root),
+    }
+    if settings.FALLBACK_EXTRACTION_ENABLED and extraction_issues(recipe):
+        # 结果可疑时附上相关的 HTML 片段，由解析节点交给 LLM 兜底；解析正常的菜谱不带片段
+        recipe['html_excerpt'] = _relevant_html(root, settings.FALLBACK_HTML_MAX_CHARS)
+    return recipe
+
+
+def extraction_issues(recipe: Dict) -> List[str]:
+    """
+    检查确定性解析的结果是否可疑（页面结构变化、区域缺失等），返回问题代码列表，结果正常时为空。
+
+    :param recipe: extract_recipe 的结果
+    """
+    issues = []
+    if not recipe['title']:
+        issues.append("no_title")
+    if not recipe['ingredients']:
+        issues.append("no_ingredients")
+    elif any(not ingredient['name'] for ingredient in recipe['ingredients']):
+        issues.append("blank_ingredient")
+    if not recipe['steps']:
+        issues.append("no_steps")
+    elif len(recipe['steps']) < settings.FALLBACK_MIN_STEPS:
+        issues.append("few_steps")
+    elif all(_PLACEHOLDER_STEP.match(step) for step in recipe['steps']):
+        issues.append("placeholder_steps")
+    return issues
+
+
+def _find_heading(headings: List, pattern: re.Pattern, start: int = 0):
+    for heading in headings[start:]:
+        if pattern.match(_text(heading)):
+            return heading
+    return None
+
+
+def _recipe_region(root) -> List:
+    """定位用料和步骤所在的区域：两个小标题的最近公共祖先下，从用料所在的子元素到结束小标题之前的子元素"""
+    headings = root.xpath(_HEADING_XPATH)
+    start = _find_heading(headings, _INGREDIENTS_HEADING)
+    if start is None:
+        start = _find_heading(headings, _STEPS_HEADING)
+    if start is None:
+        body = root.find("body")
+        return [body if body is not None else root]
+    steps = _find_heading(headings, _STEPS_HEADING, headings.index(start) + 1)
+    container = start.getparent()
+    if steps is not None:
+        ancestors = set(steps.iterancestors())
+        while container is not None and container not in ancestors:
+            container = container.getparent()
+    if container is None:
+        return [start.getparent()]
+    children, started = [], False
+    for child in container:
+        contains_start = child is start or child in start.iterancestors()
+        started = started or contains_start
+        if not started:
+            continue
+        heading = child if child.tag in ("h1", "h2", "h3", "h4") else next(iter(child.xpath(".//h1|.//h2|.//h3")), None)
+        if not contains_start and heading is not None and _END_HEADING.match(_text(heading)):
+            break
+        children.append(child)
+    return children
+
+
+def _compact_html(element) -> str:
+    """去掉噪声标签、注释和全部属性，只保留结构和文字"""
+    for node in element.xpath(".//comment()"):
+        node.drop_tree()
+    for node in element.xpath(" | ".join(f".//{tag}" for tag in _NOISE_TAGS)):
+        node.drop_tree()
+    # 行内标签只保留文字，span 用于分隔食材名和用量，保留
+    lxml.etree.strip_tags(element, *_INLINE_TAGS)
+    for node in list(element.iter()):
+        node.attrib.clear()
+        # 没有文字的空元素（图片链接的外壳、装饰用的 div 等）
+        if node is not element and not node.text_content().strip() and node.getparent() is not None:
+            node.drop_tree()
+    html = lxml.html.tostring(element, encoding="unicode")
+    html = re.sub(r"\s+", " ", html)
+    return re.sub(r">\s+<", "><", html).strip()
+
+
+def _relevant_html(root, max_chars: int) -> str:
+    excerpt = "".join(_compact_html(element) for element in _recipe_region(root))
+    return excerpt[:max_chars]
+
+
+def extract_relevant_html(html_content: str, max_chars: Optional[int] = None) -> str:
+    """
+    截取详情页中与菜谱有关的 HTML 片段（用料到做法步骤，不含评论和推荐区域），
+    去掉脚本、样式、图片和所有属性后压缩空白，超过 max_chars 时截断。供 LLM 兜底解析使用。
+
+    :param html_content: 菜谱详情页的HTML字符串
+    :param max_chars: 片段的最大字符数，默认为 settings.FALLBACK_HTML_MAX_CHARS
+    """
+    return _relevant_html(_parse(html_content), max_chars or settings.FALLBACK_HTML_MAX_CHARS)
+
+
+def extract_title(html_content: str) -> str:
+    return _extract_title(_parse(html_content))
+
+
+def extract_ingredients(html_content: str) -> List[Dict[str, str]]:
+    return _extract_ingredients(_parse(html_content))
+
+
+def extract_steps(html_content: str) -> List[str]:
+    return _extract_steps(_parse(html_content))
+
+
+@traced("parse", "search_links")
+def extract_search_links(html_content: str, base_url: str) -> List[str]:
+    """
+    从搜索结果页中按出现顺序提取去重后的食谱绝对URL。
+
+    :param html_content: 搜索结果页的HTML字符串。
+    :param base_url: 站点地址，用于拼接相对链接。
+    """
+    found_urls = []
+    for link in _parse(html_content).xpath(_SEARCH_LINK_XPATH):
+        href = link.get('href')
+        if href:
+            absolute_url = base_url + href
+            if absolute_url not in found_urls:
+                found_urls.append(absolute_url)
+    return found_urls
+
+
+def extract_next_page_url(html_content: str, current_url: str) -> Optional[str]:
+    """从搜索结果页中找到“下一页”链接，没有时返回 None"""
+    for link in _parse(html_content).xpath(_NEXT_PAGE_XPATH):
+        if "下一页" in _text(link) and link.get('href'):
+            return urljoin(current_url, link.get('href'))
+    return None
@@ -0,0 +1,123 @@
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Optional
+from urllib.parse import urlparse
+
+from playwright.async_api import Page, Route
+
+from utils import settings
+
+# 被拦截的请求无法得知真实大小，按资源类型的典型体积估算节省的流量
+_TYPICAL_BYTES = {
+    "image": 60_000,
+    "media": 500_000,
+    "font": 40_000,
+    "stylesheet": 30_000,
+    "script": 50_000,
+}
+_DEFAULT_TYPICAL_BYTES = 10_000
+
+# 常见统计与广告域名
+ANALYTICS_AND_AD_DOMAINS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "googlesyndication.com",
+    "doubleclick.net",
+    "hm.baidu.com",
+    "cpro.baidu.com",
+    "pos.baidu.com",
+    "cnzz.com",
+    "umeng.com",
+    "growingio.com",
+    "sensorsdata.cn",
+    "tanx.com",
+    "mmstat.com",
+    "gdt.qq.com",
+    "pingjs.qq.com",
+)
+
+
+@dataclass
+class BlockStats:
+    """一次爬取过程中被拦截的请求统计"""
+    blocked_requests: int = 0
+    blocked_bytes: int = 0  # 估算值，见 _TYPICAL_BYTES
+    allowed_requests: int = 0
+    by_type: Dict[str, int] = field(default_factory=dict)
+
+    def record_blocked(self, resource_type: str):
+        self.blocked_requests += 1
+        self.blocked_bytes += _TYPICAL_BYTES.get(resource_type, _DEFAULT_TYPICAL_BYTES)
+        self.by_type[resource_type] = self.by_type.get(resource_type, 0) + 1
+
+    def summary(self) -> str:
+        return (f"拦截请求 {self.blocked_requests} 个 (约 {self.blocked_bytes / 1024:.0f} KB), "
+                f"放行 {self.allowed_requests} 个, 按类型: {self.by_type}")
+
+
+class ResourceBlockPolicy:
+    """
+    Playwright 请求拦截策略：按资源类型和域名屏蔽与解析无关的请求
+    （图片、字体、媒体、统计和广告脚本），减少带宽和页面加载时间。
+    """
+
+    def __init__(self,
+                 blocked_resource_types: Iterable[str] = ("image", "media", "font"),
+                 blocked_domains: Iterable[str] = ANALYTICS_AND_AD_DOMAINS,
+                 enabled: bool = True):
+        """
+        :param blocked_resource_types: 需要屏蔽的 Playwright 资源类型
+        :param blocked_domains: 需要屏蔽的域名（包含其子域名）
+        :param enabled: 为 False 时不拦截任何请求
+        """
+        self.blocked_resource_types = frozenset(blocked_resource_types)
+        self.blocked_domains = tuple(blocked_domains)
+        self.enabled = enabled
+        # 进程内累计统计
+        self.total_stats = BlockStats()
+
+    def should_block(self, url: str, resource_type: str) -> bool:
+        if resource_type in self.blocked_resource_types:
+            return True
+        host = urlparse(url).hostname or ""
+        return any(host == domain or host.endswith("." + domain) for domain in self.blocked_domains)
+
+    async def apply(self, page: Page, stats: Optional[BlockStats] = None):
+        """
+        在页面上注册拦截规则。
+
+        :param page: 需要拦截请求的页面
+        :param stats: 本次爬取的统计对象，为 None 时只计入累计统计
+        """
+        if not self.enabled:
+            return
+
+        async def handle(route: Route):
+            request = route.request
+            if self.should_block(request.url, request.resource_type):
+                self.total_stats.record_blocked(request.resource_type)
+                if stats is not None:
+                    stats.record_blocked(request.resource_type)
+                await route.abort()
+            else:
+                self.total_stats.allowed_requests += 1
+                if stats is not None:
+                    stats.allowed_requests += 1
+                await route.continue_()
+
+        await page.route("**/*", handle)
+
+
+# 各数据源的拦截策略，通过 settings 中的 RECIPE_BLOCK_* 配置
+SOURCE_POLICIES: Dict[str, ResourceBlockPolicy] = {
+    "douguo": ResourceBlockPolicy(blocked_resource_types=settings.BLOCK_DOUGUO_RESOURCE_TYPES,
+                                  blocked_domains=ANALYTICS_AND_AD_DOMAINS + settings.BLOCK_DOUGUO_EXTRA_DOMAINS,
+                                  enabled=settings.BLOCK_DOUGUO_ENABLED),
+    "xiachufang": ResourceBlockPolicy(blocked_resource_types=settings.BLOCK_XIACHUFANG_RESOURCE_TYPES,
+                                      blocked_domains=ANALYTICS_AND_AD_DOMAINS + settings.BLOCK_XIACHUFANG_EXTRA_DOMAINS,
+                                      enabled=settings.BLOCK_XIACHUFANG_ENABLED),
+}
+
+
+def get_resource_policy(source: str) -> ResourceBlockPolicy:
+    """获取指定数据源的拦截策略，未配置的数据源不拦截"""
+    return SOURCE_POLICIES.get(source) or ResourceBlockPolicy(enabled=False)
@@ -1,10 +1,14 @@
+import logging
 from typing import List
 
 from langchain_core.tools import tool
 from bs4 import BeautifulSoup
-from playwright.async_api import async_playwright
 # 推荐使用 playwright 来处理动态加载的网站
-from playwright.sync_api import sync_playwright
+from tools.browser_pool import get_browser_pool
+from tools.resource_policy import BlockStats, get_resource_policy
+from utils import settings
+
+logger = logging.getLogger(__name__)
 
 
 @tool
@@ -15,15 +19,19 @@ async def scrape_xiachufang_recipe(search_keywords: List[str], search_limit: int
 
     # 1. 将关键词列表用空格连接成一个字符串
     search_query = " ".join(search_keywords)
-    print(f"--- 工具: 收到关键词 '{search_keywords}', 拼接为 '{search_query}' 进行搜索 ---")
+    logger.info(f"--- 工具: 收到关键词 '{search_keywords}', 拼接为 '{search_query}' 进行搜索 ---")
 
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=False)
-        page = await browser.new_page()
-        await page.goto("https://www.xiachufang.com/")
+    pool = await get_browser_pool()
+    # 从共享浏览器池借用页面，避免每次调用都冷启动浏览器
+    policy = get_resource_policy("xiachufang")
+    block_stats = BlockStats()
+    async with pool.page() as page:
+        await policy.apply(page, block_stats)
+        await page.goto("https://www.xiachufang.com/", wait_until="domcontentloaded")
         await page.fill('input[placeholder="搜索菜谱、食材"]', search_query)
         await page.keyboard.press("Enter")
-        await page.wait_for_load_state("networkidle")
+        # 广告较多的页面 networkidle 很难稳定，改为等待搜索结果链接出现
+        await page.wait_for_selector('.recipe a[href*="/recipe/"]', timeout=settings.PAGE_READY_TIMEOUT_MS)
         # 扩大搜索范围，获取前 search_limit 个链接
         all_urls = await page.locator(f'.recipe a[href*="/recipe/"]').evaluate_all(
             f'elements => elements.slice(0, {search_limit}).map(el => el.href)'
@@ -31,18 +39,18 @@ async def scrape_xiachufang_recipe(search_keywords: List[str], search_limit: int
         unique_recipe_urls = list(dict.fromkeys(all_urls))[:search_limit]
         recipes_content = []
         for url in unique_recipe_urls:
-            await page.goto(url)
-            await page.wait_for_load_state("networkidle")
-            print(f"正在爬取食谱: {url}")
+            await page.goto(url, wait_until="domcontentloaded")
+            await page.wait_for_selector('div.block.recipe-show', timeout=settings.PAGE_READY_TIMEOUT_MS)
+            logger.info(f"正在爬取食谱: {url}")
             title = await page.locator('h1.page-title').inner_text()
             content = await page.locator('div.block.recipe-show').inner_html()
-            print(content)
+            logger.debug("%s", content)
             recipes_content.append({
                 'url': url,
                 'content': content,
                 'title': title
             })
-        await browser.close()
+    logger.info(f"--- 请求拦截统计: {block_stats.summary()} ---")
     return recipes_content
 
 
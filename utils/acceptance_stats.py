@@ -0,0 +1,97 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+from utils import settings
+from utils.search_cache import normalize_keywords
+
+
+class AcceptanceStats:
+    """
+    按搜索关键词统计候选菜谱的通过率（通过 LLM 筛选的数量 / 参与筛选的候选数），
+    用来决定下一次同样的关键词需要抓取多少个候选。
+    每次记录前先把历史计数乘以衰减系数，使统计跟随网站内容的变化。
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS acceptance_stats (
+            keywords TEXT PRIMARY KEY,
+            candidates REAL NOT NULL,
+            accepted REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path: str = settings.ACCEPTANCE_STATS_PATH, decay: float = settings.ACCEPTANCE_STATS_DECAY):
+        """
+        :param path: SQLite 数据库文件路径，传入 ":memory:" 时只保存在内存中
+        :param decay: 每次记录前历史计数的衰减系数，取值 (0, 1]
+        """
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.decay = decay
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(self._SCHEMA)
+        self._lock = threading.Lock()
+
+    def record(self, search_keywords: List[str], candidates: int, accepted: int):
+        """记录一次筛选的结果：candidates 个候选中有 accepted 个通过"""
+        if candidates <= 0:
+            return
+        key = normalize_keywords(search_keywords)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO acceptance_stats (keywords, candidates, accepted, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(keywords) DO UPDATE SET "
+                "candidates = candidates * ? + excluded.candidates, "
+                "accepted = accepted * ? + excluded.accepted, "
+                "updated_at = excluded.updated_at",
+                (key, candidates, accepted, time.time(), self.decay, self.decay),
+            )
+            self._conn.commit()
+
+    def acceptance_rate(self, search_keywords: List[str],
+                        min_samples: int = settings.ACCEPTANCE_MIN_SAMPLES) -> Optional[float]:
+        """历史通过率；样本数不足 min_samples 时返回 None"""
+        with self._lock:
+            row = self._conn.execute("SELECT candidates, accepted FROM acceptance_stats WHERE keywords = ?",
+                                     (normalize_keywords(search_keywords),)).fetchone()
+        if row is None or row[0] < min_samples:
+            return None
+        return row[1] / row[0]
+
+    def fetch_budget(self, search_keywords: List[str], recipe_count: int) -> int:
+        """
+        根据历史通过率估算首轮需要抓取的候选数；没有足够历史时使用 FETCH_DEFAULT_FACTOR 倍。
+
+        :param search_keywords: 搜索关键词
+        :param recipe_count: 需要的菜谱数量
+        """
+        rate = self.acceptance_rate(search_keywords)
+        if rate is None:
+            return recipe_count * settings.FETCH_DEFAULT_FACTOR
+        return budget_for(recipe_count, rate)
+
+
+def budget_for(recipe_count: int, rate: float) -> int:
+    """按通过率估算凑够 recipe_count 个菜谱需要的候选数，留出 FETCH_SAFETY_MARGIN 倍余量并限制在上下限之内"""
+    rate = max(rate, settings.ACCEPTANCE_MIN_RATE)
+    budget = math.ceil(recipe_count * settings.FETCH_SAFETY_MARGIN / rate)
+    return min(max(budget, math.ceil(recipe_count * settings.FETCH_MIN_FACTOR)),
+               recipe_count * settings.FETCH_MAX_FACTOR)
+
+
+_stats: Optional[AcceptanceStats] = None
+_stats_lock = threading.Lock()
+
+
+def get_acceptance_stats() -> AcceptanceStats:
+    """获取进程级共享的通过率统计"""
+    global _stats
+    with _stats_lock:
+        if _stats is None:
+            _stats = AcceptanceStats()
+        return _stats
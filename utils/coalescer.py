@@ -0,0 +1,148 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple, TypeVar
+
+from langgraph.config import get_stream_writer
+
+from utils.telemetry import get_telemetry
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+StreamWriter = Callable[[Any], None]
+
+
+class _Flight:
+    """一次正在进行的共享执行：记录已发出的流事件，并转发给所有等待者"""
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.waiters = 0
+        self.events: List[Any] = []
+        self.subscribers: List[StreamWriter] = []
+
+    def emit(self, event: Any):
+        self.events.append(event)
+        for writer in list(self.subscribers):
+            try:
+                writer(event)
+            except Exception as e:
+                # 某个等待者的流已经关闭，不影响其他等待者
+                logger.debug(f"  > 转发流事件失败: {e}")
+
+
+_current_flight: contextvars.ContextVar[Optional[_Flight]] = contextvars.ContextVar("coalesced_flight", default=None)
+
+
+def _discard(_event: Any):
+    pass
+
+
+def progress_writer() -> StreamWriter:
+    """
+    获取节点写 custom 流事件的函数。
+    在合并执行中时写给所有等待者；在图的运行中时写给当前运行；直接调用节点（如基准测试）时丢弃。
+    """
+    flight = _current_flight.get()
+    if flight is not None:
+        return flight.emit
+    try:
+        return get_stream_writer()
+    except RuntimeError:
+        return _discard
+
+
+class RequestCoalescer:
+    """
+    合并相同的进行中请求：同一个 key 同时只执行一次，后到的请求等待并共享这次执行的结果。
+
+    - 共享执行在独立的任务和上下文中运行，不挂在任何一个请求的图运行上；
+    - 每个等待者先收到已经发出的流事件，之后实时收到新的事件，各自的进度流互不影响；
+    - 某个等待者被取消时只退出等待，最后一个等待者也离开时才取消共享执行。
+    同一事件循环内的请求才会合并，不同事件循环（线程）的请求各自执行。
+    """
+
+    def __init__(self):
+        self._flights: Dict[Tuple[asyncio.AbstractEventLoop, str, Hashable], _Flight] = {}
+        self._lock = threading.Lock()
+        self.stats = {"leaders": 0, "followers": 0}
+
+    async def run(self, name: str, key: Hashable, factory: Callable[[], Awaitable[T]],
+                  writer: Optional[StreamWriter] = None) -> T:
+        """
+        执行或加入 (name, key) 对应的共享执行，返回它的结果（所有等待者拿到的是同一个对象，不要原地修改）。
+
+        :param name: 操作名，用于区分不同的操作以及指标和追踪
+        :param key: 合并的依据，相等的 key 视为同一个请求
+        :param factory: 没有进行中的执行时调用，返回要共享执行的协程
+        :param writer: 接收共享执行发出的流事件，为 None 时不接收
+        """
+        loop = asyncio.get_running_loop()
+        flight_key = (loop, name, key)
+        subscriber = None
+        if writer is not None:
+            # LangGraph 的流写入函数依赖调用方的运行上下文，转发事件时在等待者自己的上下文中调用
+            subscriber = functools.partial(contextvars.copy_context().run, writer)
+        with self._lock:
+            flight = self._flights.get(flight_key)
+            role = "follower" if flight is not None else "leader"
+            if flight is None:
+                flight = self._flights[flight_key] = _Flight()
+                # 在空白上下文中运行，不继承发起者的图运行、回调和追踪上下文；
+                # 任务创建时复制当前上下文，因此在该上下文中创建（不用 3.11 才有的 context 参数）
+                context = contextvars.Context()
+                context.run(_current_flight.set, flight)
+                flight.task = context.run(loop.create_task, factory())
+                flight.task.add_done_callback(lambda _task: self._forget(flight_key, flight))
+            self.stats[f"{role}s"] += 1
+            flight.waiters += 1
+            if subscriber is not None:
+                for event in flight.events:
+                    subscriber(event)
+                flight.subscribers.append(subscriber)
+
+        telemetry = get_telemetry()
+        telemetry.inc("recipe_coalesced_requests_total", 1, (("name", name), ("role", role)))
+        if role == "follower":
+            logger.info(f"  > 合并到进行中的 {name}（共 {flight.waiters} 个请求等待）")
+        cancelled = False
+        try:
+            with telemetry.span("coalesce", name, role=role):
+                return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            with self._lock:
+                flight.waiters -= 1
+                if subscriber is not None:
+                    flight.subscribers.remove(subscriber)
+                abandoned = cancelled and flight.waiters == 0 and not flight.task.done()
+            if abandoned:
+                logger.info(f"  > {name} 的所有请求都已取消，停止共享执行")
+                flight.task.cancel()
+
+    def _forget(self, flight_key: Tuple[asyncio.AbstractEventLoop, str, Hashable], flight: _Flight):
+        with self._lock:
+            if self._flights.get(flight_key) is flight:
+                del self._flights[flight_key]
+        # 取出异常，以免所有等待者都已离开时事件循环报告 "exception was never retrieved"
+        if not flight.task.cancelled() and flight.task.exception() is not None:
+            logger.debug(f"  > {flight_key[1]} 的共享执行失败: {flight.task.exception()}")
+
+
+_coalescer: Optional[RequestCoalescer] = None
+_coalescer_lock = threading.Lock()
+
+
+def get_request_coalescer() -> RequestCoalescer:
+    """获取进程级共享的请求合并器"""
+    global _coalescer
+    if _coalescer is None:
+        with _coalescer_lock:
+            if _coalescer is None:
+                _coalescer = RequestCoalescer()
+    return _coalescer
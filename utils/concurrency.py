@@ -0,0 +1,189 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, List, Optional, Tuple
+
+from utils import settings
+
+
+class ProcessWideLimiter:
+    """
+    进程级的并发上限，带优先级。
+    asyncio.Semaphore 绑定单个事件循环，而 Streamlit 等场景下不同会话运行在不同的事件循环/线程中，
+    这里用线程锁管理计数，并通过 call_soon_threadsafe 唤醒各自事件循环中的等待者；
+    同步代码（在线程池中运行的图节点）用 acquire_blocking 阻塞等待。
+    名额空出时先放行 priority 数值小的等待者，同一优先级内先到先得。
+    """
+
+    def __init__(self, limit: int):
+        self._limit = max(1, limit)
+        self._active = 0
+        self._lock = threading.Lock()
+        # 堆中的元素为 (priority, 序号, 事件循环, Future)；同步等待者的事件循环为 None，等待对象为 threading.Event
+        self._waiters: List[Tuple[int, int, Optional[asyncio.AbstractEventLoop], Any]] = []
+        self._sequence = itertools.count()
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def set_limit(self, limit: int):
+        """调整并发上限；调大时立即放行等待者，调小时在已有任务释放后逐步生效"""
+        with self._lock:
+            self._limit = max(1, limit)
+            grants = []
+            while self._waiters and self._active < self._limit:
+                self._active += 1
+                grants.append(heapq.heappop(self._waiters))
+        for waiter in grants:
+            self._hand_over(waiter)
+
+    async def acquire(self, priority: int = 0):
+        """
+        :param priority: 优先级，数值越小越先获得名额
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._active < self._limit and not self._waiters:
+                self._active += 1
+                return
+            future = loop.create_future()
+            waiter = (priority, next(self._sequence), loop, future)
+            heapq.heappush(self._waiters, waiter)
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    heapq.heapify(self._waiters)
+                    raise
+            # 已经分到名额但调用方被取消，把名额交还
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def acquire_blocking(self, priority: int = 0):
+        """在没有事件循环的线程中阻塞等待名额"""
+        with self._lock:
+            if self._active < self._limit and not self._waiters:
+                self._active += 1
+                return
+            event = threading.Event()
+            heapq.heappush(self._waiters, (priority, next(self._sequence), None, event))
+        event.wait()
+
+    def _hand_over(self, waiter: Tuple[int, int, Optional[asyncio.AbstractEventLoop], Any]):
+        _, _, loop, future = waiter
+        if loop is None:
+            future.set()
+        else:
+            loop.call_soon_threadsafe(self._grant, future)
+
+    def _grant(self, future: asyncio.Future):
+        if future.done():
+            # 等待者已被取消，把名额转交给下一个
+            self.release()
+        else:
+            future.set_result(None)
+
+    def release(self):
+        with self._lock:
+            if self._waiters and self._active <= self._limit:
+                # 名额直接转交给下一个等待者，active 计数不变
+                waiter = heapq.heappop(self._waiters)
+            else:
+                self._active -= 1
+                return
+        self._hand_over(waiter)
+
+    @asynccontextmanager
+    async def slot(self, priority: int = 0):
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class AdmissionRejected(Exception):
+    """请求未被接纳：准入队列已满（queue_full）或排队超时（queue_timeout）"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class AdmissionController:
+    """
+    有界的准入队列：最多 max_active 个请求同时运行，另外最多 max_queued 个请求排队等待。
+    队列已满时立即拒绝，排队超过 queue_timeout 秒同样拒绝，由调用方返回 429/503 让客户端稍后重试，
+    避免请求无限堆积把浏览器池和 LLM 并发名额拖垮。
+    """
+
+    def __init__(self, max_active: int, max_queued: int, queue_timeout: float):
+        """
+        :param max_active: 同时运行的请求上限
+        :param max_queued: 排队等待的请求上限，0 表示不排队
+        :param queue_timeout: 排队等待的最长时间（秒）
+        """
+        self._limiter = ProcessWideLimiter(max_active)
+        self.max_queued = max(0, max_queued)
+        self.queue_timeout = queue_timeout
+
+    @property
+    def limit(self) -> int:
+        return self._limiter.limit
+
+    @property
+    def active(self) -> int:
+        return self._limiter.active
+
+    @property
+    def queued(self) -> int:
+        return self._limiter.waiting
+
+    async def acquire(self) -> float:
+        """
+        获取运行名额，返回排队等待的秒数。
+
+        :raises AdmissionRejected: 队列已满或排队超时
+        """
+        if self._limiter.active >= self._limiter.limit and self._limiter.waiting >= self.max_queued:
+            raise AdmissionRejected("queue_full")
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._limiter.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise AdmissionRejected("queue_timeout") from None
+        return time.perf_counter() - start
+
+    def release(self):
+        self._limiter.release()
+
+
+_llm_limiter: Optional[ProcessWideLimiter] = None
+_llm_limiter_lock = threading.Lock()
+
+
+def get_llm_limiter() -> ProcessWideLimiter:
+    """
+    获取进程级共享的 LLM 并发上限，所有会话的LLM调用共用，避免超出 DashScope 的限流。
+    LLM 调用管理层（utils/llm_gateway.py）在每次调用前按链的优先级获取名额，并按延迟和错误自适应地调整上限。
+    """
+    global _llm_limiter
+    with _llm_limiter_lock:
+        if _llm_limiter is None:
+            _llm_limiter = ProcessWideLimiter(settings.LLM_MAX_CONCURRENCY)
+        return _llm_limiter
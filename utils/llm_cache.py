@@ -0,0 +1,95 @@
+import hashlib
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Optional, Sequence
+
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+from langchain_core.outputs import Generation
+
+from utils import settings
+from utils.cache import LRUTTLCache, SQLiteTTLCache
+from utils.telemetry import get_telemetry
+
+
+class _SharedBackend:
+    """所有链共用的两级存储：内存 LRU + SQLite，键中带有链名以区分不同的 TTL"""
+
+    def __init__(self):
+        ttl = max(settings.LLM_CACHE_TTLS.values(), default=settings.LLM_CACHE_DEFAULT_TTL)
+        self.memory = LRUTTLCache(settings.LLM_CACHE_MAX_ENTRIES, ttl)
+        self.disk = SQLiteTTLCache(settings.LLM_CACHE_DISK_PATH, settings.LLM_CACHE_MAX_ENTRIES * 10, ttl,
+                                   table="llm_responses") if settings.LLM_CACHE_DISK_PATH else None
+        self.stats: Dict[str, Dict[str, int]] = defaultdict(lambda: {"hits": 0, "disk_hits": 0, "misses": 0})
+        self.lock = threading.Lock()
+
+
+_backend: Optional[_SharedBackend] = None
+
+
+def _get_backend() -> _SharedBackend:
+    global _backend
+    if _backend is None:
+        _backend = _SharedBackend()
+    return _backend
+
+
+class ChainLLMCache(BaseCache):
+    """
+    按链划分的 LLM 响应缓存，挂在 ChatOpenAI 的 cache 参数上。
+    以渲染后的完整提示词和模型参数（llm_string，包含模型名）做精确匹配，
+    每条链有自己的 TTL 和命中统计，存储层在进程内共享。
+    """
+
+    def __init__(self, chain_name: str, ttl_seconds: Optional[float] = None):
+        """
+        :param chain_name: 链名，例如 "parse_input"、"filter"、"parse_recipes"
+        :param ttl_seconds: 该链缓存的有效期，为 None 时从 settings.LLM_CACHE_TTLS 读取
+        """
+        self.chain_name = chain_name
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else \
+            settings.LLM_CACHE_TTLS.get(chain_name, settings.LLM_CACHE_DEFAULT_TTL)
+        self._backend = _get_backend()
+
+    def _key(self, prompt: str, llm_string: str) -> str:
+        digest = hashlib.sha256(f"{llm_string}\x1f{prompt}".encode("utf-8")).hexdigest()
+        return f"{self.chain_name}:{digest}"
+
+    def _count(self, field: str):
+        with self._backend.lock:
+            self._backend.stats[self.chain_name][field] += 1
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Generation]]:
+        key = self._key(prompt, llm_string)
+        serialized = self._backend.memory.get(key, ttl_seconds=self.ttl_seconds)
+        if serialized is None and self._backend.disk is not None:
+            item = self._backend.disk.get_with_time(key, ttl_seconds=self.ttl_seconds)
+            if item is not None:
+                serialized, stored_at = item
+                self._backend.memory.set(key, serialized, stored_at=stored_at)
+                self._count("disk_hits")
+        if serialized is None:
+            self._count("misses")
+            get_telemetry().inc("recipe_llm_cache_lookups_total", 1, (("chain", self.chain_name), ("result", "miss")))
+            return None
+        self._count("hits")
+        get_telemetry().inc("recipe_llm_cache_lookups_total", 1, (("chain", self.chain_name), ("result", "hit")))
+        return [loads(generation) for generation in serialized]
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]) -> None:
+        key = self._key(prompt, llm_string)
+        serialized = [dumps(generation) for generation in return_val]
+        self._backend.memory.set(key, serialized)
+        if self._backend.disk is not None:
+            self._backend.disk.set(key, serialized)
+
+    def clear(self, **kwargs: Any) -> None:
+        self._backend.memory.clear()
+        if self._backend.disk is not None:
+            self._backend.disk.clear()
+
+
+def get_llm_cache_stats() -> Dict[str, Dict[str, int]]:
+    """各链的缓存命中统计：hits（含磁盘层命中）、disk_hits、misses"""
+    with _get_backend().lock:
+        return {chain: dict(counts) for chain, counts in _get_backend().stats.items()}
@@ -0,0 +1,399 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional
+
+import openai
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+
+from utils import settings
+from utils.concurrency import ProcessWideLimiter, get_llm_limiter
+from utils.telemetry import get_telemetry
+
+logger = logging.getLogger(__name__)
+
+ESTIMATED_COMPLETION_TOKENS = 300  # 调用前预留的输出 token 数，调用结束后按实际用量多退少补
+OVERLOAD_REASONS = ("rate_limited", "timeout", "server_error")  # 说明服务端过载、需要降低并发的错误
+
+
+class TokenBucket:
+    """
+    线程安全的令牌桶：每秒补充 rate 个令牌，最多积攒 capacity 个。
+    预留时直接扣减，余额可以透支，调用方按返回的秒数等待到余额回正，先预留的先放行。
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        :param rate: 每秒补充的令牌数，<= 0 表示不限
+        :param capacity: 桶容量，即允许的突发量
+        """
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """预留 amount 个令牌，返回需要等待的秒数"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            return max(0.0, -self._tokens / self.rate)
+
+    def adjust(self, amount: float):
+        """按实际用量修正之前的预留，amount 为正时补扣，为负时退还"""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens - amount)
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD 方式调整 LLM 并发上限：名额用满时每次成功调用让上限增加 1/上限（约每轮加 1）；
+    遇到限流、超时、5xx，或某条链的延迟超过其基线的 tolerance 倍时，上限乘以 decrease_factor。
+    只有上一次下调之后才发起的调用能再次触发下调，同一波拥塞的多个信号只下调一次。
+    """
+
+    def __init__(self, limiter: ProcessWideLimiter, min_limit: int, max_limit: int, tolerance: float,
+                 decrease_factor: float = 0.7):
+        """
+        :param limiter: 要调整的并发上限
+        :param min_limit: 上限的下界
+        :param max_limit: 上限的上界
+        :param tolerance: 延迟超过基线的多少倍视为拥塞
+        :param decrease_factor: 下调时的乘数
+        """
+        self.limiter = limiter
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.tolerance = tolerance
+        self.decrease_factor = decrease_factor
+        self._limit = float(limiter.limit)
+        self._baselines: Dict[str, float] = {}  # 各条链的延迟基线：取最小值，并缓慢向新的观测值上浮
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    def on_success(self, chain_name: str, started_at: float, latency: float):
+        if not settings.LLM_ADAPTIVE_CONCURRENCY:
+            return
+        with self._lock:
+            baseline = self._baselines.get(chain_name)
+            self._baselines[chain_name] = latency if baseline is None or latency < baseline \
+                else baseline + 0.05 * (latency - baseline)
+            if baseline is not None and latency > baseline * self.tolerance:
+                self._decrease(started_at, f"{chain_name} 延迟 {latency:.2f}s 超过基线 {baseline:.2f}s 的 {self.tolerance} 倍")
+            elif self.limiter.waiting or self.limiter.active >= self.limiter.limit:
+                # 名额没用满时增加上限没有意义，只在有排队或满载时增加
+                self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+            self._apply()
+
+    def on_overload(self, started_at: float, reason: str):
+        if not settings.LLM_ADAPTIVE_CONCURRENCY:
+            return
+        with self._lock:
+            self._decrease(started_at, reason)
+            self._apply()
+
+    def _decrease(self, started_at: float, reason: str):
+        if started_at < self._last_decrease:
+            return
+        self._limit = max(self.min_limit, self._limit * self.decrease_factor)
+        self._last_decrease = time.monotonic()
+        logger.info(f"  > LLM并发上限下调至 {int(self._limit)}（{reason}）")
+
+    def _apply(self):
+        limit = int(self._limit)
+        if limit != self.limiter.limit:
+            self.limiter.set_limit(limit)
+
+
+def _classify_error(error: Exception) -> Optional[str]:
+    """返回可重试错误的原因，不可重试（如参数错误、鉴权失败）时返回 None"""
+    if isinstance(error, openai.RateLimitError):
+        return "rate_limited"
+    if isinstance(error, openai.APITimeoutError):
+        return "timeout"
+    if isinstance(error, openai.APIConnectionError):
+        return "connection"
+    if isinstance(error, openai.APIStatusError) and error.status_code >= 500:
+        return "server_error"
+    return None
+
+
+def _retry_after(error: Exception) -> float:
+    """服务端通过 Retry-After 头建议的等待秒数，没有时返回 0"""
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after") or 0) if response is not None else 0.0
+    except ValueError:
+        return 0.0
+
+
+def _usage_tokens(result: Any) -> Optional[int]:
+    """从调用结果（ChatResult 或流式的最后一个 ChatGenerationChunk）中取出实际消耗的 token 数"""
+    if isinstance(result, ChatResult):
+        usage = (result.llm_output or {}).get("token_usage") or {}
+        if usage.get("total_tokens"):
+            return usage["total_tokens"]
+        messages = [generation.message for generation in result.generations]
+    else:
+        messages = [result.message]
+    totals = [(getattr(message, "usage_metadata", None) or {}).get("total_tokens") for message in messages]
+    return sum(totals) if any(totals) else None
+
+
+def estimate_tokens(messages: List[BaseMessage]) -> int:
+    """按字符数粗略估算一次调用的 token 数（中文约一字一个 token），用于调用前预留配额"""
+    return sum(len(str(message.content)) for message in messages) + ESTIMATED_COMPLETION_TOKENS
+
+
+class LLMGateway:
+    """
+    所有 LLM 调用的出口：
+    - 按链的优先级排队获取进程级并发名额（面向用户的润色优先于后台评分），上限由 AdaptiveConcurrency 调整；
+    - 通过每秒请求数和每分钟 token 数两个令牌桶限流；
+    - 限流、超时、连接错误和 5xx 时释放名额，带抖动地指数退避后重试，优先遵守服务端的 Retry-After；
+    - 在 telemetry 中发布并发上限、进行中和排队的调用数，以及各链的重试次数。
+    """
+
+    def __init__(self, limiter: ProcessWideLimiter,
+                 requests_per_second: float = settings.LLM_REQUESTS_PER_SECOND,
+                 tokens_per_minute: int = settings.LLM_TOKENS_PER_MINUTE,
+                 max_retries: int = settings.LLM_MAX_RETRIES,
+                 retry_base_delay: float = settings.LLM_RETRY_BASE_DELAY,
+                 retry_max_delay: float = settings.LLM_RETRY_MAX_DELAY):
+        """
+        :param limiter: 进程级 LLM 并发上限
+        :param requests_per_second: 每秒发起的请求数上限，<= 0 表示不限
+        :param tokens_per_minute: 每分钟消耗的 token 数上限，<= 0 表示不限
+        :param max_retries: 单次调用最多重试的次数
+        :param retry_base_delay: 第一次重试前退避时间的上限（秒），之后每次翻倍
+        :param retry_max_delay: 退避时间的最大值（秒）
+        """
+        self.limiter = limiter
+        self.request_bucket = TokenBucket(requests_per_second, requests_per_second)
+        self.token_bucket = TokenBucket(tokens_per_minute / 60, tokens_per_minute)
+        self.concurrency = AdaptiveConcurrency(limiter, settings.LLM_MIN_CONCURRENCY,
+                                               settings.LLM_ADAPTIVE_MAX_CONCURRENCY, settings.LLM_LATENCY_TOLERANCE)
+        self.max_retries = max(0, max_retries)
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+
+    def snapshot(self) -> Dict[str, int]:
+        return {"limit": self.limiter.limit, "active": self.limiter.active, "waiting": self.limiter.waiting}
+
+    def _publish(self):
+        telemetry = get_telemetry()
+        telemetry.set_gauge("recipe_llm_concurrency_limit", self.limiter.limit)
+        telemetry.set_gauge("recipe_llm_inflight_calls", self.limiter.active)
+        telemetry.set_gauge("recipe_llm_queued_calls", self.limiter.waiting)
+
+    @staticmethod
+    def priority(chain_name: str) -> int:
+        return settings.LLM_CHAIN_PRIORITIES.get(chain_name, settings.LLM_DEFAULT_PRIORITY)
+
+    def _throttle_delay(self, estimated_tokens: int) -> float:
+        return max(self.request_bucket.reserve(1), self.token_bucket.reserve(estimated_tokens))
+
+    def _settle(self, estimated_tokens: int, result: Any):
+        actual = _usage_tokens(result)
+        if actual is not None:
+            self.token_bucket.adjust(actual - estimated_tokens)
+
+    def _on_failure(self, chain_name: str, attempt: int, started_at: float, error: Exception) -> float:
+        """
+        处理一次失败的调用，返回重试前的退避秒数。
+
+        :raises Exception: 错误不可重试或重试次数已用完时重新抛出原错误
+        """
+        reason = _classify_error(error)
+        if reason in OVERLOAD_REASONS:
+            self.concurrency.on_overload(started_at, f"{chain_name} {reason}")
+        if reason is None or attempt >= self.max_retries:
+            raise error
+        delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+        delay = max(delay, _retry_after(error))
+        get_telemetry().inc("recipe_llm_retries_total", 1, (("chain", chain_name), ("reason", reason)))
+        logger.warning(f"  !! LLM调用失败（{chain_name}, {reason}），{delay:.1f}s 后第 {attempt + 1} 次重试: {error}")
+        return delay
+
+    async def acall(self, chain_name: str, estimated_tokens: int, call: Callable[[], Awaitable[ChatResult]]):
+        """在事件循环中执行一次非流式调用"""
+        priority = self.priority(chain_name)
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire(priority)
+            self._publish()
+            try:
+                delay = self._throttle_delay(estimated_tokens)
+                if delay:
+                    await asyncio.sleep(delay)
+                started_at = time.monotonic()
+                try:
+                    result = await call()
+                except Exception as e:
+                    backoff = self._on_failure(chain_name, attempt, started_at, e)
+                else:
+                    self.concurrency.on_success(chain_name, started_at, time.monotonic() - started_at)
+                    self._settle(estimated_tokens, result)
+                    return result
+            finally:
+                self.limiter.release()
+                self._publish()
+            await asyncio.sleep(backoff)
+
+    def call(self, chain_name: str, estimated_tokens: int, call: Callable[[], ChatResult]):
+        """在没有事件循环的线程中（如同步的图节点）执行一次非流式调用"""
+        priority = self.priority(chain_name)
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire_blocking(priority)
+            self._publish()
+            try:
+                time.sleep(self._throttle_delay(estimated_tokens))
+                started_at = time.monotonic()
+                try:
+                    result = call()
+                except Exception as e:
+                    backoff = self._on_failure(chain_name, attempt, started_at, e)
+                else:
+                    self.concurrency.on_success(chain_name, started_at, time.monotonic() - started_at)
+                    self._settle(estimated_tokens, result)
+                    return result
+            finally:
+                self.limiter.release()
+                self._publish()
+            time.sleep(backoff)
+
+    async def astream(self, chain_name: str, estimated_tokens: int,
+                      stream: Callable[[], AsyncIterator[ChatGenerationChunk]]) -> AsyncIterator[ChatGenerationChunk]:
+        """
+        执行一次流式调用。只有在还没产出任何片段时失败才会重试，延迟按首个片段的到达时间计算。
+        """
+        priority = self.priority(chain_name)
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire(priority)
+            self._publish()
+            try:
+                delay = self._throttle_delay(estimated_tokens)
+                if delay:
+                    await asyncio.sleep(delay)
+                started_at = time.monotonic()
+                first_chunk_latency, last_chunk = None, None
+                try:
+                    async for chunk in stream():
+                        if first_chunk_latency is None:
+                            first_chunk_latency = time.monotonic() - started_at
+                        last_chunk = chunk
+                        yield chunk
+                except Exception as e:
+                    if first_chunk_latency is not None:
+                        raise
+                    backoff = self._on_failure(chain_name, attempt, started_at, e)
+                else:
+                    self.concurrency.on_success(chain_name, started_at,
+                                                first_chunk_latency or time.monotonic() - started_at)
+                    if last_chunk is not None:
+                        self._settle(estimated_tokens, last_chunk)
+                    return
+            finally:
+                self.limiter.release()
+                self._publish()
+            await asyncio.sleep(backoff)
+
+    def stream(self, chain_name: str, estimated_tokens: int,
+               stream: Callable[[], Iterator[ChatGenerationChunk]]) -> Iterator[ChatGenerationChunk]:
+        """同步版本的 astream"""
+        priority = self.priority(chain_name)
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire_blocking(priority)
+            self._publish()
+            try:
+                time.sleep(self._throttle_delay(estimated_tokens))
+                started_at = time.monotonic()
+                first_chunk_latency, last_chunk = None, None
+                try:
+                    for chunk in stream():
+                        if first_chunk_latency is None:
+                            first_chunk_latency = time.monotonic() - started_at
+                        last_chunk = chunk
+                        yield chunk
+                except Exception as e:
+                    if first_chunk_latency is not None:
+                        raise
+                    backoff = self._on_failure(chain_name, attempt, started_at, e)
+                else:
+                    self.concurrency.on_success(chain_name, started_at,
+                                                first_chunk_latency or time.monotonic() - started_at)
+                    if last_chunk is not None:
+                        self._settle(estimated_tokens, last_chunk)
+                    return
+            finally:
+                self.limiter.release()
+                self._publish()
+            time.sleep(backoff)
+
+
+class ManagedChatModel(BaseChatModel):
+    """
+    经 LLMGateway 调用的聊天模型：包装实际发请求的模型 inner，每次调用都经过优先级排队、限流和重试。
+    响应缓存和回调挂在这一层，命中缓存的调用不占用并发名额和配额。
+    """
+
+    inner: BaseChatModel
+    chain_name: str
+
+    @property
+    def _llm_type(self) -> str:
+        return self.inner._llm_type
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        # 缓存键中包含实际模型的参数（如模型名），换模型后不会命中旧缓存
+        return self.inner._identifying_params
+
+    def _combine_llm_outputs(self, llm_outputs: List[Optional[dict]]) -> dict:
+        return self.inner._combine_llm_outputs(llm_outputs)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        return get_llm_gateway().call(self.chain_name, estimate_tokens(messages), lambda: self.inner._generate(
+            messages, stop=stop, run_manager=run_manager, **kwargs))
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        return await get_llm_gateway().acall(self.chain_name, estimate_tokens(messages), lambda: self.inner._agenerate(
+            messages, stop=stop, run_manager=run_manager, **kwargs))
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        yield from get_llm_gateway().stream(self.chain_name, estimate_tokens(messages), lambda: self.inner._stream(
+            messages, stop=stop, run_manager=run_manager, **kwargs))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        async for chunk in get_llm_gateway().astream(self.chain_name, estimate_tokens(messages),
+                                                     lambda: self.inner._astream(messages, stop=stop,
+                                                                                 run_manager=run_manager, **kwargs)):
+            yield chunk
+
+
+_gateway: Optional[LLMGateway] = None
+_gateway_lock = threading.Lock()
+
+
+def get_llm_gateway() -> LLMGateway:
+    """获取进程级共享的 LLM 调用管理层，与 get_llm_limiter() 共用同一个并发上限"""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = LLMGateway(get_llm_limiter())
+    return _gateway
@@ -1,8 +1,58 @@
 import os
+from functools import lru_cache
+
+from langchain_core.runnables import Runnable
+
 from langchain_openai import ChatOpenAI
 
-llm = ChatOpenAI(
-    api_key=os.getenv("DASHSCOPE_API_KEY"),
-    base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
-    model="qwen-plus"
-)
\ No newline at end of file
+from utils import settings
+from utils.llm_cache import ChainLLMCache
+from utils.llm_gateway import ManagedChatModel
+from utils.telemetry import TelemetryCallbackHandler
+
+
+def _create_llm(**kwargs) -> ChatOpenAI:
+    return ChatOpenAI(
+        api_key=os.getenv("DASHSCOPE_API_KEY"),
+        base_url=settings.LLM_BASE_URL,
+        model=settings.LLM_MODEL,
+        # 重试由 LLMGateway 统一处理，退避期间会让出并发名额
+        max_retries=0,
+        **kwargs
+    )
+
+
+# 实际发请求的模型，所有链共用同一个客户端和连接池
+llm = _create_llm()
+
+
+@lru_cache(maxsize=None)
+def get_llm(chain_name: str) -> ManagedChatModel:
+    """
+    获取指定链使用的 LLM 实例。调用经 LLMGateway 按链的优先级排队、限流并在限流/5xx 时重试；
+    每条链带有自己的响应缓存（精确匹配提示词和模型），各链的缓存有效期见 settings.LLM_CACHE_TTLS；
+    开启追踪时每次调用按链名记录耗时和 token 数。
+
+    :param chain_name: 链名，例如 "parse_input"、"filter"、"output"
+    """
+    kwargs = {}
+    if settings.LLM_CACHE_ENABLED:
+        kwargs["cache"] = ChainLLMCache(chain_name)
+    if settings.TELEMETRY_ENABLED:
+        kwargs["callbacks"] = [TelemetryCallbackHandler(chain_name)]
+    return ManagedChatModel(inner=llm, chain_name=chain_name, **kwargs)
+
+
+@lru_cache(maxsize=None)
+def get_json_llm(chain_name: str) -> Runnable:
+    """
+    获取输出 JSON 的链使用的 LLM：开启 settings.LLM_JSON_MODE 时请求接口的 JSON 模式，
+    保证返回的是一个合法的 JSON 对象（提示词中须包含 "JSON" 字样，各链的格式说明已包含）。
+    是否符合字段定义仍由 RepairingOutputParser 校验和修复。
+
+    :param chain_name: 链名，例如 "parse_input"、"filter"
+    """
+    model = get_llm(chain_name)
+    if settings.LLM_JSON_MODE:
+        return model.bind(response_format={"type": "json_object"})
+    return model
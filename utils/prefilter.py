@@ -0,0 +1,211 @@
+import re
+import unicodedata
+from typing import Dict, List, Optional, Set, Tuple
+
+from state import ScrapedContent
+from utils import settings
+
+# 拒绝原因代码
+REASON_EMPTY_CONTENT = "EMPTY_CONTENT"  # 用料或步骤没有解析出来
+REASON_DUPLICATE_TITLE = "DUPLICATE_TITLE"  # 与前面的候选菜谱标题重复
+REASON_EXCLUDED_INGREDIENT = "EXCLUDED_INGREDIENT"  # 含有用户明确排除的食材
+REASON_LOW_OVERLAP = "LOW_INGREDIENT_OVERLAP"  # 与用户已有食材的重合不足
+REASON_TOO_MANY_STEPS = "TOO_MANY_STEPS"  # 用户要求简单/快手，但步骤过多
+
+# 表示“简单/快手”需求的关键词
+SIMPLE_KEYWORDS = ("简单", "快手", "快速", "省事", "省时", "懒人", "新手", "方便")
+
+# 常见食材
+INGREDIENT_LEXICON = (
+    "面包", "吐司", "面包片", "生菜", "番茄", "西红柿", "鸡蛋", "鸭蛋", "鹌鹑蛋", "土豆", "马铃薯", "红薯", "紫薯", "山药",
+    "芋头", "南瓜", "胡萝卜", "白萝卜", "黄瓜", "冬瓜", "丝瓜", "苦瓜", "西葫芦", "茄子", "青椒", "红椒", "彩椒", "辣椒",
+    "尖椒", "洋葱", "大葱", "小葱", "葱", "姜", "大蒜", "蒜", "蒜苗", "韭菜", "芹菜", "香菜", "菠菜", "白菜", "大白菜",
+    "小白菜", "娃娃菜", "包菜", "卷心菜", "油麦菜", "空心菜", "西兰花", "花菜", "菜花", "豆芽", "绿豆芽", "黄豆芽",
+    "四季豆", "豆角", "荷兰豆", "毛豆", "玉米", "莲藕", "竹笋", "香菇", "蘑菇", "金针菇", "杏鲍菇", "木耳", "银耳",
+    "海带", "紫菜", "豆腐", "豆腐皮", "腐竹", "猪肉", "五花肉", "里脊", "里脊肉", "肉末", "肉馅", "排骨", "猪蹄",
+    "牛肉", "牛腩", "肥牛", "羊肉", "鸡肉", "鸡胸肉", "鸡腿", "鸡翅", "鸡爪", "鸭肉", "火腿", "培根", "香肠", "午餐肉",
+    "鱼", "草鱼", "鲈鱼", "鳕鱼", "三文鱼", "金枪鱼", "虾", "虾仁", "大虾", "螃蟹", "鱿鱼", "蛤蜊", "扇贝",
+    "米饭", "大米", "小米", "糯米", "面粉", "面条", "挂面", "年糕", "燕麦", "牛奶", "酸奶", "奶油", "黄油", "芝士",
+    "奶酪", "芝士片", "苹果", "香蕉", "草莓", "芒果", "柠檬", "橙子", "牛油果", "蓝莓", "花生", "核桃", "红枣",
+)
+
+# 常被要求排除、但不会作为已有食材出现的调料和类别
+_EXCLUDABLE_EXTRAS = (
+    "盐", "糖", "白糖", "冰糖", "醋", "酱油", "生抽", "老抽", "料酒", "酒", "味精", "鸡精", "花椒", "八角", "桂皮",
+    "芝麻", "香油", "辣椒油", "猪油", "肥肉", "内脏", "海鲜", "坚果", "虾皮",
+)
+
+# 名字里含有另一种食材、但不是同一种东西的食材；切分时作为整体，例如“不要葱”不会命中“洋葱”
+_DISTINCT_COMPOUNDS = ("洋葱", "葱头", "蒜苔", "蒜薹", "蒜苗", "姜黄", "醋栗")
+
+# 用户描述排除食材的说法，例如“不要香菜”“不吃辣椒、花椒”“对花生过敏”；只从中取出词表里的食材
+_EXCLUSION_PATTERNS = (
+    re.compile(r"(?:不要|不吃|不加|不放|不含|不能吃|不想要|别放|别加|忌口|去掉|避免)([^，。；,;！!？?]+)"),
+    re.compile(r"对?([^，。；,;！!？?\s]+?)过敏"),
+)
+# “不要放太多盐”“少放糖”之类说的是用量，不是排除
+_QUANTITY_PHRASE = re.compile(r"^(放)?(太多|太|过多|多放|少放|放太多|放多|那么多|很多)")
+
+# 常见的同物异名，匹配时视为同一种食材
+_SYNONYM_GROUPS = (
+    ("番茄", "西红柿"),
+    ("土豆", "马铃薯", "洋芋"),
+    ("鸡蛋", "鸡子", "蛋"),
+    ("面包", "吐司", "土司", "贝果", "面包片"),
+    ("生菜", "莴苣叶", "球生菜"),
+    ("香菜", "芫荽"),
+    ("青椒", "菜椒", "甜椒"),
+    ("红薯", "地瓜", "番薯"),
+    ("花生", "花生米"),
+)
+_SYNONYMS: Dict[str, Set[str]] = {}
+_EXCLUDABLE = set(INGREDIENT_LEXICON) | set(_EXCLUDABLE_EXTRAS) | set(_DISTINCT_COMPOUNDS) | \
+              {name for group in _SYNONYM_GROUPS for name in group}
+_MAX_EXCLUDABLE_LEN = max(len(name) for name in _EXCLUDABLE)
+_SYNONYM_GROUPS_BY_NAME: Dict[str, Tuple[str, ...]] = {}
+for _group in _SYNONYM_GROUPS:
+    for _name in _group:
+        _SYNONYMS[_name] = set(_group)
+        _SYNONYM_GROUPS_BY_NAME[_name] = _group
+
+
+def _normalize(text: str) -> str:
+    return unicodedata.normalize("NFKC", text).strip().lower()
+
+
+def canonical_ingredient(name: str) -> str:
+    """把食材名规范化，同义词统一为同组的第一个名字（例如“西红柿”->“番茄”）"""
+    name = _normalize(name)
+    group = _SYNONYM_GROUPS_BY_NAME.get(name)
+    return group[0] if group else name
+
+
+def ingredient_variants() -> Tuple[Tuple[str, ...], ...]:
+    """常见食材的同物异名组，每组第一个名字为规范名"""
+    return _SYNONYM_GROUPS
+
+
+def _variants(name: str) -> Set[str]:
+    name = _normalize(name)
+    return _SYNONYMS.get(name, set()) | {name}
+
+
+def _mentions(recipe_terms: List[str], wanted: str) -> bool:
+    """recipe_terms 中是否有任一项提到了 wanted（考虑同义词和包含关系，例如“猪五花肉”包含“五花肉”）"""
+    for variant in _variants(wanted):
+        for term in recipe_terms:
+            # 单字的同义词（如“蛋”）只做完全匹配，避免误伤
+            if term == variant or (len(variant) > 1 and variant in term) or (len(term) > 1 and term in variant):
+                return True
+    return False
+
+
+def _lexicon_items(text: str) -> List[str]:
+    """按食材词表做正向最长匹配，取出文本中提到的食材"""
+    items, i = [], 0
+    while i < len(text):
+        for size in range(min(_MAX_EXCLUDABLE_LEN, len(text) - i), 0, -1):
+            if text[i:i + size] in _EXCLUDABLE:
+                items.append(text[i:i + size])
+                i += size
+                break
+        else:
+            i += 1
+    return items
+
+
+def parse_excluded_ingredients(requirements: str) -> List[str]:
+    """从用户的其他要求中提取被排除的食材，只返回词表中的食材；“少放盐”之类的用量要求不算排除"""
+    if not requirements:
+        return []
+    excluded = []
+    for pattern in _EXCLUSION_PATTERNS:
+        for match in pattern.findall(_normalize(requirements)):
+            if _QUANTITY_PHRASE.match(match.strip()):
+                continue
+            for item in _lexicon_items(match):
+                if item not in excluded:
+                    excluded.append(item)
+    return excluded
+
+
+def _contains_excluded(recipe_terms: List[str], excluded: str) -> bool:
+    """
+    recipe_terms 中是否有用料确定含有被排除的食材：用料名与之相同，或按食材词表切分后含有它
+    （“猪五花肉”切出“五花肉”，“洋葱”不会切出“葱”）。只是字面上包含的不算，交给LLM结合用户要求判断。
+    """
+    segmented = [(term, _lexicon_items(term)) for term in recipe_terms]
+    for variant in _variants(excluded):
+        # 同义词中的单字（如“蛋”）只做完全匹配，用户自己说的食材按切分结果匹配
+        one_char_synonym = len(variant) == 1 and variant != _normalize(excluded)
+        for term, items in segmented:
+            if term == variant or (not one_char_synonym and variant in items):
+                return True
+    return False
+
+
+def wants_simple_recipe(requirements: str) -> bool:
+    return any(keyword in (requirements or "") for keyword in SIMPLE_KEYWORDS)
+
+
+def prefilter_recipes(recipes: List[ScrapedContent],
+                      user_ingredients: List[str],
+                      requirements: str,
+                      min_overlap: int = settings.PREFILTER_MIN_OVERLAP,
+                      simple_max_steps: int = settings.PREFILTER_SIMPLE_MAX_STEPS,
+                      seen_titles: Optional[Set[str]] = None
+                      ) -> Tuple[List[Tuple[int, ScrapedContent]], List[Dict[str, str]]]:
+    """
+    在LLM评分之前用确定性规则淘汰明显不合格的候选菜谱。
+
+    :param recipes: 候选菜谱
+    :param user_ingredients: 用户已有的食材
+    :param requirements: 用户的其他要求，从中解析排除的食材和“简单/快手”需求
+    :param min_overlap: 至少需要用到多少种用户已有食材（用户没有提供食材时不检查）
+    :param simple_max_steps: 用户要求简单/快手时允许的最多步骤数
+    :param seen_titles: 已经出现过的标题，流式地分多次调用时传入同一个集合以便跨批去重
+    :return: (通过的 [(原下标, 菜谱)], 被拒绝的 [{'url', 'title', 'reason', 'detail'}])
+    """
+    excluded = parse_excluded_ingredients(requirements)
+    simple = wants_simple_recipe(requirements)
+    required_overlap = min(min_overlap, len(user_ingredients))
+
+    survivors, rejections = [], []
+    seen_titles = set() if seen_titles is None else seen_titles
+
+    def reject(recipe: ScrapedContent, reason: str, detail: str):
+        rejections.append({'url': recipe['url'], 'title': recipe['title'], 'reason': reason, 'detail': detail})
+
+    for index, recipe in enumerate(recipes):
+        ingredient_names = [_normalize(ing['name']) for ing in recipe['ingredients']]
+        title_key = re.sub(r"\s+", "", _normalize(recipe['title']))
+
+        if not recipe['ingredients'] or not recipe['steps']:
+            reject(recipe, REASON_EMPTY_CONTENT,
+                   f"用料 {len(recipe['ingredients'])} 项, 步骤 {len(recipe['steps'])} 步")
+            continue
+        if title_key in seen_titles:
+            reject(recipe, REASON_DUPLICATE_TITLE, recipe['title'])
+            continue
+        seen_titles.add(title_key)
+
+        hit_excluded = [item for item in excluded if _contains_excluded(ingredient_names, item)]
+        if hit_excluded:
+            reject(recipe, REASON_EXCLUDED_INGREDIENT, "、".join(hit_excluded))
+            continue
+
+        if required_overlap > 0:
+            # 标题也算在内，例如“番茄炒蛋”即使用料写的是“西红柿”也能匹配
+            terms = ingredient_names + [title_key]
+            matched = [item for item in user_ingredients if _mentions(terms, item)]
+            if len(matched) < required_overlap:
+                reject(recipe, REASON_LOW_OVERLAP,
+                       f"用到 {len(matched)}/{len(user_ingredients)} 种已有食材, 至少需要 {required_overlap} 种")
+                continue
+
+        if simple and len(recipe['steps']) > simple_max_steps:
+            reject(recipe, REASON_TOO_MANY_STEPS, f"{len(recipe['steps'])} 步 > {simple_max_steps} 步")
+            continue
+
+        survivors.append((index, recipe))
+    return survivors, rejections
@@ -0,0 +1,174 @@
+import hashlib
+import re
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+from state import ScrapedContent
+from utils import settings
+from utils.cache import LRUTTLCache
+from utils.telemetry import get_telemetry
+
+# 整步都是套话或推广内容时丢弃
+_BOILERPLATE_STEP = re.compile(r"^(完成|好了|搞定|开吃|开动|出锅|装盘|成品|成品图|大功告成|就是这么简单|美味上桌)[啦了吧咯喽]?$")
+_PROMOTION = re.compile(r"关注|点赞|收藏|转发|公众号|微信|私信|更多菜谱|欢迎.*(留言|交流)|视频号|小红书|抖音")
+# 步骤序号，如 "1."、"第一步："、"步骤3"
+_STEP_NUMBER = re.compile(r"^(第?\s*[0-9一二三四五六七八九十]+\s*(步\s*[:：.．、]?|[、.．:：)）])|步骤\s*[0-9一二三四五六七八九十]+\s*[:：.．、]?)\s*")
+# 小贴士之类的附加说明，从标记处截掉
+_TIP = re.compile(r"(小贴士|小提示|温馨提示|贴士|tips?)\s*[:：]", re.I)
+_PICTURE_HINT = re.compile(r"[(（]?(如图|见图|看图|图\s*[0-9一二三四五六七八九十]+)[)）]?")
+_REPEATED_PUNCT = re.compile(r"([!！~～。.,，?？])\1+")
+_SENTENCE_END = re.compile(r"[。；;！!？?]")
+_CLAUSE_END = re.compile(r"[，,、]")
+_PARENTHESES = re.compile(r"[(（][^)）]*[)）]")
+# 不影响评分的模糊用量，只保留食材名
+_VAGUE_QUANTITY = {"适量", "少许", "少量", "若干", "一些", "适当", "随意", "按口味", "根据口味", "看个人口味", "可选"}
+_UNITS = (("千克", "kg"), ("公斤", "kg"), ("毫升", "ml"), ("克", "g"), ("汤匙", "勺"), ("大勺", "勺"), ("茶匙", "小勺"))
+
+
+def estimate_text_tokens(text: str) -> int:
+    """按 Qwen 分词器的经验比例估算 token 数：中日韩字符约每字 1 个，其余字符约每 4 个 1 个"""
+    cjk = sum(1 for char in text if "㐀" <= char <= "鿿" or "豈" <= char <= "﫿")
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _clean_text(text: str) -> str:
+    """去掉表情符号和装饰字符、“如图”之类的提示、重复的标点和多余空白"""
+    text = unicodedata.normalize("NFKC", text)
+    text = "".join(char for char in text if unicodedata.category(char) not in ("So", "Sk", "Cs", "Co", "Cf"))
+    text = _PICTURE_HINT.sub("", text)
+    text = _REPEATED_PUNCT.sub(r"\1", text)
+    return " ".join(text.split())
+
+
+def compact_quantity(quantity: str) -> str:
+    """缩短用量：去掉括号内的说明，统一常见单位，模糊用量直接省略"""
+    quantity = _PARENTHESES.sub("", _clean_text(quantity or "")).strip()
+    if not quantity or quantity in _VAGUE_QUANTITY:
+        return ""
+    for unit, short in _UNITS:
+        quantity = quantity.replace(unit, short)
+    return quantity[:settings.FILTER_QUANTITY_MAX_CHARS]
+
+
+def compact_step(step: str, max_chars: int) -> str:
+    """
+    清理单个步骤并去掉小贴士，超过 max_chars 时在该长度内的最后一个句子或分句边界处截断（以“…”结尾）。
+    套话和推广内容返回空字符串。
+    """
+    step = _STEP_NUMBER.sub("", _clean_text(step)).strip()
+    tip = _TIP.search(step)
+    if tip:
+        step = step[:tip.start()].rstrip("，,、;； ")
+    if not step or _BOILERPLATE_STEP.match(step.rstrip("!！~。.")) or _PROMOTION.search(step):
+        return ""
+    if len(step) <= max_chars:
+        return step
+    # 优先在句号等处截断，其次在逗号处截断，截断点太靠前时硬截断
+    for boundary in (_SENTENCE_END, _CLAUSE_END):
+        ends = [match.end() for match in boundary.finditer(step, 0, max_chars)]
+        if ends and ends[-1] >= max_chars // 2:
+            return step[:ends[-1]].rstrip("，,、") + "…"
+    return step[:max_chars - 1] + "…"
+
+
+def _fit_steps(steps: List[str], budget: int) -> List[str]:
+    """
+    步骤总长超过预算时，保留开头若干步和最后一步（通常是成菜方式），中间用省略说明代替；
+    省略说明中保留总步数，供“快手菜”等要求判断做法复杂度。
+    """
+    if sum(estimate_text_tokens(step) for step in steps) <= budget or len(steps) <= 2:
+        return steps
+    last = steps[-1]
+    marker = f"……（共 {len(steps)} 步，省略 {{omitted}} 步）"
+    remaining = budget - estimate_text_tokens(last) - estimate_text_tokens(marker)
+    kept = []
+    for step in steps[:-1]:
+        cost = estimate_text_tokens(step)
+        if kept and cost > remaining:
+            break
+        kept.append(step)
+        remaining -= cost
+    omitted = len(steps) - len(kept) - 1
+    return kept + ([marker.format(omitted=omitted)] if omitted else []) + [last]
+
+
+class RecipePromptCompactor:
+    """
+    把爬取的菜谱压缩成筛选链的输入：按每个菜谱的 token 预算确定性地清理和截断，
+    去掉套话与推广内容、缩短用量写法、合并重复的食材；压缩结果按菜谱内容缓存。
+    每次使用都会在 telemetry 中记录压缩前后的 token 数（recipe_filter_prompt_tokens_total）。
+    """
+
+    def __init__(self, budget: int = settings.FILTER_RECIPE_TOKEN_BUDGET,
+                 step_max_chars: int = settings.FILTER_STEP_MAX_CHARS,
+                 max_entries: int = settings.PROMPT_COMPACTION_CACHE_ENTRIES):
+        """
+        :param budget: 每个菜谱（标题、食材和步骤）在提示词中的 token 预算
+        :param step_max_chars: 单个步骤保留的最多字符数
+        :param max_entries: 压缩结果缓存的容量
+        """
+        self.budget = budget
+        self.step_max_chars = step_max_chars
+        self.cache = LRUTTLCache(max_entries, settings.RECIPE_STORE_TTL_SECONDS)
+        self.stats = {"hits": 0, "misses": 0}
+
+    @staticmethod
+    def raw_inputs(recipe: ScrapedContent) -> Dict[str, str]:
+        """未压缩的筛选链输入"""
+        return {
+            "recipe_title": recipe['title'],
+            "recipe_ingredients": ", ".join([f"{ing['name']}({ing['quantity']})" for ing in recipe['ingredients']]),
+            "recipe_steps": "\n".join(recipe['steps']),
+        }
+
+    def _cache_key(self, recipe: ScrapedContent) -> str:
+        content = repr((recipe['title'], [(ing['name'], ing['quantity']) for ing in recipe['ingredients']],
+                        recipe['steps'], self.budget, self.step_max_chars))
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+    def compact(self, recipe: ScrapedContent) -> Dict[str, str]:
+        key = self._cache_key(recipe)
+        entry: Optional[Tuple[Dict[str, str], int, int]] = self.cache.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            entry = self._compact(recipe)
+            self.cache.set(key, entry)
+        else:
+            self.stats["hits"] += 1
+        inputs, raw_tokens, compacted_tokens = entry
+        telemetry = get_telemetry()
+        telemetry.inc("recipe_filter_prompt_tokens_total", raw_tokens, (("stage", "raw"),))
+        telemetry.inc("recipe_filter_prompt_tokens_total", compacted_tokens, (("stage", "compacted"),))
+        return inputs
+
+    def _compact(self, recipe: ScrapedContent) -> Tuple[Dict[str, str], int, int]:
+        title = _clean_text(recipe['title'])
+        ingredients, seen = [], set()
+        for ingredient in recipe['ingredients']:
+            name = _PARENTHESES.sub("", _clean_text(ingredient['name'])).strip()
+            if not name or name in seen:
+                continue
+            seen.add(name)
+            quantity = compact_quantity(ingredient['quantity'])
+            ingredients.append(f"{name}({quantity})" if quantity else name)
+        ingredients_text = ", ".join(ingredients)
+
+        steps = [step for step in (compact_step(step, self.step_max_chars) for step in recipe['steps']) if step]
+        steps_budget = max(0, self.budget - estimate_text_tokens(title) - estimate_text_tokens(ingredients_text))
+        steps_text = "\n".join(_fit_steps(steps, steps_budget))
+
+        inputs = {"recipe_title": title, "recipe_ingredients": ingredients_text, "recipe_steps": steps_text}
+        raw_tokens = sum(estimate_text_tokens(text) for text in self.raw_inputs(recipe).values())
+        compacted_tokens = sum(estimate_text_tokens(text) for text in inputs.values())
+        return inputs, raw_tokens, compacted_tokens
+
+
+_compactor: Optional[RecipePromptCompactor] = None
+
+
+def get_prompt_compactor() -> RecipePromptCompactor:
+    """获取进程级共享的菜谱提示词压缩器"""
+    global _compactor
+    if _compactor is None:
+        _compactor = RecipePromptCompactor()
+    return _compactor
@@ -0,0 +1,228 @@
+import re
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+from state import UserInputPlan
+from utils import settings
+from utils.prefilter import INGREDIENT_LEXICON, SIMPLE_KEYWORDS, ingredient_variants, parse_excluded_ingredients
+
+# 规划来源
+PLAN_SOURCE_RULES = "rules"  # 规则直接得出
+PLAN_SOURCE_LLM = "llm"  # 规则置信度不足，交给LLM解析
+
+# 菜名、菜系和餐别，作为搜索关键词
+DISH_LEXICON = (
+    "三明治", "汉堡", "披萨", "意面", "意大利面", "沙拉", "寿司", "饭团", "便当", "盖饭", "盖浇饭", "炒饭", "蛋炒饭",
+    "炒面", "拌面", "面条", "汤面", "拉面", "凉面", "米线", "饺子", "馄饨", "包子", "馒头", "花卷", "煎饼", "手抓饼",
+    "葱油饼", "烙饼", "春卷", "粥", "皮蛋瘦肉粥", "汤", "羹", "火锅", "麻辣烫", "烧烤", "卤味",
+    "红烧肉", "东坡肉", "回锅肉", "鱼香肉丝", "宫保鸡丁", "糖醋排骨", "糖醋里脊", "可乐鸡翅", "辣子鸡", "口水鸡",
+    "白切鸡", "黄焖鸡", "大盘鸡", "水煮鱼", "酸菜鱼", "红烧鱼", "清蒸鱼", "麻婆豆腐", "家常豆腐", "番茄炒蛋",
+    "西红柿炒鸡蛋", "青椒肉丝", "土豆丝", "酸辣土豆丝", "地三鲜", "干锅", "小炒肉", "蒸蛋", "鸡蛋羹", "茶叶蛋",
+    "番茄蛋汤", "紫菜蛋花汤", "排骨汤", "鸡汤", "罗宋汤", "凉菜", "凉拌菜", "拍黄瓜", "炒青菜", "蒜蓉西兰花",
+    "蛋糕", "戚风蛋糕", "面包", "吐司", "饼干", "布丁", "蛋挞", "甜品", "甜点", "奶茶", "果汁", "奶昔", "冰淇淋",
+    "早餐", "早饭", "午餐", "午饭", "晚餐", "晚饭", "夜宵", "下午茶", "家常菜", "快手菜", "下饭菜", "减脂餐",
+    "月子餐", "儿童餐", "宝宝辅食", "辅食", "川菜", "粤菜", "湘菜", "鲁菜", "东北菜", "西餐", "日料", "韩餐",
+)
+
+# 其他要求的关键词（做法、口味、人群、饮食限制）
+REQUIREMENT_KEYWORDS = SIMPLE_KEYWORDS + (
+    "低脂", "减脂", "减肥", "低卡", "健身", "高蛋白", "低糖", "无糖", "控糖", "少油", "少盐", "清淡", "素食", "吃素",
+    "不辣", "微辣", "辣", "麻辣", "酸甜", "甜", "咸", "下饭", "营养", "健康", "儿童", "宝宝", "孩子", "老人", "孕妇",
+    "一人食", "两人", "分钟", "不用烤箱", "烤箱", "空气炸锅", "电饭煲", "微波炉", "便宜", "过敏",
+)
+
+# 不携带信息的常用说法，解析时视为已理解
+FILLER_WORDS = (
+    "我", "我们", "希望", "想要", "想", "要", "需要", "获取", "得到", "来", "给我", "帮我", "请", "麻烦", "推荐",
+    "一下", "做", "做个", "做一", "做法", "食谱", "菜谱", "方子", "教程", "菜", "道菜", "主要", "食材", "材料", "原料",
+    "包括", "包含", "有", "家里", "冰箱", "里", "还", "只", "剩", "剩下", "用", "用到", "的", "和", "跟", "与", "及",
+    "以及", "还有", "或者", "吧", "呢", "啊", "呀", "哦", "点", "一点", "些", "一些", "可以", "能", "怎么", "如何",
+    "适合", "操作", "一个", "一份", "个", "份", "道", "款", "种", "吃", "当", "作为", "今天", "明天", "早上", "中午", "晚上",
+)
+
+_CN_DIGITS = {"零": 0, "一": 1, "二": 2, "两": 2, "俩": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+_COUNT_PATTERN = re.compile(r"(各)?\s*(\d+|[零一二两俩三四五六七八九十]+)\s*(?:个|份|道|款|种)")
+# 问用量的说法，例如“要几个鸡蛋”“需要多少面粉”“鸡蛋要几个”，相邻的食材不是用户已有的
+_QUANTITY_QUESTION = re.compile(r"(?:需要|要|得|用|放|加)\s*(?:几|多少)\s*(?:个|克|g|斤|两|勺|片|根|颗|只|块|瓣|毫升|ml)?")
+_CLAUSE_SPLIT = re.compile(r"[，。；;,.!！?？\n]+")
+_MEANINGFUL = re.compile(r"[\u4e00-\u9fffA-Za-z0-9]")
+
+_KIND_DISH, _KIND_INGREDIENT, _KIND_REQUIREMENT, _KIND_FILLER = "dish", "ingredient", "requirement", "filler"
+_KIND_COUNT, _KIND_COUNT_EACH, _KIND_UNKNOWN = "count", "count_each", "unknown"
+_KIND_QUANTITY_QUESTION = "quantity_question"
+# 数量词修饰的是人而不是菜，例如“两个人吃”“给三个孩子做”
+_PEOPLE_WORDS = ("人", "儿童", "宝宝", "孩子", "老人", "孕妇", "家人", "朋友")
+# 数量词后面没有紧跟菜名时，数量可能修饰的是别的东西，每出现一次降低置信度
+_AMBIGUOUS_COUNT_PENALTY = 0.1
+
+
+def _build_lexicon() -> Dict[str, str]:
+    lexicon = {}
+    # 后写入的类别优先级更高：同一个词既是菜名又是食材时（如“面包”），按菜名处理，再由上下文修正
+    for words, kind in ((FILLER_WORDS, _KIND_FILLER), (REQUIREMENT_KEYWORDS, _KIND_REQUIREMENT),
+                        (INGREDIENT_LEXICON, _KIND_INGREDIENT), (DISH_LEXICON, _KIND_DISH)):
+        for word in words:
+            lexicon[word] = kind
+    for group in ingredient_variants():
+        for name in group:
+            lexicon.setdefault(name, _KIND_INGREDIENT)
+    return lexicon
+
+
+_LEXICON = _build_lexicon()
+_MAX_WORD_LEN = max(len(word) for word in _LEXICON)
+# 出现在这些词之后的食材名视为用户已有的食材，即使它也是菜名（如“主要食材包括面包”）
+_INGREDIENT_CUES = ("食材", "材料", "原料", "包括", "包含", "有", "剩", "剩下", "用", "用到")
+_RECIPE_WORDS = ("食谱", "菜谱", "菜", "道菜", "做法", "方子")
+
+
+def parse_chinese_number(text: str) -> Optional[int]:
+    """解析阿拉伯数字或不超过两位的中文数字，例如 "3"、"两"、"十二"、"二十"；无法解析时返回 None"""
+    if text.isdigit():
+        return int(text)
+    if "十" in text:
+        tens, _, ones = text.partition("十")
+        if (tens and tens not in _CN_DIGITS) or (ones and ones not in _CN_DIGITS):
+            return None
+        return (_CN_DIGITS[tens] if tens else 1) * 10 + (_CN_DIGITS[ones] if ones else 0)
+    if len(text) == 1 and text in _CN_DIGITS:
+        return _CN_DIGITS[text]
+    return None
+
+
+def _tokenize(clause: str) -> Tuple[List[Tuple[str, str]], int]:
+    """
+    按词表做正向最长匹配。
+
+    :return: ([(词, 类别)], 未识别的有效字符数)；连续的未识别字符记为一个 unknown 词，用于判断数量词是否紧跟菜名
+    """
+    tokens, unknown, i = [], 0, 0
+    while i < len(clause):
+        question_match = _QUANTITY_QUESTION.match(clause, i)
+        if question_match:
+            tokens.append((question_match.group(0), _KIND_QUANTITY_QUESTION))
+            i = question_match.end()
+            continue
+        count_match = _COUNT_PATTERN.match(clause, i)
+        if count_match:
+            tokens.append((count_match.group(2), _KIND_COUNT_EACH if count_match.group(1) else _KIND_COUNT))
+            i = count_match.end()
+            continue
+        for size in range(min(_MAX_WORD_LEN, len(clause) - i), 0, -1):
+            word = clause[i:i + size]
+            if word in _LEXICON:
+                tokens.append((word, _LEXICON[word]))
+                i += size
+                break
+        else:
+            if _MEANINGFUL.match(clause[i]):
+                unknown += 1
+                if not tokens or tokens[-1][1] != _KIND_UNKNOWN:
+                    tokens.append((clause[i], _KIND_UNKNOWN))
+            i += 1
+    return tokens, unknown
+
+
+def rule_based_plan(query: str) -> Tuple[Optional[UserInputPlan], float]:
+    """
+    用数量规则、菜名/食材词表和要求关键词表解析用户请求。
+
+    :param query: 用户的原始输入
+    :return: (规划, 置信度)；置信度为已识别字符占有效字符的比例，数量词后面没有紧跟菜名或食材时每处再减去
+             _AMBIGUOUS_COUNT_PENALTY；没有识别出菜名时为 0，此时规划为 None
+    """
+    text = unicodedata.normalize("NFKC", query).strip()
+    total = len(_MEANINGFUL.findall(text))
+    if total == 0:
+        return None, 0.0
+
+    keywords: List[str] = []
+    ingredients: List[str] = []
+    requirements: List[str] = []
+    recipe_count = None
+    unknown_total = 0
+    ambiguous_counts = 0
+    cued = False  # 是否已经出现“食材包括/家里有”之类的提示，食材列表可以跨越逗号
+
+    for clause in filter(None, (c.strip() for c in _CLAUSE_SPLIT.split(text))):
+        tokens, unknown = _tokenize(clause)
+        unknown_total += unknown
+        excluded = parse_excluded_ingredients(clause)
+        if excluded or any(kind == _KIND_REQUIREMENT for _, kind in tokens):
+            requirements.append(clause)
+            cued = False
+            if excluded:
+                # “不要香菜”之类的排除说法整句作为要求，其中的食材不是用户已有的；
+                # 排除项可能是“猪肉的话”这样的短语，包含在其中的食材都去掉
+                tokens = [(word, kind) for word, kind in tokens
+                          if not (word in INGREDIENT_LEXICON or kind == _KIND_INGREDIENT)
+                          or not any(word in item for item in excluded)]
+                unknown_total -= unknown
+
+        # “糖醋排骨和可乐鸡翅各一份”：数量按本句的菜名个数计
+        each = next((parse_chinese_number(word) for word, kind in tokens if kind == _KIND_COUNT_EACH), None)
+        if each and recipe_count is None:
+            dishes = sum(1 for word, kind in tokens if kind == _KIND_DISH)
+            recipe_count = each * dishes if dishes else None
+
+        pending_count = None  # 数量词后面跟着菜名或“食谱/菜”才算作菜谱数量，“2个鸡蛋”只是用量
+        asking = False  # 刚出现“要几个/需要多少”，紧接着的食材是在问用量
+        last_ingredient = None  # 上一个有效词是本句刚加入的食材时记录它，用于“鸡蛋要几个”
+        for index, (word, kind) in enumerate(tokens):
+            if kind == _KIND_QUANTITY_QUESTION:
+                if last_ingredient is not None:
+                    ingredients.remove(last_ingredient)
+                asking, last_ingredient, pending_count = True, None, None
+                continue
+            if kind != _KIND_FILLER:
+                last_ingredient = None
+            if kind in (_KIND_COUNT, _KIND_COUNT_EACH):
+                next_kind = tokens[index + 1][1] if index + 1 < len(tokens) else None
+                if next_kind not in (_KIND_DISH, _KIND_INGREDIENT) and not (
+                        index + 1 < len(tokens) and tokens[index + 1][0] in _RECIPE_WORDS):
+                    ambiguous_counts += 1
+                pending_count = parse_chinese_number(word) if kind == _KIND_COUNT else None
+                continue
+            if kind == _KIND_UNKNOWN or word in _PEOPLE_WORDS:
+                # 数量词和菜名之间隔着未识别的词或人，数量修饰的不是菜，例如“两个人吃的晚餐”
+                pending_count = None
+                continue
+            if kind == _KIND_DISH and not (cued and word in INGREDIENT_LEXICON):
+                asking = False
+                if word not in keywords:
+                    keywords.append(word)
+            elif kind in (_KIND_DISH, _KIND_INGREDIENT):
+                if asking:
+                    asking = False
+                elif word not in ingredients:
+                    ingredients.append(word)
+                    last_ingredient = word
+                pending_count = None
+            elif kind == _KIND_REQUIREMENT or word not in _RECIPE_WORDS:
+                # 数量和菜名之间可以有修饰，例如“两个快手早餐”“两道素食晚餐”
+                if word in _INGREDIENT_CUES:
+                    cued = True
+                continue
+            if pending_count is not None and recipe_count is None:
+                recipe_count = pending_count
+            pending_count = None
+
+    if not keywords:
+        return None, 0.0
+    # 出现在食材列表里的词不再作为搜索关键词，例如“主要食材包括面包”
+    keywords = [word for word in keywords if word not in ingredients] or keywords
+    confidence = max(0.0, 1.0 - unknown_total / total - _AMBIGUOUS_COUNT_PENALTY * ambiguous_counts)
+    plan = UserInputPlan(search_keywords=keywords, user_ingredients=ingredients,
+                         recipe_count=max(1, recipe_count or 1), other_requirements="，".join(requirements))
+    return plan, confidence
+
+
+def plan_query(query: str, min_confidence: float = settings.QUERY_PLANNER_MIN_CONFIDENCE
+               ) -> Tuple[Optional[UserInputPlan], float]:
+    """
+    规则规划的入口：置信度不低于 min_confidence 时返回规划，否则返回 (None, 置信度)，由调用方交给LLM。
+    """
+    plan, confidence = rule_based_plan(query)
+    if plan is None or confidence < min_confidence:
+        return None, confidence
+    return plan, confidence
@@ -0,0 +1,160 @@
+import math
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set
+
+from state import ScrapedContent
+from utils.prefilter import canonical_ingredient
+from utils.recipe_store import RecipeStore, get_recipe_store
+
+# 各字段命中时的权重：菜名关键词最重要，其次是用户已有的食材
+_TITLE_WEIGHT = 2.0
+_INGREDIENT_WEIGHT = 1.5
+_INGREDIENT_PART_WEIGHT = 0.5  # 食材名的二元片段，例如“五花”“花肉”
+
+_CJK_RUN = re.compile(r"[\u4e00-\u9fff]+|[a-z0-9]+")
+
+
+def _normalize(text: str) -> str:
+    return unicodedata.normalize("NFKC", text).strip().lower()
+
+
+def _bigrams(text: str) -> Set[str]:
+    """把文本切成连续的中文二元片段和英文数字词，单字词保留原样"""
+    tokens = set()
+    for run in _CJK_RUN.findall(_normalize(text)):
+        if len(run) == 1 or not "\u4e00" <= run[0] <= "\u9fff":
+            tokens.add(run)
+        else:
+            tokens.update(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def title_tokens(title: str) -> Set[str]:
+    return {f"t:{token}" for token in _bigrams(title)}
+
+
+def ingredient_tokens(name: str) -> Dict[str, float]:
+    """食材名的索引词及权重：规范化后的完整名称，加上二元片段用于部分匹配"""
+    canonical = canonical_ingredient(name)
+    tokens = {f"i:{part}": _INGREDIENT_PART_WEIGHT for part in _bigrams(canonical) if len(canonical) > 2}
+    tokens[f"i:{canonical}"] = _INGREDIENT_WEIGHT
+    return tokens
+
+
+class RecipeCorpus:
+    """
+    离线菜谱语料：以已抓取的菜谱为文档，建立 规范化食材名/标题片段 -> 菜谱ID 的倒排索引，
+    按搜索关键词和用户已有食材做加权（IDF）排序检索，无需联网爬取。
+    新抓取的菜谱通过 ingest 增量写入索引。
+    """
+
+    def __init__(self, store: Optional[RecipeStore] = None):
+        """
+        :param store: 持久化语料的菜谱存储，启动时从中加载全部菜谱建立索引
+        """
+        self.store = store
+        self._docs: List[ScrapedContent] = []
+        self._doc_ids: Dict[str, int] = {}
+        self._postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        self._lock = threading.Lock()
+        if store is not None:
+            self._index_many(store.iter_all())
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def _index_many(self, recipes: Iterable[ScrapedContent]) -> int:
+        added = 0
+        with self._lock:
+            for recipe in recipes:
+                doc_id = self._doc_ids.get(recipe['url'])
+                if doc_id is not None:
+                    # 已存在的菜谱内容可能更新，先移除旧的倒排项
+                    self._unindex(doc_id)
+                    self._docs[doc_id] = recipe
+                else:
+                    doc_id = len(self._docs)
+                    self._docs.append(recipe)
+                    self._doc_ids[recipe['url']] = doc_id
+                    added += 1
+                for token in title_tokens(recipe['title']):
+                    self._postings[token][doc_id] = _TITLE_WEIGHT
+                for ing in recipe['ingredients']:
+                    for token, weight in ingredient_tokens(ing['name']).items():
+                        self._postings[token][doc_id] = max(weight, self._postings[token].get(doc_id, 0.0))
+        return added
+
+    def _unindex(self, doc_id: int):
+        recipe = self._docs[doc_id]
+        tokens = set(title_tokens(recipe['title']))
+        for ing in recipe['ingredients']:
+            tokens.update(ingredient_tokens(ing['name']))
+        for token in tokens:
+            self._postings.get(token, {}).pop(doc_id, None)
+
+    def ingest(self, recipes: List[ScrapedContent], persist: bool = True) -> int:
+        """
+        增量加入新抓取的菜谱。
+
+        :param recipes: 菜谱列表，只收录用料和步骤都不为空、且确定性解析没有疑点（不带 html_excerpt）的菜谱
+        :param persist: 是否同时写入菜谱存储（调用方已写入时传 False）
+        :return: 新增的菜谱数
+        """
+        recipes = [recipe for recipe in recipes
+                   if recipe['ingredients'] and recipe['steps'] and 'html_excerpt' not in recipe]
+        if persist and self.store is not None and recipes:
+            self.store.put_many(recipes)
+        return self._index_many(recipes)
+
+    @staticmethod
+    def _matches_keyword(recipe: ScrapedContent, keywords: List[str]) -> bool:
+        """菜谱是否完整地命中某个关键词：标题包含该关键词，或某个规范化后的食材名与之相同"""
+        title = _normalize(recipe['title'])
+        ingredients = {canonical_ingredient(ing['name']) for ing in recipe['ingredients']}
+        return any(keyword in title or canonical_ingredient(keyword) in ingredients for keyword in keywords)
+
+    def search(self, search_keywords: List[str], user_ingredients: List[str], limit: int) -> List[ScrapedContent]:
+        """
+        按关键词和用户已有食材检索菜谱，返回得分最高的 limit 个。
+        关键词的二元片段同时匹配标题和食材名用于排序，但只返回完整命中至少一个关键词的菜谱，
+        例如搜索“红烧肉”时不返回只共享“红烧”片段的“红烧鱼”。
+        """
+        keywords = [_normalize(keyword) for keyword in search_keywords if keyword.strip()]
+        keyword_tokens = set()
+        for keyword in keywords:
+            keyword_tokens.update(title_tokens(keyword))
+            keyword_tokens.update(ingredient_tokens(keyword))
+        ingredient_query = {}
+        for name in user_ingredients:
+            ingredient_query.update(ingredient_tokens(name))
+
+        with self._lock:
+            total = len(self._docs) or 1
+            scores: Dict[int, float] = defaultdict(float)
+            for token in keyword_tokens | set(ingredient_query):
+                postings = self._postings.get(token)
+                if not postings:
+                    continue
+                idf = math.log(1 + total / len(postings))
+                for doc_id, weight in postings.items():
+                    scores[doc_id] += idf * weight
+            ranked = sorted((doc_id for doc_id in scores
+                             if not keywords or self._matches_keyword(self._docs[doc_id], keywords)),
+                            key=lambda doc_id: (-scores[doc_id], doc_id))
+            return [self._docs[doc_id] for doc_id in ranked[:limit]]
+
+
+_corpus: Optional[RecipeCorpus] = None
+_corpus_lock = threading.Lock()
+
+
+def get_recipe_corpus() -> RecipeCorpus:
+    """获取进程级共享的离线语料，首次调用时从菜谱存储加载并建立索引"""
+    global _corpus
+    with _corpus_lock:
+        if _corpus is None:
+            _corpus = RecipeCorpus(get_recipe_store())
+        return _corpus
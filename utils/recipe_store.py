@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from state import ScrapedContent
+from utils import settings
+
+
+class RecipeStore:
+    """
+    基于 SQLite 的结构化菜谱存储，以 URL 为主键保存已抓取并解析过的菜谱。
+    - 超过 TTL 的记录视为过期，需要重新抓取；重新抓取后若内容哈希未变，只刷新抓取时间（重新验证）
+    - 记录数超过上限时，按最近访问时间淘汰最久未使用的记录
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS recipes (
+            url TEXT PRIMARY KEY,
+            title TEXT NOT NULL,
+            ingredients TEXT NOT NULL,
+            steps TEXT NOT NULL,
+            fetched_at REAL NOT NULL,
+            content_hash TEXT NOT NULL,
+            last_access REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_recipes_last_access ON recipes (last_access);
+    """
+
+    def __init__(self,
+                 path: str = settings.RECIPE_STORE_PATH,
+                 ttl_seconds: float = settings.RECIPE_STORE_TTL_SECONDS,
+                 max_entries: int = settings.RECIPE_STORE_MAX_ENTRIES):
+        """
+        :param path: SQLite 数据库文件路径，传入 ":memory:" 时只保存在内存中
+        :param ttl_seconds: 记录的有效期（秒）
+        :param max_entries: 最多保存多少条记录
+        """
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(self._SCHEMA)
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stale": 0, "revalidated": 0, "updated": 0, "evicted": 0}
+
+    @staticmethod
+    def content_hash(recipe: ScrapedContent) -> str:
+        payload = json.dumps([recipe['title'], recipe['ingredients'], recipe['steps']],
+                             ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def lookup_many(self, urls: Iterable[str]) -> Tuple[Dict[str, ScrapedContent], List[str]]:
+        """
+        批量查询菜谱。
+
+        :param urls: 需要查询的URL
+        :return: (未过期的记录 {url: ScrapedContent}, 已过期需要重新验证的URL列表)，
+                 两者都不包含的URL即为从未抓取过
+        """
+        urls = list(dict.fromkeys(urls))
+        if not urls:
+            return {}, []
+        now = time.time()
+        placeholders = ",".join("?" * len(urls))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT url, title, ingredients, steps, fetched_at FROM recipes WHERE url IN ({placeholders})",
+                urls,
+            ).fetchall()
+            fresh, stale = {}, []
+            for url, title, ingredients, steps, fetched_at in rows:
+                if now - fetched_at > self.ttl_seconds:
+                    stale.append(url)
+                    continue
+                fresh[url] = {
+                    'url': url,
+                    'title': title,
+                    'ingredients': json.loads(ingredients),
+                    'steps': json.loads(steps),
+                }
+            if fresh:
+                self._conn.executemany("UPDATE recipes SET last_access = ? WHERE url = ?",
+                                       [(now, url) for url in fresh])
+                self._conn.commit()
+            self.stats["hits"] += len(fresh)
+            self.stats["stale"] += len(stale)
+            self.stats["misses"] += len(urls) - len(fresh) - len(stale)
+        return fresh, stale
+
+    def get(self, url: str) -> Optional[ScrapedContent]:
+        fresh, _ = self.lookup_many([url])
+        return fresh.get(url)
+
+    def iter_all(self) -> Iterator[ScrapedContent]:
+        """遍历存储中的全部菜谱（不考虑是否过期），用于构建离线语料索引"""
+        with self._lock:
+            rows = self._conn.execute("SELECT url, title, ingredients, steps FROM recipes").fetchall()
+        for url, title, ingredients, steps in rows:
+            yield {'url': url, 'title': title, 'ingredients': json.loads(ingredients), 'steps': json.loads(steps)}
+
+    def put_many(self, recipes: Iterable[ScrapedContent]):
+        """写入或刷新菜谱记录，写入后按容量上限淘汰旧记录"""
+        now = time.time()
+        with self._lock:
+            for recipe in recipes:
+                new_hash = self.content_hash(recipe)
+                row = self._conn.execute("SELECT content_hash FROM recipes WHERE url = ?",
+                                         (recipe['url'],)).fetchone()
+                if row and row[0] == new_hash:
+                    # 内容没有变化，只刷新抓取时间
+                    self._conn.execute("UPDATE recipes SET fetched_at = ?, last_access = ? WHERE url = ?",
+                                       (now, now, recipe['url']))
+                    self.stats["revalidated"] += 1
+                    continue
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO recipes "
+                    "(url, title, ingredients, steps, fetched_at, content_hash, last_access) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (recipe['url'], recipe['title'],
+                     json.dumps(recipe['ingredients'], ensure_ascii=False),
+                     json.dumps(recipe['steps'], ensure_ascii=False),
+                     now, new_hash, now),
+                )
+                self.stats["updated"] += 1
+            self._evict()
+            self._conn.commit()
+
+    def put(self, recipe: ScrapedContent):
+        self.put_many([recipe])
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM recipes").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM recipes WHERE url IN "
+                "(SELECT url FROM recipes ORDER BY last_access ASC LIMIT ?)",
+                (overflow,),
+            )
+            self.stats["evicted"] += overflow
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM recipes").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_store: Optional[RecipeStore] = None
+
+
+def get_recipe_store() -> RecipeStore:
+    """获取进程级共享的菜谱存储"""
+    global _store
+    if _store is None:
+        _store = RecipeStore()
+    return _store
@@ -0,0 +1,82 @@
+import unicodedata
+from typing import Dict, List, Optional
+
+from utils import settings
+from utils.cache import LRUTTLCache, SQLiteTTLCache
+
+
+def normalize_keywords(search_keywords: List[str]) -> str:
+    """把关键词列表规范化为与顺序、大小写、全半角和重复无关的字符串"""
+    normalized = set()
+    for keyword in search_keywords:
+        keyword = unicodedata.normalize("NFKC", keyword).strip().lower()
+        if keyword:
+            normalized.add(keyword)
+    return "\x1f".join(sorted(normalized))
+
+
+class SearchResultCache:
+    """
+    搜索结果页缓存：(规范化关键词, 页码) -> 该页的全部食谱URL 和“下一页”链接。
+    内存中按 LRU + TTL 保存，可选一个 SQLite 磁盘层，进程重启后仍可命中。
+    缓存的是抽样前的完整链接列表，每次请求仍会重新随机抽样。
+    """
+
+    def __init__(self,
+                 ttl_seconds: float = settings.SEARCH_CACHE_TTL_SECONDS,
+                 max_entries: int = settings.SEARCH_CACHE_MAX_ENTRIES,
+                 disk_path: Optional[str] = settings.SEARCH_CACHE_DISK_PATH):
+        """
+        :param ttl_seconds: 缓存有效期（秒）
+        :param max_entries: 内存层最多保存的页面数，磁盘层上限为其10倍
+        :param disk_path: 磁盘层 SQLite 文件路径，为空时只使用内存层
+        """
+        self.memory = LRUTTLCache(max_entries, ttl_seconds)
+        self.disk = SQLiteTTLCache(disk_path, max_entries * 10, ttl_seconds, table="search_pages") \
+            if disk_path else None
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0}
+
+    @staticmethod
+    def make_key(search_keywords: List[str], page_number: int) -> str:
+        return f"{normalize_keywords(search_keywords)}#{page_number}"
+
+    def get(self, search_keywords: List[str], page_number: int) -> Optional[Dict]:
+        """
+        :return: {'urls': [...], 'next_url': str | None}，未命中时返回 None
+        """
+        key = self.make_key(search_keywords, page_number)
+        entry = self.memory.get(key)
+        if entry is not None:
+            self.stats["hits"] += 1
+            return entry
+        if self.disk is not None:
+            item = self.disk.get_with_time(key)
+            if item is not None:
+                entry, stored_at = item
+                # 回填内存层时保留原始写入时间，避免延长有效期
+                self.memory.set(key, entry, stored_at=stored_at)
+                self.stats["disk_hits"] += 1
+                return entry
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, search_keywords: List[str], page_number: int, urls: List[str], next_url: Optional[str]):
+        # 空结果通常意味着被拦截或页面异常，不缓存
+        if not urls:
+            return
+        key = self.make_key(search_keywords, page_number)
+        entry = {"urls": list(urls), "next_url": next_url}
+        self.memory.set(key, entry)
+        if self.disk is not None:
+            self.disk.set(key, entry)
+
+
+_cache: Optional[SearchResultCache] = None
+
+
+def get_search_cache() -> SearchResultCache:
+    """获取进程级共享的搜索结果缓存"""
+    global _cache
+    if _cache is None:
+        _cache = SearchResultCache()
+    return _cache
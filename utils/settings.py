@@ -0,0 +1,171 @@
+import os
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _env_list(name: str, default: tuple) -> tuple:
+    """逗号分隔的列表，忽略空项"""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return tuple(item.strip() for item in value.split(",") if item.strip())
+
+
+# --- 服务地址（离线基准测试时可指向本地替身） ---
+LLM_BASE_URL = os.getenv("RECIPE_LLM_BASE_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1")
+LLM_MODEL = os.getenv("RECIPE_LLM_MODEL", "qwen-plus")
+DOUGUO_BASE_URL = os.getenv("RECIPE_DOUGUO_BASE_URL", "https://www.douguo.com")
+
+# --- 浏览器池 ---
+BROWSER_POOL_SIZE = _env_int("RECIPE_BROWSER_POOL_SIZE", 2)  # 池中浏览器上下文的数量
+BROWSER_HEADLESS = _env_bool("RECIPE_BROWSER_HEADLESS", True)  # 默认无头模式
+BROWSER_MAX_PAGES_PER_CONTEXT = _env_int("RECIPE_BROWSER_MAX_PAGES", 50)  # 每个上下文打开多少页面后回收
+DOUGUO_AUTH_STATE_PATH = os.getenv("DOUGUO_AUTH_STATE_PATH", "douguo_auth_state.json")
+
+# --- 详情页并发抓取 ---
+DETAIL_CONCURRENCY = _env_int("RECIPE_DETAIL_CONCURRENCY", 4)  # 同时打开的详情页标签数
+DETAIL_RATE_PER_HOST = _env_float("RECIPE_DETAIL_RATE_PER_HOST", 4.0)  # 每个域名每秒请求数
+
+# --- 页面就绪等待 ---
+PAGE_READY_TIMEOUT_MS = _env_int("RECIPE_PAGE_READY_TIMEOUT_MS", 15000)  # 等待关键元素出现的最长时间
+
+# --- 请求拦截（按数据源） ---
+# 资源类型为 Playwright 的 resource_type，多个值用逗号分隔；额外域名在内置的统计和广告域名之外一并屏蔽
+BLOCK_DOUGUO_ENABLED = _env_bool("RECIPE_BLOCK_DOUGUO_ENABLED", True)
+BLOCK_DOUGUO_RESOURCE_TYPES = _env_list("RECIPE_BLOCK_DOUGUO_RESOURCE_TYPES", ("image", "media", "font"))
+BLOCK_DOUGUO_EXTRA_DOMAINS = _env_list("RECIPE_BLOCK_DOUGUO_EXTRA_DOMAINS", ())
+BLOCK_XIACHUFANG_ENABLED = _env_bool("RECIPE_BLOCK_XIACHUFANG_ENABLED", True)
+BLOCK_XIACHUFANG_RESOURCE_TYPES = _env_list("RECIPE_BLOCK_XIACHUFANG_RESOURCE_TYPES", ("image", "media", "font"))
+BLOCK_XIACHUFANG_EXTRA_DOMAINS = _env_list("RECIPE_BLOCK_XIACHUFANG_EXTRA_DOMAINS", ())
+
+# --- HTTP 直连快速通道 ---
+DOUGUO_HTTP_FAST_PATH = _env_bool("RECIPE_DOUGUO_HTTP_FAST_PATH", True)  # 优先用纯 HTTP 抓取，失败时退回浏览器
+HTTP_MAX_CONNECTIONS = _env_int("RECIPE_HTTP_MAX_CONNECTIONS", 16)
+HTTP_TIMEOUT_SECONDS = _env_float("RECIPE_HTTP_TIMEOUT_SECONDS", 10.0)
+
+# --- 菜谱存储 ---
+RECIPE_STORE_ENABLED = _env_bool("RECIPE_STORE_ENABLED", True)
+RECIPE_STORE_PATH = os.getenv("RECIPE_STORE_PATH", os.path.join("data", "recipe_store.sqlite3"))
+RECIPE_STORE_TTL_SECONDS = _env_float("RECIPE_STORE_TTL_SECONDS", 7 * 24 * 3600.0)  # 默认7天后重新验证
+RECIPE_STORE_MAX_ENTRIES = _env_int("RECIPE_STORE_MAX_ENTRIES", 20000)
+
+# --- 搜索结果缓存 ---
+SEARCH_CACHE_ENABLED = _env_bool("RECIPE_SEARCH_CACHE_ENABLED", True)
+SEARCH_CACHE_TTL_SECONDS = _env_float("RECIPE_SEARCH_CACHE_TTL_SECONDS", 6 * 3600.0)
+SEARCH_CACHE_MAX_ENTRIES = _env_int("RECIPE_SEARCH_CACHE_MAX_ENTRIES", 2000)
+SEARCH_CACHE_DISK_PATH = os.getenv("RECIPE_SEARCH_CACHE_DISK_PATH", "")  # 为空时不启用磁盘层
+
+# --- LLM 响应缓存 ---
+LLM_CACHE_ENABLED = _env_bool("RECIPE_LLM_CACHE_ENABLED", True)
+LLM_CACHE_MAX_ENTRIES = _env_int("RECIPE_LLM_CACHE_MAX_ENTRIES", 5000)  # 内存层容量，磁盘层为其10倍
+LLM_CACHE_DISK_PATH = os.getenv("RECIPE_LLM_CACHE_DISK_PATH", os.path.join("data", "llm_cache.sqlite3"))
+LLM_CACHE_DEFAULT_TTL = _env_float("RECIPE_LLM_CACHE_DEFAULT_TTL", 24 * 3600.0)
+# 各条链的缓存有效期（秒）；output 链以流式调用，不经过缓存，因此不在此列
+LLM_CACHE_TTLS = {
+    "parse_input": _env_float("RECIPE_LLM_CACHE_TTL_PARSE_INPUT", 24 * 3600.0),
+    "filter": _env_float("RECIPE_LLM_CACHE_TTL_FILTER", 7 * 24 * 3600.0),
+    "filter_batch": _env_float("RECIPE_LLM_CACHE_TTL_FILTER_BATCH", 7 * 24 * 3600.0),
+    "parse_recipes": _env_float("RECIPE_LLM_CACHE_TTL_PARSE_RECIPES", 7 * 24 * 3600.0),
+}
+
+# --- 菜谱筛选 ---
+FILTER_BATCH_SIZE = _env_int("RECIPE_FILTER_BATCH_SIZE", 5)  # 每次LLM调用评估的菜谱数，1 表示逐个评估
+LLM_MAX_CONCURRENCY = _env_int("RECIPE_LLM_MAX_CONCURRENCY", 4)  # 进程内同时进行的LLM调用上限（开启自适应时为初始值），所有会话共享
+PREFILTER_ENABLED = _env_bool("RECIPE_PREFILTER_ENABLED", True)  # LLM评分前先用规则淘汰明显不合格的菜谱
+PREFILTER_MIN_OVERLAP = _env_int("RECIPE_PREFILTER_MIN_OVERLAP", 1)  # 至少用到几种用户已有食材
+PREFILTER_SIMPLE_MAX_STEPS = _env_int("RECIPE_PREFILTER_SIMPLE_MAX_STEPS", 8)  # “简单/快手”需求允许的最多步骤数
+
+# --- 筛选提示词压缩 ---
+PROMPT_COMPACTION_ENABLED = _env_bool("RECIPE_PROMPT_COMPACTION_ENABLED", True)  # 送去评分前按预算压缩菜谱文本
+FILTER_RECIPE_TOKEN_BUDGET = _env_int("RECIPE_FILTER_RECIPE_TOKEN_BUDGET", 300)  # 每个菜谱在筛选提示词中的 token 预算
+FILTER_STEP_MAX_CHARS = _env_int("RECIPE_FILTER_STEP_MAX_CHARS", 60)  # 单个步骤保留的最多字符数
+FILTER_QUANTITY_MAX_CHARS = _env_int("RECIPE_FILTER_QUANTITY_MAX_CHARS", 8)  # 单个用量保留的最多字符数
+PROMPT_COMPACTION_CACHE_ENTRIES = _env_int("RECIPE_PROMPT_COMPACTION_CACHE_ENTRIES", 5000)
+
+# --- LLM 调用管理 ---
+LLM_REQUESTS_PER_SECOND = _env_float("RECIPE_LLM_REQUESTS_PER_SECOND", 0.0)  # 每秒发起的LLM请求上限，0 表示不限
+LLM_TOKENS_PER_MINUTE = _env_int("RECIPE_LLM_TOKENS_PER_MINUTE", 0)  # 每分钟消耗的 token 上限（调用前按字符数估算），0 表示不限
+LLM_MAX_RETRIES = _env_int("RECIPE_LLM_MAX_RETRIES", 3)  # 限流、超时、5xx 时的最多重试次数
+LLM_RETRY_BASE_DELAY = _env_float("RECIPE_LLM_RETRY_BASE_DELAY", 0.5)  # 第一次重试前退避时间的上限（秒），之后每次翻倍
+LLM_RETRY_MAX_DELAY = _env_float("RECIPE_LLM_RETRY_MAX_DELAY", 8.0)
+LLM_ADAPTIVE_CONCURRENCY = _env_bool("RECIPE_LLM_ADAPTIVE_CONCURRENCY", True)  # 按延迟和错误自适应调整LLM并发上限（AIMD）
+LLM_MIN_CONCURRENCY = _env_int("RECIPE_LLM_MIN_CONCURRENCY", 1)
+LLM_ADAPTIVE_MAX_CONCURRENCY = _env_int("RECIPE_LLM_ADAPTIVE_MAX_CONCURRENCY", 16)
+LLM_LATENCY_TOLERANCE = _env_float("RECIPE_LLM_LATENCY_TOLERANCE", 2.0)  # 延迟超过该链基线的多少倍时视为拥塞
+# 各条链获取并发名额的优先级，数值越小越优先：面向用户的润色先于后台的评分和解析
+LLM_CHAIN_PRIORITIES = {
+    "output": 0,
+    "parse_input": 1,
+    "filter": 2,
+    "filter_batch": 2,
+    "parse_recipes": 2,
+}
+LLM_DEFAULT_PRIORITY = 1
+
+# --- 结构化输出 ---
+LLM_JSON_MODE = _env_bool("RECIPE_LLM_JSON_MODE", True)  # 结构化输出的链请求接口的 JSON 模式（response_format=json_object）
+STRUCTURED_OUTPUT_REASK = _env_bool("RECIPE_STRUCTURED_OUTPUT_REASK", True)  # 本地修复失败时让LLM修正一次输出
+
+# --- 解析兜底 ---
+FALLBACK_EXTRACTION_ENABLED = _env_bool("RECIPE_FALLBACK_EXTRACTION_ENABLED", True)  # 确定性解析结果可疑时用LLM从HTML片段重新提取
+FALLBACK_EXTRACTION_CONCURRENCY = _env_int("RECIPE_FALLBACK_EXTRACTION_CONCURRENCY", 4)  # 每个请求同时进行的兜底解析数
+FALLBACK_HTML_MAX_CHARS = _env_int("RECIPE_FALLBACK_HTML_MAX_CHARS", 6000)  # 送给LLM的HTML片段的最大字符数
+FALLBACK_MIN_STEPS = _env_int("RECIPE_FALLBACK_MIN_STEPS", 2)  # 步骤少于该数时视为解析可疑
+
+# --- 离线语料 ---
+# off: 不使用; before: 先查语料，候选不足时再爬取; only: 只用语料代替爬虫
+CORPUS_MODE = os.getenv("RECIPE_CORPUS_MODE", "before")
+CORPUS_MIN_CANDIDATES_FACTOR = _env_int("RECIPE_CORPUS_MIN_CANDIDATES_FACTOR", 3)  # 候选数达到 需要数量*该值 时跳过爬取
+
+# --- 用户输入解析 ---
+QUERY_PLANNER_ENABLED = _env_bool("RECIPE_QUERY_PLANNER_ENABLED", True)  # 先用规则解析用户输入，置信度不足时才调用LLM
+QUERY_PLANNER_MIN_CONFIDENCE = _env_float("RECIPE_QUERY_PLANNER_MIN_CONFIDENCE", 0.85)  # 规则结果可直接使用的最低置信度
+
+# --- 爬取与筛选流水线 ---
+PIPELINE_STREAMING = _env_bool("RECIPE_PIPELINE_STREAMING", True)  # 每抓到一个菜谱就送去评分，而不是等全部抓完
+PIPELINE_BATCH_WAIT_SECONDS = _env_float("RECIPE_PIPELINE_BATCH_WAIT_SECONDS", 0.3)  # 凑批评分时最多等待新菜谱的时间
+
+# --- 抓取预算与提前结束 ---
+EARLY_STOP_ENABLED = _env_bool("RECIPE_EARLY_STOP_ENABLED", True)  # 流水线中通过筛选的菜谱够数后立即停止抓取和评分
+ACCEPTANCE_STATS_PATH = os.getenv("RECIPE_ACCEPTANCE_STATS_PATH", os.path.join("data", "acceptance_stats.sqlite3"))
+ACCEPTANCE_STATS_DECAY = _env_float("RECIPE_ACCEPTANCE_STATS_DECAY", 0.8)  # 每次记录前历史计数的衰减系数
+ACCEPTANCE_MIN_SAMPLES = _env_int("RECIPE_ACCEPTANCE_MIN_SAMPLES", 5)  # 历史候选数不少于该值时才按通过率估算预算
+ACCEPTANCE_MIN_RATE = _env_float("RECIPE_ACCEPTANCE_MIN_RATE", 0.1)  # 估算预算时通过率的下限，避免预算过大
+FETCH_DEFAULT_FACTOR = _env_int("RECIPE_FETCH_DEFAULT_FACTOR", 5)  # 没有历史时抓取 需要数量*该值 个候选
+FETCH_SAFETY_MARGIN = _env_float("RECIPE_FETCH_SAFETY_MARGIN", 1.5)  # 按通过率估算时额外留出的余量倍数
+FETCH_MIN_FACTOR = _env_float("RECIPE_FETCH_MIN_FACTOR", 1.5)  # 预算下限为 需要数量*该值
+FETCH_MAX_FACTOR = _env_int("RECIPE_FETCH_MAX_FACTOR", 10)  # 预算上限为 需要数量*该值
+FETCH_EXPANSION_ROUNDS = _env_int("RECIPE_FETCH_EXPANSION_ROUNDS", 1)  # 通过的菜谱不够时追加抓取的轮数
+
+# --- 请求合并 ---
+COALESCE_ENABLED = _env_bool("RECIPE_COALESCE_ENABLED", True)  # 规划相同的并发请求共享一次爬取和筛选
+
+# --- 日志、追踪与指标 ---
+LOG_LEVEL = os.getenv("RECIPE_LOG_LEVEL", "INFO")  # DEBUG 时输出完整的爬取内容等详细信息
+TELEMETRY_ENABLED = _env_bool("RECIPE_TELEMETRY_ENABLED", True)  # 关闭时所有追踪调用都是空操作
+TRACE_JSONL_PATH = os.getenv("RECIPE_TRACE_JSONL_PATH", "")  # 追踪记录文件（JSON Lines），为空时只统计指标
+METRICS_PATH = os.getenv("RECIPE_METRICS_PATH", "")  # 每处理完一条消息把 Prometheus 文本格式的指标写到该文件，为空时不写
+
+# --- API 服务 ---
+SERVER_HOST = os.getenv("RECIPE_SERVER_HOST", "127.0.0.1")
+SERVER_PORT = _env_int("RECIPE_SERVER_PORT", 8000)
+SERVER_MAX_ACTIVE_RUNS = _env_int("RECIPE_SERVER_MAX_ACTIVE_RUNS", 16)  # 同时运行的图任务上限
+SERVER_MAX_QUEUED = _env_int("RECIPE_SERVER_MAX_QUEUED", 64)  # 准入队列长度，排满后新请求直接返回 429
+SERVER_QUEUE_TIMEOUT_SECONDS = _env_float("RECIPE_SERVER_QUEUE_TIMEOUT_SECONDS", 30.0)  # 排队超过该时间返回 503
+SERVER_RUN_TIMEOUT_SECONDS = _env_float("RECIPE_SERVER_RUN_TIMEOUT_SECONDS", 180.0)  # 单个请求的图运行时间上限
+SERVER_MAX_QUERY_CHARS = _env_int("RECIPE_SERVER_MAX_QUERY_CHARS", 500)
@@ -0,0 +1,225 @@
+import ast
+import json
+import logging
+import re
+from typing import Any, List, Optional, Tuple
+
+from langchain_core.exceptions import OutputParserException
+from langchain_core.output_parsers import PydanticOutputParser, StrOutputParser
+from langchain_core.outputs import Generation
+from langchain_core.prompts import ChatPromptTemplate
+from pydantic import BaseModel, ValidationError
+
+from utils import settings
+from utils.telemetry import get_telemetry
+
+logger = logging.getLogger(__name__)
+
+_CODE_FENCE = re.compile(r"```(?:json|JSON)?\s*(.*?)```", re.S)
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+_PYTHON_LITERALS = {"true": "True", "false": "False", "null": "None"}
+_TRUE_WORDS = {"是", "对", "符合", "通过", "保留", "yes", "y", "true"}
+_FALSE_WORDS = {"否", "不", "不符合", "不通过", "舍弃", "no", "n", "false"}
+
+_REPAIR_PROMPT = ChatPromptTemplate.from_template(
+    """下面这段输出本应是符合格式说明的 JSON，但无法解析。请只输出修正后的 JSON，不要添加任何解释。
+
+    格式说明:
+    {format_instructions}
+
+    原输出:
+    {completion}
+
+    错误:
+    {error}
+    """
+)
+
+
+def _extract_balanced(text: str) -> Optional[str]:
+    """取出文本中第一个括号配对完整的 JSON 对象或数组，忽略前后的说明文字；字符串内的括号不计入"""
+    start = next((i for i, char in enumerate(text) if char in "{["), None)
+    if start is None:
+        return None
+    depth, quote, escaped = 0, None, False
+    for i in range(start, len(text)):
+        char = text[i]
+        if quote:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == quote:
+                quote = None
+        elif char in "\"'":
+            quote = char
+        elif char in "{[":
+            depth += 1
+        elif char in "}]":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return None
+
+
+def _to_python_literal(text: str) -> str:
+    """把字符串以外的 true/false/null 换成 Python 字面量，供 ast.literal_eval 解析单引号等写法"""
+    out, quote, escaped, i = [], None, False, 0
+    while i < len(text):
+        char = text[i]
+        if quote:
+            out.append(char)
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == quote:
+                quote = None
+            i += 1
+            continue
+        if char in "\"'":
+            quote = char
+        elif char.isalpha():
+            word = re.match(r"[A-Za-z_]+", text[i:])
+            if word:
+                out.append(_PYTHON_LITERALS.get(word.group(0), word.group(0)))
+                i += len(word.group(0))
+                continue
+        out.append(char)
+        i += 1
+    return "".join(out)
+
+
+def repair_json(text: str) -> Any:
+    """
+    解析接近合法的 JSON：去掉代码块标记和前后多余的文字，容忍单引号、Python 风格的
+    True/False/None 和末尾多余的逗号。
+
+    :raises ValueError: 修复后仍无法解析
+    """
+    fenced = _CODE_FENCE.search(text)
+    candidate = (fenced.group(1) if fenced else text).strip()
+    candidate = _extract_balanced(candidate) or candidate
+    try:
+        return json.loads(candidate, strict=False)
+    except json.JSONDecodeError:
+        pass
+    try:
+        return ast.literal_eval(_to_python_literal(candidate))
+    except (ValueError, SyntaxError, MemoryError, RecursionError) as e:
+        raise ValueError(f"无法修复的 JSON: {e}") from None
+
+
+def _coerce(value: Any, error_type: str) -> Any:
+    """
+    把模型写成字符串的数字（"7"、"8分"、"7/10"）和是否（"是"、"否"）转换为对应的类型，
+    整数字段收到的小数（例如半分的 7.5）四舍五入为整数
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return round(value) if error_type in ("int_parsing", "int_from_float") else value
+    if not isinstance(value, str):
+        return value
+    if error_type in ("int_parsing", "float_parsing", "int_from_float"):
+        match = _NUMBER.search(value)
+        if match:
+            number = float(match.group(0))
+            return round(number) if error_type != "float_parsing" else number
+    if error_type == "bool_parsing":
+        word = value.strip().lower()
+        if word in _TRUE_WORDS:
+            return True
+        if word in _FALSE_WORDS:
+            return False
+    return value
+
+
+def _set_at(obj: Any, loc: Tuple, value: Any):
+    for key in loc[:-1]:
+        obj = obj[key]
+    obj[loc[-1]] = value
+
+
+def coerce_to_model(obj: Any, model: type[BaseModel]) -> BaseModel:
+    """
+    按模型校验解析出的对象，校验失败时修正常见的偏差后再试一次：
+    只有一个字段的模型收到裸数组时补上外层对象，字符串形式的数字和是否转换为对应类型。
+
+    :raises ValidationError: 修正后仍不符合模型
+    """
+    fields = list(model.model_fields)
+    if isinstance(obj, list) and len(fields) == 1:
+        obj = {fields[0]: obj}
+    try:
+        return model.model_validate(obj)
+    except ValidationError as e:
+        errors = e.errors()
+    for error in errors:
+        loc = error["loc"]
+        try:
+            _set_at(obj, loc, _coerce(error.get("input"), error["type"]))
+        except (KeyError, IndexError, TypeError):
+            continue
+    return model.model_validate(obj)
+
+
+class RepairingOutputParser(PydanticOutputParser):
+    """
+    带本地修复的 Pydantic 输出解析器：严格解析失败时先在本地修复接近合法的 JSON（代码块、多余文字、单引号、
+    字符串形式的数字等），仍失败时才把原输出和错误交给 LLM 修正一次（settings.STRUCTURED_OUTPUT_REASK）。
+    每次解析按链名在 telemetry 中记录结果：ok / repaired / reasked / failed。
+    """
+
+    chain_name: str = "structured_output"
+
+    def _count(self, outcome: str):
+        get_telemetry().inc("recipe_structured_output_total", 1, (("chain", self.chain_name), ("outcome", outcome)))
+
+    def _parse_locally(self, text: str) -> Tuple[Optional[BaseModel], Optional[Exception], str]:
+        """返回 (结果, 错误, 结果类型)，结果类型为 ok 或 repaired"""
+        try:
+            return super().parse_result([Generation(text=text)]), None, "ok"
+        except OutputParserException as e:
+            error = e
+        try:
+            return coerce_to_model(repair_json(text), self.pydantic_object), None, "repaired"
+        except (ValueError, ValidationError) as e:
+            logger.debug(f"  > 本地修复失败（{self.chain_name}）: {e}")
+        return None, error, ""
+
+    def _finish(self, text: str, result: Optional[BaseModel], error: Optional[Exception], outcome: str):
+        if result is not None:
+            self._count(outcome)
+            if outcome != "ok":
+                logger.info(f"  > 结构化输出已{'本地修复' if outcome == 'repaired' else '由LLM修正'}（{self.chain_name}）")
+            return result
+        self._count("failed")
+        raise OutputParserException(f"{self.chain_name} 的输出无法解析: {error}", llm_output=text)
+
+    def _repair_inputs(self, text: str, error: Exception) -> dict:
+        return {"format_instructions": self.get_format_instructions(), "completion": text, "error": str(error)}
+
+    def _repair_chain(self):
+        from utils.llm_provider import get_json_llm
+        return _REPAIR_PROMPT | get_json_llm("repair") | StrOutputParser()
+
+    def parse_result(self, result: List[Generation], *, partial: bool = False) -> Any:
+        text = result[0].text
+        parsed, error, outcome = self._parse_locally(text)
+        if parsed is None and not partial and settings.STRUCTURED_OUTPUT_REASK:
+            text = self._repair_chain().invoke(self._repair_inputs(text, error))
+            parsed, error, _ = self._parse_locally(text)
+            outcome = "reasked"
+        if partial and parsed is None:
+            return None
+        return self._finish(text, parsed, error, outcome)
+
+    async def aparse_result(self, result: List[Generation], *, partial: bool = False) -> Any:
+        text = result[0].text
+        parsed, error, outcome = self._parse_locally(text)
+        if parsed is None and not partial and settings.STRUCTURED_OUTPUT_REASK:
+            text = await self._repair_chain().ainvoke(self._repair_inputs(text, error))
+            parsed, error, _ = self._parse_locally(text)
+            outcome = "reasked"
+        if partial and parsed is None:
+            return None
+        return self._finish(text, parsed, error, outcome)
@@ -0,0 +1,362 @@
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from utils import settings
+
+
+# 耗时直方图的桶（秒）
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# 指标名 -> (类型, 说明)
+METRICS = {
+    "recipe_span_duration_seconds": ("histogram", "各类操作（图节点、页面导航、HTML解析、LLM调用等）的耗时"),
+    "recipe_span_errors_total": ("counter", "各类操作抛出异常的次数"),
+    "recipe_llm_tokens_total": ("counter", "LLM 消耗的 token 数，按链和 prompt/completion 区分"),
+    "recipe_llm_cache_lookups_total": ("counter", "LLM 响应缓存的查询次数，按链和 hit/miss 区分"),
+    "recipe_filter_prompt_tokens_total": ("counter", "筛选提示词中菜谱部分的估算 token 数，按压缩前（raw）和压缩后（compacted）区分"),
+    "recipe_llm_retries_total": ("counter", "LLM 调用的重试次数，按链和原因区分"),
+    "recipe_llm_concurrency_limit": ("gauge", "当前的 LLM 并发上限（自适应调整）"),
+    "recipe_llm_inflight_calls": ("gauge", "正在进行的 LLM 调用数"),
+    "recipe_llm_queued_calls": ("gauge", "排队等待并发名额的 LLM 调用数"),
+    "recipe_structured_output_total": ("counter", "结构化输出的解析次数，按链和结果（ok/repaired/reasked/failed）区分"),
+    "recipe_coalesced_requests_total": ("counter", "请求合并层处理的请求数，按操作和 leader/follower 区分"),
+    "recipe_extraction_total": ("counter", "进入筛选的菜谱数，按解析方式区分：deterministic（确定性解析，无LLM调用）、"
+                                "fallback_repaired / fallback_failed（LLM兜底解析成功/失败）"),
+    "recipe_server_requests_total": ("counter", "API 服务处理的请求数，按结果区分"),
+    "recipe_server_queue_wait_seconds": ("histogram", "请求在准入队列中等待的时间"),
+    "recipe_server_active_runs": ("gauge", "API 服务正在运行的图任务数"),
+    "recipe_server_queued_requests": ("gauge", "在准入队列中等待的请求数"),
+}
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("telemetry_span", default=None)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Span:
+    """一次被追踪的操作，结束时记录耗时并写出追踪记录"""
+
+    __slots__ = ("kind", "name", "trace_id", "span_id", "parent_id", "start_time", "_start", "attrs", "error",
+                 "_telemetry", "_token")
+
+    def __init__(self, telemetry: "Telemetry", kind: str, name: str, attrs: Dict[str, Any]):
+        parent = _current_span.get()
+        self._telemetry = telemetry
+        self.kind = kind
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.attrs = attrs
+        self.error: Optional[str] = None
+        self.start_time = 0.0
+        self._start = 0.0
+        self._token = None
+
+    def set(self, **attrs: Any):
+        self.attrs.update(attrs)
+
+    def __enter__(self) -> "Span":
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        self._telemetry.record_span(self, time.perf_counter() - self._start)
+        return False
+
+
+class _NoopSpan:
+    """关闭追踪时使用的空操作，进入/退出/设置属性都不做任何事"""
+
+    def set(self, **attrs: Any):
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Telemetry:
+    """
+    进程内的追踪与指标：
+    - span(kind, name) 记录一次操作的耗时和错误，嵌套的 span 通过 contextvars 自动关联到同一条追踪
+    - 指标可导出为 Prometheus 文本格式，追踪记录以 JSON Lines 追加写入文件
+    关闭时 span() 直接返回共享的空操作对象，几乎没有开销。
+    """
+
+    def __init__(self, enabled: bool = settings.TELEMETRY_ENABLED, trace_path: str = settings.TRACE_JSONL_PATH):
+        """
+        :param enabled: 是否开启
+        :param trace_path: JSON Lines 追踪文件路径，为空时不写追踪记录，只统计指标
+        """
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[Labels, float]] = defaultdict(lambda: defaultdict(float))
+        # 直方图: 指标名 -> 标签 -> [各桶计数..., 总和, 总数]
+        self._histograms: Dict[str, Dict[Labels, List[float]]] = defaultdict(dict)
+        self._gauges: Dict[str, Dict[Labels, float]] = defaultdict(dict)
+        self._trace_file = None
+        if enabled and trace_path:
+            os.makedirs(os.path.dirname(trace_path) or ".", exist_ok=True)
+            self._trace_file = open(trace_path, "a", encoding="utf-8")
+
+    def span(self, kind: str, name: str, **attrs: Any):
+        """
+        追踪一次操作，用法: with telemetry.span("llm", "filter") as span: ...; span.set(tokens=...)
+
+        :param kind: 操作类别，例如 "node"、"navigation"、"http"、"parse"、"llm"
+        :param name: 操作名，例如节点名、链名
+        """
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self, kind, name, attrs)
+
+    def record_span(self, span: Span, duration: float):
+        labels = (("kind", span.kind), ("name", span.name))
+        self.observe("recipe_span_duration_seconds", duration, labels)
+        if span.error:
+            self.inc("recipe_span_errors_total", 1, labels)
+        if self._trace_file is not None:
+            record = {
+                "trace_id": span.trace_id, "span_id": span.span_id, "parent_id": span.parent_id,
+                "kind": span.kind, "name": span.name, "start": span.start_time,
+                "duration_ms": round(duration * 1000, 3), "error": span.error, "attrs": span.attrs,
+            }
+            line = json.dumps(record, ensure_ascii=False, default=str)
+            with self._lock:
+                self._trace_file.write(line + "\n")
+                self._trace_file.flush()
+
+    def inc(self, metric: str, value: float = 1, labels: Labels = ()):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[metric][labels] += value
+
+    def set_gauge(self, metric: str, value: float, labels: Labels = ()):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[metric][labels] = value
+
+    def observe(self, metric: str, value: float, labels: Labels = ()):
+        if not self.enabled:
+            return
+        with self._lock:
+            series = self._histograms[metric].get(labels)
+            if series is None:
+                series = self._histograms[metric][labels] = [0.0] * (len(DURATION_BUCKETS) + 2)
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render_prometheus(self) -> str:
+        """以 Prometheus 文本格式导出全部指标"""
+        lines = []
+        with self._lock:
+            for metric, (metric_type, help_text) in METRICS.items():
+                values = self._counters if metric_type == "counter" else self._gauges
+                if metric_type in ("counter", "gauge") and metric in values:
+                    lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {metric_type}"]
+                    for labels, value in sorted(values[metric].items()):
+                        lines.append(f"{metric}{_format_labels(labels)} {_format_value(value)}")
+                elif metric_type == "histogram" and metric in self._histograms:
+                    lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+                    for labels, series in sorted(self._histograms[metric].items()):
+                        for bound, count in zip(DURATION_BUCKETS, series):
+                            lines.append(f"{metric}_bucket{_format_labels(labels + (('le', str(bound)),))} "
+                                         f"{_format_value(count)}")
+                        lines.append(f"{metric}_bucket{_format_labels(labels + (('le', '+Inf'),))} "
+                                     f"{_format_value(series[-1])}")
+                        lines.append(f"{metric}_sum{_format_labels(labels)} {series[-2]:.6f}")
+                        lines.append(f"{metric}_count{_format_labels(labels)} {_format_value(series[-1])}")
+        return "\n".join(lines) + "\n"
+
+    def span_summary(self) -> Dict[str, Dict[str, float]]:
+        """各类操作的调用次数和总耗时: {"kind/name": {"count": 次数, "total_seconds": 总耗时}}"""
+        with self._lock:
+            series_by_labels = dict(self._histograms.get("recipe_span_duration_seconds", {}))
+        summary = {}
+        for labels, series in series_by_labels.items():
+            label_map = dict(labels)
+            summary[f"{label_map['kind']}/{label_map['name']}"] = {"count": series[-1], "total_seconds": series[-2]}
+        return summary
+
+    def reset(self):
+        """清空已统计的指标（追踪文件不受影响）"""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._gauges.clear()
+
+    def write_prometheus(self, path: str):
+        """把指标写到文件（先写临时文件再替换），供 node_exporter 的 textfile 收集器等读取"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+
+    def close(self):
+        with self._lock:
+            if self._trace_file is not None:
+                self._trace_file.close()
+                self._trace_file = None
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+               for key, value in labels)
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+_telemetry: Optional[Telemetry] = None
+_telemetry_lock = threading.Lock()
+
+
+def get_telemetry() -> Telemetry:
+    """获取进程级共享的追踪与指标"""
+    global _telemetry
+    if _telemetry is not None:
+        return _telemetry
+    with _telemetry_lock:
+        if _telemetry is None:
+            _telemetry = Telemetry()
+        return _telemetry
+
+
+def setup_logging(level: str = settings.LOG_LEVEL):
+    """
+    配置进程的日志输出（各模块通过 logging.getLogger(__name__) 输出进度信息）。
+
+    :param level: 日志级别名，例如 "DEBUG"、"INFO"、"WARNING"
+    """
+    logging.basicConfig(level=level.upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+
+def traced(kind: str, name: Optional[str] = None):
+    """
+    装饰器：为同步或异步函数的每次调用记录一个 span。
+
+    :param kind: 操作类别
+    :param name: 操作名，默认使用函数名
+    """
+
+    def decorator(func):
+        span_name = name or func.__name__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with get_telemetry().span(kind, span_name):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with get_telemetry().span(kind, span_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class TelemetryCallbackHandler(BaseCallbackHandler):
+    """
+    挂在 LLM 上的回调：每次调用记录一个 kind="llm" 的 span，
+    包括耗时、prompt/completion token 数、是否命中缓存和错误。
+    """
+
+    # 在事件循环中直接执行，才能拿到调用方（图节点）的 span 作为父级
+    run_inline = True
+
+    def __init__(self, chain_name: str):
+        self.chain_name = chain_name
+        self._spans: Dict[UUID, Span] = {}
+
+    def _start(self, run_id: UUID):
+        telemetry = get_telemetry()
+        if not telemetry.enabled:
+            return
+        span = telemetry.span("llm", self.chain_name)
+        span.start_time = time.time()
+        span._start = time.perf_counter()
+        self._spans[run_id] = span
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[Any]], *, run_id: UUID,
+                            **kwargs: Any) -> None:
+        self._start(run_id)
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        span = self._spans.pop(run_id, None)
+        if span is None:
+            return
+        prompt_tokens, completion_tokens, cached = _token_usage(response)
+        span.set(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, cached=cached)
+        telemetry = get_telemetry()
+        if not cached:
+            telemetry.inc("recipe_llm_tokens_total", prompt_tokens, (("chain", self.chain_name), ("type", "prompt")))
+            telemetry.inc("recipe_llm_tokens_total", completion_tokens,
+                          (("chain", self.chain_name), ("type", "completion")))
+        telemetry.record_span(span, time.perf_counter() - span._start)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        span = self._spans.pop(run_id, None)
+        if span is None:
+            return
+        span.error = type(error).__name__
+        get_telemetry().record_span(span, time.perf_counter() - span._start)
+
+
+def _token_usage(response: LLMResult) -> Tuple[int, int, bool]:
+    """从 LLM 结果中取出 (prompt token 数, completion token 数, 是否命中缓存)"""
+    prompt_tokens = completion_tokens = 0
+    cached = False
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            # 缓存命中时 langchain 会把 total_cost 置为 0
+            cached = cached or "total_cost" in usage
+            prompt_tokens += usage.get("input_tokens", 0)
+            completion_tokens += usage.get("output_tokens", 0)
+    if not prompt_tokens and not completion_tokens:
+        token_usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens = token_usage.get("prompt_tokens", 0)
+        completion_tokens = token_usage.get("completion_tokens", 0)
+    return prompt_tokens, completion_tokens, cached